@@ -1,7 +1,7 @@
 """
 core/base.py
 
-Last updated:  2023-04-29
+Last updated:  2026-10-19
 
 Basic configuration and structural stuff.
 
@@ -28,6 +28,7 @@ NO_DATE = "*"  # an unspecified date
 ########################################################################
 
 import sys, os, re, builtins, datetime, shutil
+import importlib.util
 from typing import Optional, Tuple
 
 if __name__ == "__main__":
@@ -104,6 +105,11 @@ class start:
         builtins.CALENDAR = Dates.get_calendar(DATAPATH("CONFIG/Calendar"))
         builtins.SCHOOLYEAR = Dates.calendar_year(CALENDAR)
 
+    @classmethod
+    def datadir(cls):
+        """Return the <datadir> passed to <setup>."""
+        return cls.__DATA
+
     @classmethod
     def __datadir(cls, path, base=""):
         """Return a path within the school-data folder.
@@ -127,6 +133,13 @@ class start:
         """
         return os.path.join(basedir, f"DATA-{year}", *path.split("/"))
 
+    @staticmethod
+    def base_data_path(path):
+        """Return a path within the folder containing the data folders
+        of all years (for data which is not specific to one year).
+        """
+        return os.path.join(basedir, *path.split("/"))
+
 class Dates:
     @staticmethod
     def print_date(date, date_format, trap=True):
@@ -338,6 +351,27 @@ def class_group_join(klass:str, group: Optional[str] = None) -> str:
     return klass
 
 
+def lazy_import(name):
+    """Return the module with the given (top-level) name, but only load
+    it when one of its attributes is first accessed. This is intended
+    for large libraries which are only needed for particular functions,
+    so that they don't slow down program start.
+    """
+    try:
+        return sys.modules[name]
+    except KeyError:
+        pass
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
 def wipe_folder_contents(folder):
     if os.path.isdir(folder):
         for filename in os.listdir(folder):
@@ -1,10 +1,19 @@
 """
 core/db_access.py
 
-Last updated:  2023-02-18
+Last updated:  2026-10-19
 
 Helper functions for accessing the database.
 
+The journal mode of the database is set by the configuration value
+"DB_JOURNAL_MODE", default is DELETE. WAL mode allows reading while
+another connection is writing, but it is not safe if the data folder is
+on a network drive. In WAL mode copying the database file is not a
+reliable way to make a backup, so backups are made using SQLite's online
+backup API (via Python's <sqlite3> module), which doesn't block other
+connections. As an option, backups can be saved in a compressed store,
+in which identical chunks of the database are stored only once.
+
 
 =+LICENCE=============================
 Copyright 2023 Michael Towers
@@ -26,6 +35,23 @@ Copyright 2023 Michael Towers
 
 DATABASE = "wz.sqlite"
 
+# Settings for the main database connection, see also <db_pragmas>
+DB_JOURNAL_MODE = "DELETE"  # default, WAL needs a local file system
+DB_JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "WAL")
+DB_PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",   # KiB
+    # Wait for other writers (e.g. another instance of the program
+    # working on the same database) instead of failing at once
+    "PRAGMA busy_timeout = 5000",   # ms
+)
+BACKUP_STEP_PAGES = 1024    # pages copied per step of an online backup
+BACKUP_KEEP = 5             # number of "db_backup" copies to keep
+STORE_FOLDER = "BACKUP/store"
+STORE_KEEP = 30             # number of backups to keep in the store
+STORE_CHUNK_SIZE = 65536    # a multiple of all possible page sizes
+
 ########################################################################
 
 import os
@@ -49,8 +75,9 @@ T = TRANSLATIONS("core.db_access")
 
 
 from datetime import datetime
-from shutil import copyfile
 from glob import glob
+from urllib.parse import quote
+import sqlite3, hashlib, zlib, json
 
 from core.base import Dates
 from ui.ui_base import (
@@ -67,15 +94,17 @@ class NoRecord(Exception):
 ### -----
 
 
-def open_database():
+def open_database(monthly_backup=True):
     """Ensure the connection to the database is open.
     The QtSql default connection is used.
+    If <monthly_backup> is true, a backup is made on the first opening
+    in a month.
     """
     dbpath = DATAPATH(DATABASE)
     bupath = DATAPATH(f"BACKUP/{Dates.today().rsplit('-', 1)[0]}_{DATABASE}")
-    if not os.path.isfile(bupath):
+    if monthly_backup and not os.path.isfile(bupath):
         os.makedirs(os.path.dirname(bupath), exist_ok=True)
-        copyfile(dbpath, bupath)
+        backup_database(dbpath, bupath)
         REPORT("INFO", T["MONTHLY_DB_BACKUP"].format(path=bupath))
 
     con = QSqlDatabase.database()
@@ -94,12 +123,63 @@ def open_database():
     if not con.open():
         raise Bug(f"Cannot open database at {dbpath}")
     # print("TABLES:", con.tables())
-    foreign_keys_on = "PRAGMA foreign_keys = ON"
-    if not QSqlQuery(foreign_keys_on).isActive():
-        raise Bug(f"Failed: {foreign_keys_on}")
+    for pragma in db_pragmas():
+        if not QSqlQuery(pragma).isActive():
+            raise Bug(f"Failed: {pragma}")
     return con
 
 
+def db_journal_mode():
+    """Return the journal mode for the database connections, from the
+    configuration value "DB_JOURNAL_MODE" (default DB_JOURNAL_MODE).
+    """
+    mode = CONFIG.get("DB_JOURNAL_MODE") or DB_JOURNAL_MODE
+    if mode.upper() not in DB_JOURNAL_MODES:
+        REPORT("ERROR", T["BAD_JOURNAL_MODE"].format(
+            mode=mode, default=DB_JOURNAL_MODE
+        ))
+        return DB_JOURNAL_MODE
+    return mode.upper()
+
+
+def db_pragmas():
+    """Return the settings for a database connection: DB_PRAGMAS and
+    the journal mode. "synchronous = NORMAL" is only safe in WAL mode.
+    """
+    mode = db_journal_mode()
+    return (
+        *DB_PRAGMAS,
+        f"PRAGMA journal_mode = {mode}",
+        f"PRAGMA synchronous = {'NORMAL' if mode == 'WAL' else 'FULL'}",
+    )
+
+
+def backup_database(dbpath, target):
+    """Copy the database at <dbpath> to the file <target> using SQLite's
+    online backup API. The copy is made in steps of a limited number of
+    pages, so other connections are not blocked. The copy is consistent
+    even if another connection writes to the database in the meantime.
+    """
+    tmp = target + ".part"
+    src = sqlite3.connect(f"file:{quote(dbpath)}?mode=ro", uri=True)
+    try:
+        dst = sqlite3.connect(tmp)
+        try:
+            src.backup(dst, pages=BACKUP_STEP_PAGES)
+        finally:
+            dst.close()
+    finally:
+        src.close()
+    # A backup is a single file, it doesn't need the WAL mode (which
+    # the copy takes over from the source)
+    con = sqlite3.connect(tmp)
+    try:
+        con.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        con.close()
+    os.replace(tmp, target)
+
+
 class DatabaseShortAccess:
     """A "context manager" for performing some commands on a database
     then closing it. The default database is not affected.
@@ -143,22 +223,116 @@ class DatabaseShortAccess:
                     raise Bug("Failed: create table")
 
 
-def db_backup(name=""):
+def db_backup(name="", store=None):
+    """Make a backup of the database.
+    If <name> is given, the backup is saved as "<name>.sqlite" in the
+    data folder. Otherwise a time-stamped copy is made next to the
+    database – only the latest BACKUP_KEEP of these are retained – or,
+    if <store> is true, the backup is saved in the compressed backup
+    store (see <db_backup_store>). If <store> is not given, the
+    configuration value "DB_BACKUP_STORE" (true/false) is used.
+    """
     dbpath = DATAPATH(DATABASE)
     if name:
         newfile = DATAPATH(name) + ".sqlite"
     else:
+        if store is None:
+            store = CONFIG.get("DB_BACKUP_STORE") == "true"
+        if store:
+            manifest = db_backup_store()
+            msg = [T["BACKUP_TO"].format(f=manifest)]
+            for f in prune_backup_store():
+                msg.append(T["REMOVE_OLD_BACKUP"].format(f=f))
+            REPORT("INFO", "\n".join(msg))
+            return
         stamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         newfile = f"{dbpath}_{stamp}"
-    copyfile(dbpath, newfile)
-    existing = sorted(glob(dbpath + "_*"))
+    backup_database(dbpath, newfile)
+    existing = sorted(
+        f for f in glob(dbpath + "_*") if not f.endswith(".part")
+    )
     msg = [T["BACKUP_TO"].format(f=newfile)]
-    for f in existing[:-5]:
+    for f in existing[:-BACKUP_KEEP]:
         msg.append(T["REMOVE_OLD_BACKUP"].format(f=f))
         os.remove(f)
     REPORT("INFO", "\n".join(msg))
 
 
+def db_backup_store():
+    """Save a backup of the database in the backup store.
+    The backup is split into chunks, each of which is saved, compressed,
+    under its hash – unless it is already present. A "manifest" file
+    lists the chunks of the backup. As most of a database doesn't
+    change from one backup to the next, each new backup needs little
+    additional space.
+    Return the path to the manifest.
+    """
+    store = DATAPATH(STORE_FOLDER)
+    stamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    tmp = os.path.join(store, f"{stamp}.sqlite")
+    os.makedirs(store, exist_ok=True)
+    backup_database(DATAPATH(DATABASE), tmp)
+    chunks = []
+    try:
+        with open(tmp, "rb") as fh:
+            while True:
+                data = fh.read(STORE_CHUNK_SIZE)
+                if not data:
+                    break
+                h = hashlib.sha256(data).hexdigest()
+                cpath = os.path.join(store, h[:2], h)
+                if not os.path.isfile(cpath):
+                    os.makedirs(os.path.dirname(cpath), exist_ok=True)
+                    with open(cpath + ".part", "wb") as cfh:
+                        cfh.write(zlib.compress(data))
+                    os.replace(cpath + ".part", cpath)
+                chunks.append(h)
+    finally:
+        os.remove(tmp)
+    manifest = os.path.join(store, f"{stamp}.json")
+    with open(manifest, "w", encoding="utf-8") as fh:
+        json.dump({"DATABASE": DATABASE, "CHUNKS": chunks}, fh)
+    return manifest
+
+
+def prune_backup_store(keep=STORE_KEEP):
+    """Remove all but the latest <keep> backups from the backup store,
+    together with the chunks which are no longer needed.
+    Return the paths of the removed manifests.
+    """
+    store = DATAPATH(STORE_FOLDER)
+    manifests = sorted(glob(os.path.join(store, "*.json")))
+    removed = manifests[:-keep] if keep > 0 else manifests
+    if not removed:
+        return []
+    needed = set()
+    for manifest in manifests[len(removed):]:
+        with open(manifest, "r", encoding="utf-8") as fh:
+            needed.update(json.load(fh)["CHUNKS"])
+    for manifest in removed:
+        os.remove(manifest)
+    for cpath in glob(os.path.join(store, "??", "*")):
+        if os.path.basename(cpath) not in needed:
+            os.remove(cpath)
+    return removed
+
+
+def db_restore_store(manifest, target):
+    """Rebuild the database backup described by the given manifest file
+    (see <db_backup_store>) as the file <target>.
+    """
+    store = os.path.dirname(manifest)
+    with open(manifest, "r", encoding="utf-8") as fh:
+        chunks = json.load(fh)["CHUNKS"]
+    with open(target, "wb") as fh:
+        for h in chunks:
+            with open(os.path.join(store, h[:2], h), "rb") as cfh:
+                data = zlib.decompress(cfh.read())
+            if hashlib.sha256(data).hexdigest() != h:
+                raise Bug(f"Corrupt backup chunk {h} in {store}")
+            fh.write(data)
+
+
 """
 def table_extent(table):
     query = QSqlQuery(
@@ -388,6 +562,52 @@ def db_update_field(table, field, value, *wheres, **keys):
     return db_update_fields(table, [(field, value)], *wheres, **keys)
 
 
+def db_update_rows(table, key_field, updates):
+    """Update many records in a single transaction.
+    <updates> is an iterable of (key, field_values) pairs, where
+    <field_values> is a list of (field, value) pairs for the record
+    whose <key_field> has the value <key>.
+    A prepared statement is used for each distinct list of fields, the
+    values are bound, so no quoting is necessary.
+    If any update fails, the whole transaction is rolled back.
+    Return the number of records updated.
+    """
+    con = QSqlDatabase.database()
+    queries = {}
+    n = 0
+    if not con.transaction():
+        raise Bug(f"DB error: {con.lastError().text()}")
+    try:
+        for key, field_values in updates:
+            fields = tuple(f for f, v in field_values)
+            try:
+                query = queries[fields]
+            except KeyError:
+                f = ", ".join(f'"{_f}" = ?' for _f in fields)
+                qtext = f'UPDATE {table} SET {f} WHERE "{key_field}" = ?'
+                query = QSqlQuery(con)
+                if not query.prepare(qtext):
+                    raise Bug(f"DB error: {query.lastError()} ...\n  {qtext}")
+                queries[fields] = query
+            for f, v in field_values:
+                if not isinstance(v, (str, int)):
+                    raise Bug(f"Unexpected field value: '{repr(v)}' for '{f}'")
+                query.addBindValue(v)
+            query.addBindValue(key)
+            if not query.exec():
+                raise Bug(
+                    f"DB error: {query.lastError()} ...\n"
+                    f"  {table}: {key_field} = {key}"
+                )
+            n += query.numRowsAffected()
+    except:
+        con.rollback()
+        raise
+    if not con.commit():
+        raise Bug(f"DB error: {con.lastError().text()}")
+    return n
+
+
 def sql_insert_from_dict(table, field_dict):
     flist, vlist = [], []
     for f, v in field_dict.items():
@@ -414,6 +634,33 @@ def db_new_row(table, **values):
     return None
 
 
+def db_new_unique_row(table, key_fields, **values):
+    """Add a new record unless there is already one with the same values
+    in the fields listed in <key_fields>. This is done in a single
+    statement, so it also works when another connection is adding the
+    same record at the same time.
+    Return true if the record was added.
+    """
+    fields = list(values)
+    f = ", ".join(f'"{_f}"' for _f in fields)
+    v = ", ".join("?" for _f in fields)
+    w = " AND ".join(f'"{_k}" = ?' for _k in key_fields)
+    qtext = (
+        f"INSERT INTO {table} ({f}) SELECT {v}"
+        f" WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {w})"
+    )
+    query = QSqlQuery()
+    if not query.prepare(qtext):
+        raise Bug(f"DB error: {query.lastError()} ...\n  {qtext}")
+    for _f in fields:
+        query.addBindValue(values[_f])
+    for _k in key_fields:
+        query.addBindValue(values[_k])
+    if query.exec():
+        return query.numRowsAffected() == 1
+    raise Bug(f"DB error: {query.lastError()} ...\n  {qtext}")
+
+
 def db_delete_rows(table, *wheres, **keys):
     where_cond = [w for w in wheres]
     for k, v in keys.items():
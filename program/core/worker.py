@@ -0,0 +1,139 @@
+"""
+core/worker.py
+
+Last updated:  2026-10-19
+
+A pool of worker processes for CPU-bound jobs.
+
+The workers are started by "spawn": forking the calling process (which
+may be the GUI, with running threads) is not safe. A process started
+by "spawn" normally imports the main module of the calling program (as
+"__mp_main__") before it does anything else. The main modules of this
+program are not suitable for that – they set up the GUI, or they need
+the builtins from <core.base> and <start.setup> at module level – so
+the workers are started with this module as their main module. It has
+no imports from the program at module level. The workers then set up
+the builtins (and, if required, the database connection) like the
+calling process.
+
+=+LICENCE=============================
+Copyright 2026 Michael Towers
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+=-LICENCE========================================
+"""
+
+###############################################################
+
+import sys, os
+from typing import Optional
+from concurrent.futures import Future
+import multiprocessing
+
+### -----
+
+# An exception raised while setting up a worker process. It is passed
+# on to each job, so that the jobs fail instead of the pool restarting
+# the worker again and again.
+__setup_error = None
+
+
+def init_worker(datadir: Optional[str], database: bool):
+    """Set up a worker process: the builtins (see <core.base>), using
+    the data folder of the calling process – if it has one – and, if
+    <database> is true, the connection to the database.
+    """
+    global __setup_error
+    try:
+        from core.base import start
+
+        if datadir:
+            start.setup(datadir)
+        if database:
+            # The workers have no windows
+            os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+            from core.db_access import open_database
+
+            # The calling process has made the monthly backup, if
+            # necessary
+            open_database(monthly_backup=False)
+    except Exception as e:
+        __setup_error = e
+
+
+def run_in_worker(function, *args):
+    """Call <function> with the given arguments in a worker process.
+    """
+    if __setup_error is not None:
+        raise __setup_error
+    return function(*args)
+
+
+class WorkerPool:
+    """A "context manager" for a pool of worker processes, see the
+    module docstring.
+    """
+    def __init__(self, processes: Optional[int] = None, database=False):
+        """<processes> is the number of worker processes, default is
+        the number of CPUs. If <database> is true, the workers open a
+        connection to the database (of the current data folder).
+        """
+        from core.base import start
+
+        context = multiprocessing.get_context("spawn")
+        # The main module of the workers is this module. They are all
+        # started when the pool is created.
+        main = sys.modules["__main__"]
+        sys.modules["__main__"] = sys.modules[__name__]
+        try:
+            self.pool = context.Pool(
+                processes,
+                initializer=init_worker,
+                initargs=(start.datadir(), database),
+            )
+        finally:
+            sys.modules["__main__"] = main
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.pool.close()
+        else:
+            self.pool.terminate()
+        self.pool.join()
+        return False
+
+    def submit(self, function, *args) -> Future:
+        """Run <function> with the given arguments in a worker process.
+        Return a <Future> for the result.
+        """
+        future = Future()
+        self.pool.apply_async(
+            run_in_worker,
+            (function, *args),
+            callback=future.set_result,
+            error_callback=future.set_exception,
+        )
+        return future
+
+    def map(self, function, iterable) -> list:
+        """Return the list of the results of <function> applied to the
+        items of <iterable>, which are processed in the worker
+        processes.
+        """
+        return [
+            f.result() for f in [self.submit(function, x) for x in iterable]
+        ]
@@ -0,0 +1,291 @@
+"""
+grades/grade_contention.py
+
+Last updated:  2026-10-19
+
+A benchmark for concurrent grade entry. Several processes ("writers",
+like teachers working in separate instances of the program) update the
+grades of the pupils of one class-group in a scratch database at the
+same time. Each writer has loaded the grade table at the start and
+enters grades in "its own" subject only, so there are no real
+conflicts: every grade missing at the end has been lost by being
+overwritten.
+
+Two ways of saving are compared, both using the functions of the
+program:
+    "overwrite": the whole grade map of the pupil is written (by
+        <db_access.db_update_fields>), the last write wins (the
+        behaviour before versioned entries);
+    "versioned": <grades_base.update_grade_entry>, compare-and-swap on
+        the VERSION field of the entry, merging the changes on
+        conflicts.
+The writers are started by "spawn", each one opening its own connection
+to the scratch database, with the settings of <db_access.db_pragmas>.
+The grade history entries go to a scratch database, too.
+
+Usage:
+    python grade_contention.py [writers [updates-per-writer]]
+
+=+LICENCE=============================
+Copyright 2026 Michael Towers
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+=-LICENCE========================================
+"""
+
+PUPILS = 30         # number of pupils in the scratch class-group
+SUBJECTS = 16       # number of subjects, at least the number of writers
+
+###############################################################
+
+import sys, os
+
+if __name__ == "__main__":
+    # Enable package import if running as module
+    this = sys.path[0]
+    appdir = os.path.dirname(this)
+    sys.path[0] = appdir
+    basedir = os.path.dirname(appdir)
+    from core.base import start
+
+    #    start.setup(os.path.join(basedir, 'TESTDATA'))
+    start.setup(os.path.join(basedir, "DATA-2023"))
+
+### +++++
+
+from time import perf_counter
+from typing import NamedTuple
+import builtins
+import multiprocessing
+import random
+import sqlite3
+import tempfile
+
+from core.base import start
+from core.db_access import (
+    db_pragmas,
+    db_read_table,
+    db_update_fields,
+    read_pairs,
+    write_pairs_dict,
+)
+from grades.grades_base import (
+    GRADE_HISTORY,
+    grade_history_db,
+    update_grade_entry,
+)
+from ui.ui_base import (
+    ### QtSql:
+    QSqlDatabase,
+    QSqlQuery,
+)
+
+### -----
+
+KEY = ("1. Halbjahr", "11G", "")    # OCCASION, CLASS_GROUP, INSTANCE
+
+
+class WriterResult(NamedTuple):
+    seconds: float
+    rejected: int
+    last: dict[str, str]        # {pid: last grade entered}
+
+
+def make_database(dbpath: str):
+    """Create a scratch database with GRADES and GRADES_INFO tables,
+    containing a grade entry for each pupil.
+    """
+    con = sqlite3.connect(dbpath)
+    with con:
+        con.execute(
+            "CREATE TABLE GRADES_INFO (OCCASION TEXT, CLASS_GROUP TEXT,"
+            " INSTANCE TEXT, DATE_ISSUE TEXT, DATE_GRADES TEXT,"
+            " MODIFIED TEXT)"
+        )
+        con.execute(
+            "INSERT INTO GRADES_INFO VALUES (?, ?, ?, '', '', '')", KEY
+        )
+        con.execute(
+            "CREATE TABLE GRADES (OCCASION TEXT, CLASS_GROUP TEXT,"
+            " INSTANCE TEXT, PID TEXT, LEVEL TEXT, GRADE_MAP TEXT,"
+            " VERSION INTEGER NOT NULL DEFAULT 0,"
+            " UNIQUE (OCCASION, CLASS_GROUP, INSTANCE, PID))"
+        )
+        grades = {f"S{s:02}": "" for s in range(SUBJECTS)}
+        con.executemany(
+            "INSERT INTO GRADES VALUES (?, ?, ?, ?, ?, ?, 0)",
+            [
+                (*KEY, f"P{p:03}", "Gym", write_pairs_dict(grades))
+                for p in range(PUPILS)
+            ]
+        )
+    con.close()
+
+
+def open_scratch_database(dbpath: str):
+    """Open the QtSql default connection to the scratch database, as
+    <db_access.open_database> does for the real one.
+    """
+    con = QSqlDatabase.addDatabase("QSQLITE")
+    con.setDatabaseName(dbpath)
+    if not con.open():
+        raise Bug(f"Cannot open database at {dbpath}")
+    for pragma in db_pragmas():
+        if not QSqlQuery(pragma).isActive():
+            raise Bug(f"Failed: {pragma}")
+
+
+def load_table() -> dict:
+    """Load the "grade table", with the fields of a <FullGradeTable>
+    which are needed by <update_grade_entry>.
+    """
+    occasion, class_group, instance = KEY
+    table = {
+        "OCCASION": occasion,
+        "CLASS_GROUP": class_group,
+        "INSTANCE": instance,
+        "MODIFIED": "",
+        "PUPIL_LIST": {},
+        "STORED_VERSIONS": {},
+    }
+    for pid, version, gmap in db_read_table(
+        "GRADES",
+        ["PID", "VERSION", "GRADE_MAP"],
+        OCCASION=occasion,
+        CLASS_GROUP=class_group,
+        INSTANCE=instance,
+    )[1]:
+        grades = dict(read_pairs(gmap))
+        table["STORED_VERSIONS"][pid] = (version, grades)
+        table["PUPIL_LIST"][pid] = (
+            {"PID": pid, "FIRSTNAME": "Pupil", "LASTNAME": pid},
+            dict(grades),
+        )
+    return table
+
+
+def writer(datadir, dbpath, sid, n, versioned, barrier, results):
+    """Enter <n> grades in subject <sid> for randomly chosen pupils.
+    This is run in a new process, <datadir> is the data folder of the
+    main process.
+    The result (a <WriterResult>) is put in the queue <results>.
+    """
+    start.setup(datadir)
+    open_scratch_database(dbpath)
+    grade_history_db(
+        os.path.join(os.path.dirname(dbpath), GRADE_HISTORY)
+    )
+    # Count the rejected changes, reported as warnings
+    rejected = 0
+
+    def report(mtype, text):
+        nonlocal rejected
+        if mtype == "WARNING":
+            rejected += 1
+
+    builtins.REPORT = report
+    occasion, class_group, instance = KEY
+    table = load_table()
+    pids = sorted(table["STORED_VERSIONS"])
+    rng = random.Random(sid)
+    last = {}
+    barrier.wait()
+    t0 = perf_counter()
+    for i in range(n):
+        pid = rng.choice(pids)
+        version, base = table["STORED_VERSIONS"][pid]
+        grades = dict(base)
+        grades[sid] = f"{rng.randint(0, 15):02}"
+        last[pid] = grades[sid]
+        if versioned:
+            update_grade_entry(table, pid, grades)
+        else:
+            db_update_fields(
+                "GRADES",
+                [("GRADE_MAP", write_pairs_dict(grades))],
+                OCCASION=occasion,
+                CLASS_GROUP=class_group,
+                INSTANCE=instance,
+                PID=pid,
+            )
+            table["STORED_VERSIONS"][pid] = (version, grades)
+    results.put((sid, WriterResult(perf_counter() - t0, rejected, last)))
+
+
+def run(writers: int, n: int, versioned: bool) -> dict:
+    """Run the benchmark with the given number of writers, each
+    entering <n> grades.
+    Return the collected results.
+    """
+    if writers > SUBJECTS:
+        raise Bug(f"At most {SUBJECTS} writers are possible")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        dbpath = os.path.join(tmpdir, "contention.sqlite")
+        make_database(dbpath)
+        ctx = multiprocessing.get_context("spawn")
+        barrier = ctx.Barrier(writers)
+        results = ctx.Queue()
+        processes = [
+            ctx.Process(
+                target=writer,
+                args=(
+                    start.datadir(), dbpath, f"S{w:02}", n, versioned,
+                    barrier, results
+                ),
+            )
+            for w in range(writers)
+        ]
+        for p in processes:
+            p.start()
+        wresults = dict(results.get() for p in processes)
+        for p in processes:
+            p.join()
+        # Count the grades which have been lost
+        con = sqlite3.connect(dbpath)
+        final = {
+            pid: dict(read_pairs(gmap))
+            for pid, gmap in con.execute("SELECT PID, GRADE_MAP FROM GRADES")
+        }
+        con.close()
+    lost = sum(
+        final[pid].get(sid) != g
+        for sid, r in wresults.items()
+        for pid, g in r.last.items()
+    )
+    seconds = max(r.seconds for r in wresults.values())
+    return {
+        "MODE": "versioned" if versioned else "overwrite",
+        "WRITERS": writers,
+        "UPDATES": writers * n,
+        "SECONDS": seconds,
+        "RATE": writers * n / seconds,
+        "REJECTED": sum(r.rejected for r in wresults.values()),
+        "LOST": lost,
+    }
+
+
+# --#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
+
+if __name__ == "__main__":
+    _writers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    _n = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    for _w in sorted({1, 2, _writers}):
+        for _versioned in (False, True):
+            r = run(_w, _n, _versioned)
+            print(
+                f"{r['MODE']:>10}: {r['WRITERS']:2} writers,"
+                f" {r['UPDATES']:6} updates in {r['SECONDS']:.2f} s"
+                f" ({r['RATE']:.0f}/s), {r['REJECTED']} rejected,"
+                f" {r['LOST']} grades lost"
+            )
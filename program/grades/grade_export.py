@@ -0,0 +1,416 @@
+"""
+grades/grade_export.py
+
+Last updated:  2026-10-19
+
+Export the stored grades of one or more school-years as a single table
+in "long" format, one row per grade:
+    SCHOOLYEAR, OCCASION, CLASS_GROUP, INSTANCE, PID, SID, GRADE, VALUE
+This is intended for use in analysis tools.
+
+The grades are read from the GRADES table in the database of each year
+and from the older grade files ("NOTEN_*/Noten_*.json.gz", or with one
+of the other endings of the compressed data files). The rows are
+processed in batches, so that the memory needed doesn't depend on the
+amount of data.
+
+If the package pyarrow is available, the table can be written as a
+Parquet file (ending ".parquet") or as an Arrow IPC file (ending
+".arrow"). Otherwise – or with the ending ".csv.gz" – a gzip-compressed
+csv-file is written.
+
+VALUE is the grade as a number on the 0 – 15 point scale: two-digit
+grades ("00" – "15") are taken as points, grades "1+" – "6" are
+converted according to <GRADE_NUMBER>. Other entries (e.g. "nt", or
+the fields which are not grades) have no value.
+
+=+LICENCE=============================
+Copyright 2026 Michael Towers
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+=-LICENCE========================================
+"""
+
+BATCH_ROWS = 65536  # number of rows written at a time
+
+###############################################################
+
+import sys, os
+
+if __name__ == "__main__":
+    # Enable package import if running as module
+    this = sys.path[0]
+    appdir = os.path.dirname(this)
+    sys.path[0] = appdir
+    basedir = os.path.dirname(appdir)
+    from core.base import start
+
+    #    start.setup(os.path.join(basedir, 'TESTDATA'))
+    start.setup(os.path.join(basedir, "DATA-2023"))
+
+T = TRANSLATIONS("grades.grade_export")
+
+### +++++
+
+from typing import Iterable, Iterator, Optional
+from glob import glob
+import csv
+import gzip
+import json
+import sqlite3
+
+import numpy
+
+try:
+    import pyarrow
+    import pyarrow.csv
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+try:
+    import lz4.frame as lz4frame
+except ImportError:
+    lz4frame = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from core.base import start
+from core.db_access import DATABASE, read_pairs
+from local.grade_processing import GRADE_NUMBER
+
+### -----
+
+# The endings of the older grade files (as in the module
+# <tables.datapack> of the older program version), with the package
+# needed for decompression
+PACK_ENDINGS = {
+    ".json.gz": "gzip",
+    ".json.lz4": "lz4",
+    ".json.zst": "zstandard",
+}
+
+COLUMNS = (
+    "SCHOOLYEAR",
+    "OCCASION",
+    "CLASS_GROUP",
+    "INSTANCE",
+    "PID",
+    "SID",
+    "GRADE",
+)   # + "VALUE"
+
+
+def grade_value(grade: str) -> Optional[int]:
+    """Return the grade as a number on the 0 – 15 point scale, <None>
+    if it is not a grade.
+    """
+    if len(grade) == 2 and grade.isdigit():
+        v = int(grade)
+        return v if v <= 15 else None
+    return GRADE_NUMBER.get(grade)
+
+
+def db_grade_rows(schoolyear: str, dbpath: str = None) -> Iterator[tuple]:
+    """Read the grades stored in the database of the given year (or
+    the database at <dbpath>). The database is opened read-only with
+    its own connection, so that the program's connection is not
+    affected.
+    Generate the rows (see <COLUMNS>), without the value.
+    """
+    if dbpath is None:
+        dbpath = start.year_data_path(schoolyear, DATABASE)
+    con = sqlite3.connect(f"file:{dbpath}?mode=ro", uri=True)
+    try:
+        for occasion, class_group, instance, pid, grade_map in con.execute(
+            "SELECT OCCASION, CLASS_GROUP, INSTANCE, PID, GRADE_MAP"
+            " FROM GRADES"
+        ):
+            for sid, grade in read_pairs(grade_map):
+                yield (
+                    schoolyear, occasion, class_group, instance or "",
+                    pid, sid, grade
+                )
+    finally:
+        con.close()
+
+
+def read_pack(path: str, ending: str) -> Optional[dict]:
+    """Read an older grade file, <ending> is one of <PACK_ENDINGS>.
+    Return <None> if the package needed for decompression is not
+    installed.
+    """
+    with open(path, "rb") as fh:
+        data = fh.read()
+    if ending == ".json.gz":
+        data = gzip.decompress(data)
+    elif ending == ".json.lz4":
+        if lz4frame is None:
+            return None
+        data = lz4frame.decompress(data)
+    else:
+        if zstandard is None:
+            return None
+        data = zstandard.ZstdDecompressor().decompressobj().decompress(
+            data
+        )
+    return json.loads(data)
+
+
+def pack_grade_rows(folder: str) -> Iterator[tuple]:
+    """Read the grades from the older grade files in the given folder
+    (the data folder of a school-year), "NOTEN_*/Noten_*.json.gz" or
+    with one of the other <PACK_ENDINGS>. If there are files with
+    different endings for the same grade table, the most recently
+    modified one is used.
+    There are several versions of these files: the general information
+    is either in "HEADER" or at the top level, the pupils are in
+    "MEMBERS" or "__PUPILS__", the grades in "__DATA__" or in
+    "__GRADES__" and "__EXTRA__".
+    Generate the rows (see <COLUMNS>), without the value.
+    """
+    files = {}  # {path without ending: (mtime, path, ending)}
+    for ending in PACK_ENDINGS:
+        pattern = os.path.join(folder, "NOTEN_*", f"Noten_*{ending}")
+        for path in glob(pattern):
+            mtime = os.stat(path).st_mtime_ns
+            stem = path[:-len(ending)]
+            if stem not in files or mtime > files[stem][0]:
+                files[stem] = (mtime, path, ending)
+    for stem in sorted(files):
+        mtime, path, ending = files[stem]
+        data = read_pack(path, ending)
+        if data is None:
+            REPORT("WARNING", T["NO_PACK_CODEC"].format(
+                package=PACK_ENDINGS[ending], path=path
+            ))
+            continue
+        header = data.get("HEADER") or data
+        schoolyear = str(header["SCHOOLYEAR"])
+        occasion = header["TERM"]
+        group = header["GROUP"]
+        for pdata in data.get("MEMBERS") or data.get("__PUPILS__") or []:
+            pid = pdata["PID"]
+            for key in ("__DATA__", "__GRADES__", "__EXTRA__"):
+                for sid, grade in (pdata.get(key) or {}).items():
+                    yield (schoolyear, occasion, group, "", pid, sid, grade)
+
+
+def year_grade_rows(
+    schoolyears: Iterable[str] = (),
+    pack_folders: Iterable[str] = (),
+) -> Iterator[tuple]:
+    """Generate the rows for the given school-years (from the
+    databases) and from the older grade files in the given folders.
+    """
+    for schoolyear in schoolyears:
+        yield from db_grade_rows(schoolyear)
+    for folder in pack_folders:
+        yield from pack_grade_rows(folder)
+
+
+def batches(rows: Iterable[tuple]) -> Iterator[dict[str, list]]:
+    """Collect the rows in batches of at most <BATCH_ROWS> rows, as
+    column lists: {column: [value, ...], ... }. The column VALUE is
+    added.
+    """
+    batch = None
+    for row in rows:
+        if batch is None:
+            batch = {c: [] for c in COLUMNS}
+            batch["VALUE"] = []
+            n = 0
+        for c, v in zip(COLUMNS, row):
+            batch[c].append(v)
+        batch["VALUE"].append(grade_value(row[-1]))
+        n += 1
+        if n == BATCH_ROWS:
+            yield batch
+            batch = None
+    if batch is not None:
+        yield batch
+
+
+def export_grades(
+    filepath: str,
+    schoolyears: Iterable[str] = (),
+    pack_folders: Iterable[str] = (),
+) -> str:
+    """Write the grades for the given school-years (see
+    <year_grade_rows>) to the file <filepath>. The format depends on
+    the file ending, see the module docstring. If pyarrow is not
+    available, the ending is changed to ".csv.gz".
+    Return the path of the file written.
+    """
+    rows = year_grade_rows(schoolyears, pack_folders)
+    if filepath.endswith(".csv.gz"):
+        return write_csv(filepath, rows)
+    base, ending = os.path.splitext(filepath)
+    if ending not in (".parquet", ".arrow"):
+        raise Bug(f"Unsupported grade export file type: {filepath}")
+    if pyarrow is None:
+        fpath = base + ".csv.gz"
+        REPORT("WARNING", T["NO_PYARROW"].format(path=fpath))
+        return write_csv(fpath, rows)
+    schema = arrow_schema()
+    n = 0
+    if ending == ".parquet":
+        writer = pyarrow.parquet.ParquetWriter(
+            filepath, schema, compression="zstd"
+        )
+    else:
+        writer = pyarrow.ipc.new_file(
+            filepath,
+            schema,
+            options=pyarrow.ipc.IpcWriteOptions(compression="zstd"),
+        )
+    with writer:
+        for batch in batches(rows):
+            writer.write_batch(
+                pyarrow.RecordBatch.from_pydict(batch, schema=schema)
+            )
+            n += len(batch["VALUE"])
+    REPORT("INFO", T["EXPORTED"].format(n=n, path=filepath))
+    return filepath
+
+
+def arrow_schema():
+    return pyarrow.schema(
+        [(c, pyarrow.string()) for c in COLUMNS]
+        + [("VALUE", pyarrow.int8())]
+    )
+
+
+def write_csv(filepath: str, rows: Iterable[tuple]) -> str:
+    """Write the rows as a gzip-compressed csv-file with a header line.
+    Return the path of the file.
+    """
+    n = 0
+    with gzip.open(filepath, "wt", encoding="utf-8", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(COLUMNS + ("VALUE",))
+        for row in rows:
+            v = grade_value(row[-1])
+            writer.writerow(row + ("" if v is None else v,))
+            n += 1
+    REPORT("INFO", T["EXPORTED"].format(n=n, path=filepath))
+    return filepath
+
+
+def load_grades(
+    filepath: str,
+    columns: Optional[list[str]] = None,
+) -> dict[str, numpy.ndarray]:
+    """Read a file written by <export_grades>.
+    Return the columns (all or those in <columns>) as a mapping
+    {column: array}. The VALUE column is a float array, the entries
+    without value being NaN, the other columns are object arrays
+    (containing <str>).
+    """
+    if columns is None:
+        columns = list(COLUMNS) + ["VALUE"]
+    if pyarrow is not None:
+        if filepath.endswith(".parquet"):
+            table = pyarrow.parquet.read_table(filepath, columns=columns)
+        elif filepath.endswith(".arrow"):
+            with pyarrow.ipc.open_file(filepath) as reader:
+                table = reader.read_all().select(columns)
+        else:
+            table = pyarrow.csv.read_csv(
+                filepath,
+                convert_options=pyarrow.csv.ConvertOptions(
+                    column_types={c: pyarrow.string() for c in COLUMNS}
+                    | {"VALUE": pyarrow.int8()},
+                    include_columns=columns,
+                    strings_can_be_null=False,
+                ),
+            )
+        data = {}
+        for c in columns:
+            col = table.column(c)
+            if c == "VALUE":
+                data[c] = col.cast(pyarrow.float64()).to_numpy()
+            else:
+                data[c] = col.to_numpy(zero_copy_only=False)
+        return data
+    # Without pyarrow only the csv format can be read
+    if not filepath.endswith(".csv.gz"):
+        raise Bug(f"Grade export can't be read without pyarrow: {filepath}")
+    with gzip.open(filepath, "rt", encoding="utf-8", newline="") as fh:
+        reader = csv.reader(fh)
+        header = next(reader)
+        indexes = [header.index(c) for c in columns]
+        lists = [[] for c in columns]
+        for row in reader:
+            for i, l in zip(indexes, lists):
+                l.append(row[i])
+    data = {}
+    for c, l in zip(columns, lists):
+        if c == "VALUE":
+            data[c] = numpy.array(
+                [float(v) if v else numpy.nan for v in l], dtype=float
+            )
+        else:
+            data[c] = numpy.array(l, dtype=object)
+    return data
+
+
+def mean_values(
+    data: dict[str, numpy.ndarray],
+    keys: tuple[str, ...] = ("SCHOOLYEAR", "SID"),
+) -> dict[tuple, tuple[float, int]]:
+    """Return the mean grade value and the number of values for each
+    combination of the given key columns, e.g. for each year and
+    subject: {(schoolyear, sid): (mean, count), ... }.
+    <data> is the result of <load_grades>, it must include the key
+    columns and VALUE.
+    """
+    values = data["VALUE"]
+    valid = ~numpy.isnan(values)
+    values = values[valid]
+    # Combine the key columns to a single integer code
+    code = numpy.zeros(len(values), dtype=numpy.int64)
+    uniques = []
+    for k in keys:
+        u, inverse = numpy.unique(
+            data[k][valid].astype(str), return_inverse=True
+        )
+        code = code * len(u) + inverse
+        uniques.append(u)
+    groups, inverse = numpy.unique(code, return_inverse=True)
+    counts = numpy.bincount(inverse)
+    sums = numpy.bincount(inverse, weights=values)
+    result = {}
+    for g, s, n in zip(groups.tolist(), sums.tolist(), counts.tolist()):
+        key = []
+        for u in reversed(uniques):
+            g, i = divmod(g, len(u))
+            key.append(str(u[i]))
+        result[tuple(reversed(key))] = (s / n, n)
+    return result
+
+
+# --#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
+
+if __name__ == "__main__":
+    fpath = export_grades(
+        DATAPATH("testing/tmp/grades.parquet"),
+        schoolyears=[SCHOOLYEAR],
+        pack_folders=[os.path.join(basedir, "TESTDATA", "Schuljahre", "2016")],
+    )
+    data = load_grades(fpath)
+    for key, (mean, n) in sorted(mean_values(data).items()):
+        print(f"{key}: {mean:.2f} ({n})")
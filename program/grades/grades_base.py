@@ -1,7 +1,7 @@
 """
 grades/gradetable.py
 
-Last updated:  2023-06-16
+Last updated:  2026-10-19
 
 Access grade data, read and build grade tables.
 
@@ -54,26 +54,41 @@ T = TRANSLATIONS("grades.grades_base")
 
 from typing import Optional
 import datetime
+from heapq import heapify, heappush, heappop
+from glob import glob
+import sqlite3
 
-from core.base import class_group_split, Dates
+from core.base import start, class_group_split, Dates
 from core.db_access import (
+    DATABASE,
+    db_pragmas,
+    db_query,
     db_read_table,
     read_pairs,
     db_new_row,
+    db_new_unique_row,
     db_delete_rows,
     db_update_field,
+    db_update_fields,
     write_pairs_dict,
 )
 from core.basic_data import SHARED_DATA
 from core.pupils import pupil_name, pupil_data
 from core.report_courses import get_pupil_grade_matrix
 from tables.spreadsheet import read_DataTable
-from tables.matrix import KlassMatrix
+from tables.matrix import KlassMatrix, save_tables
 from local.grade_processing import GradeFunction
 
 NO_GRADE = "–"  # shown in cells which are not defined for a pupil ...
 # e.g. subjects not taken (NOT stored in the database)
 
+# Attempts to save a pupil's grades when other users are changing them
+# at the same time (see <update_grade_entry>)
+GRADE_UPDATE_RETRIES = 10
+
+# The index of the grades of all years (see <grade_history_db>)
+GRADE_HISTORY = "GRADE_HISTORY.sqlite"
+
 ### -----
 
 
@@ -187,6 +202,92 @@ class PupilRows(list):
             self.append(p, g)
 
 
+class GradeMap(dict):
+    """A custom representation of a pupil's grades (etc.).
+    It is a mapping which keeps track of the changed entries, so that
+    only the fields depending on these need to be recalculated (see
+    <calculate_grades>). Only item assignment and "update" are tracked,
+    using other methods to change the contents might well make a mess ...
+    """
+    def __init__(self):
+        super().__init__()
+        self.__changes = {}
+
+    def __setitem__(self, key, value):
+        try:
+            old = self[key]
+        except KeyError:
+            old = None
+        if old != value:
+            if key not in self.__changes:
+                self.__changes[key] = old
+            super().__setitem__(key, value)
+
+    def update(self, other=(), **kargs):
+        for k, v in dict(other, **kargs).items():
+            self[k] = v
+
+    def pending_changes(self) -> dict[str, Optional[str]]:
+        """Return the changed entries since the last call of
+        <take_changes>, as a mapping {sid: old value}. The old value is
+        <None> for new entries.
+        """
+        return {
+            k: v
+            for k, v in self.__changes.items()
+            if self.get(k) != v
+        }
+
+    def take_changes(self) -> dict[str, Optional[str]]:
+        """Return the changed entries since the last call (see
+        <pending_changes>) and start tracking afresh.
+        """
+        changes = self.pending_changes()
+        self.__changes.clear()
+        return changes
+
+
+class GradeDependencies:
+    """The calculated fields (COMPOSITE and CALCULATE entries of the
+    column lists) in evaluation order, with a look-up table for the
+    calculations which use a particular field:
+        {sid: [index, ... ], ... }
+    This is built once for a grade table (see <grade_dependencies>).
+    """
+    def __init__(self, column_lists: dict):
+        self.functions = (
+            list(column_lists["COMPOSITE"])
+            + list(column_lists["CALCULATE"])
+        )
+        self.consumers = {}
+        for i, sdata in enumerate(self.functions):
+            for sid in sdata["PARAMETERS"]["COMPONENTS"]:
+                try:
+                    self.consumers[sid].append(i)
+                except KeyError:
+                    self.consumers[sid] = [i]
+
+    def affected(self, sids) -> list[int]:
+        """Return the indexes of the calculations directly using
+        any of the given fields.
+        """
+        return sorted(
+            {i for sid in sids for i in self.consumers.get(sid, ())}
+        )
+
+
+def grade_dependencies(table: dict) -> GradeDependencies:
+    """Return the calculation dependencies for the given grade table.
+    """
+    try:
+        return table["DEPENDENCIES"]
+    except KeyError:
+        pass
+    deps = GradeDependencies(table["COLUMNS"])
+    table["DEPENDENCIES"] = deps
+    return deps
+
+
 def grade_table_info(occasion: str, class_group: str, instance: str = ""):
     """Get subject, pupil and group report-information for the given
     parameters.
@@ -434,7 +535,10 @@ def read_stored_grades(
 ) -> list[tuple[dict, dict]]:
     """Return an ordered list containing personal info and grade info
     from the database for each pupil covered by the parameters.
+    The version of the database entry is added to the personal info
+    as "__VERSION__" (see <update_grade_entry>).
     """
+    ensure_grade_versions()
     fields = [
         # "OCCASION",
         # "CLASS_GROUP",
@@ -442,6 +546,7 @@ def read_stored_grades(
         "PID",
         "LEVEL",  # The level might have changed, so this field is relevant
         "GRADE_MAP",
+        "VERSION",
     ]
     flist, rlist = db_read_table(
         "GRADES",
@@ -460,6 +565,7 @@ def read_stored_grades(
         # Substitute these fields with data from the record
         pdata["CLASS"] = class_group_split(class_group)[0]
         pdata["LEVEL"] = row[1]
+        pdata["__VERSION__"] = row[3]
         # Get grade (etc.) info as mapping
         grade_map = read_pairs(row[2])
         plist.append((pdata, dict(grade_map)))
@@ -489,6 +595,9 @@ def prepare_pupil_list(table_info):
     """
     pdata_list = PupilRows()    # [(pdata, grades),  ... ]
     table_info["PUPIL_LIST"] = pdata_list
+    # The database state on which the grades of each pupil are based:
+    #   {pid: (version, grade map), ... }
+    table_info["STORED_VERSIONS"] = {}
     class_group = table_info["CLASS_GROUP"]
     occasion = table_info["OCCASION"]
     instance = table_info["INSTANCE"]
@@ -575,6 +684,9 @@ def prepare_pupil_list(table_info):
                 INSTANCE=instance,
                 PID=pid
             )
+            grade_history_update(
+                SCHOOLYEAR, occasion, class_group, instance, pid, None
+            )
     del(table_info["STORED_GRADES"])
     return table_info
 
@@ -601,7 +713,7 @@ def complete_grademap(column_lists, grades, name, p_grade_tids):
     copied over, they do not belong to the stored data and will be
     calculated anew (later).
     """
-    grade_map = {}
+    grade_map = GradeMap()
     for sdata in column_lists["SUBJECT"]:
         sid = sdata["SID"]
         # print("\n$$$$$$$$", sid, p_grade_tids, grades)
@@ -672,6 +784,10 @@ def complete_gradetable(table, db_pdata, db_grademap, p_grade_tids=None):
         p_grade_tids
     )
     table["PUPIL_LIST"].append(db_pdata, grades)
+    # The version is <None> if there is no database entry
+    table["STORED_VERSIONS"][db_pdata["PID"]] = (
+        db_pdata.get("__VERSION__"), dict(db_grademap)
+    )
     # It cannot be assumed that all the subjects have grades – some
     # will only appear after the calculations. Thus their grades will
     # not (necessarily) be in <grades>. The calculations would need
@@ -682,11 +798,12 @@ def complete_gradetable(table, db_pdata, db_grademap, p_grade_tids=None):
 
 def UpdatePupilGrades(table: dict, pid: str
 ) -> tuple[list[tuple[str, str]], Optional[str]]:
-    """Recalculate table row.
+    """Recalculate table row after changes to the pupil's grade map.
     <table> is the full grade table.
+    Only the fields depending on the changed entries are recalculated.
     Return (changes, timestamp).
-    The changes are to (existing) entries in the initial grade set,
-    in the form [(sid, OLD value), ... ].
+    The changes are to calculated entries, in the form
+    [(sid, OLD value), ... ], where the old value of a new entry is <None>.
     """
     # print("§UPDATE", pid, grades := table["PUPIL_LIST"].get(pid)[1])
     return calculate_grades(table, pid, None)
@@ -697,41 +814,62 @@ def calculate_grades(
     pid: str,
     old_grades:Optional[dict]
 ) -> tuple[list[tuple[str, str]], Optional[str]]:
-    ## Save initial grade map so that changes can be determined
+    """Perform the calculations for the given pupil and save the grades
+    if necessary.
+    If <old_grades> (the database entry) is supplied, all calculations
+    are performed and the grades are saved if they differ from
+    <old_grades>. Otherwise only the fields depending (directly or
+    indirectly) on the entries changed since the last calculation
+    are recalculated, and the grades are saved if a subject or input
+    entry has changed.
+    Return (changes, timestamp), see <UpdatePupilGrades>.
+    """
     grades = table["PUPIL_LIST"].get(pid)[1]
-    grades0 = list(grades.items())
-    ## Perform calculations
+    edited = grades.take_changes()
+    deps = grade_dependencies(table)
+    if old_grades is None:
+        queue = deps.affected(edited)
+    else:
+        queue = list(range(len(deps.functions)))
+    ## Perform calculations, in the order of the column lists
     column_lists = table["COLUMNS"]
-    for slist in ("COMPOSITE", "CALCULATE"):
-        subjects = column_lists[slist]
-        for sdata in subjects:
-            fn = sdata["FUNCTION"]
-            # The function modifies <grades>
-            newsubjects = GradeFunction(fn, sdata, grades, old_grades)
-            # Any column additions?
-            if newsubjects:
-                ctset = set()
-                for ctype, cdata in newsubjects:
-                    cl = column_lists[ctype]
-                    cl.append(cdata)
-                    ctset.add(ctype)
-                for ctype in ctset:
-                    if ctype in ("SUBJECT", "COMPOSITE"):
-                        # Re-sort the column list
-                        column_lists[ctype].sort(
-                            key=lambda k: (k["GROUP"], k["NAME"])
-                        )
-    ## Collect changes to (existing) entries in the initial grade set
-    changes0 = []
-    for sid, g0 in grades0:
-        if grades.get(sid) != g0:
-            changes0.append((sid, g0))
+    heapify(queue)
+    scheduled = set(queue)
+    changes = {}
+    while queue:
+        i = heappop(queue)
+        sdata = deps.functions[i]
+        fn = sdata["FUNCTION"]
+        # The function modifies <grades>
+        newsubjects = GradeFunction(fn, sdata, grades, old_grades)
+        # Any column additions?
+        if newsubjects:
+            ctset = set()
+            for ctype, cdata in newsubjects:
+                cl = column_lists[ctype]
+                cl.append(cdata)
+                ctset.add(ctype)
+            for ctype in ctset:
+                if ctype in ("SUBJECT", "COMPOSITE"):
+                    # Re-sort the column list
+                    column_lists[ctype].sort(
+                        key=lambda k: (k["GROUP"], k["NAME"])
+                    )
+            # The dependencies must be rebuilt for the next calculation
+            table.pop("DEPENDENCIES", None)
+        # Schedule the later calculations which use changed fields
+        for sid, g0 in grades.take_changes().items():
+            changes.setdefault(sid, g0)
+            for j in deps.consumers.get(sid, ()):
+                if j > i and j not in scheduled:
+                    scheduled.add(j)
+                    heappush(queue, j)
     ## Save grades if one or more of the base set (subjects and inputs)
     ## differs from the stored values. Empty values are not saved (the
     ## sid is simply not included in the saved string).
     ## <FullGradeTable> (called before this function) adds missing
     ## subject entries.
-    change = old_grades is None
+    change = False
     base_grades = {}
     for slist in ("SUBJECT", "INPUT"):
         subjects = column_lists[slist]
@@ -741,6 +879,8 @@ def calculate_grades(
             if old_grades is None:
                 if g1:
                     base_grades[sid] = g1
+                if sid in edited or sid in changes:
+                    change = True
             else:
                 g0 = old_grades.get(sid)
                 if g1:
@@ -757,9 +897,18 @@ def calculate_grades(
     if change:
         # Rewrite database entry, getting the timestamp
         t = update_grade_entry(table, pid, base_grades)
+        # Changes made by other users may have been merged in, the
+        # fields depending on these must also be updated
+        merged = grades.pending_changes()
+        if merged:
+            more, _t = calculate_grades(table, pid, None)
+            for sid, g0 in list(merged.items()) + more:
+                changes.setdefault(sid, g0)
+    elif old_grades is None:
+        t = table["MODIFIED"]
     else:
         t = ""
-    return (changes0, t)
+    return (list(changes.items()), t)
 
 
 def update_grade_entry(table: dict, pid: str, grades: dict[str, str]
@@ -767,31 +916,319 @@ def update_grade_entry(table: dict, pid: str, grades: dict[str, str]
     """Update the database GRADES entry of the pupil with id <pid>
     for the occasion/instance of the <table> parameter.
     If there is no existing entry, a new one will be created.
+    Several users may be editing the grades of a group at the same
+    time, so each entry has a version number, which is incremented
+    by every update. The entry is only written if its version is still
+    the one on which the local grades are based. Otherwise the local
+    changes are merged with the current database entry (see
+    <merge_grades>) and the update is tried again. Changes made
+    elsewhere are also applied to the pupil's grades in <table>.
     Return the new timestamp.
     """
-    gstring = write_pairs_dict(grades)
-    OCCASION = table["OCCASION"]
-    CLASS_GROUP = table["CLASS_GROUP"]
-    INSTANCE = table["INSTANCE"]
-    if not db_update_field("GRADES",
-        "GRADE_MAP", gstring,
-        OCCASION=OCCASION,
-        CLASS_GROUP=CLASS_GROUP,
-        INSTANCE=INSTANCE,
-        PID=pid
-    ):
-        db_new_row("GRADES",
-            OCCASION=OCCASION,
-            CLASS_GROUP=CLASS_GROUP,
-            INSTANCE=INSTANCE,
-            PID=pid,
-            LEVEL=pupil_data(pid)["LEVEL"],
-            GRADE_MAP=gstring
-        )
+    keys = {
+        "OCCASION": table["OCCASION"],
+        "CLASS_GROUP": table["CLASS_GROUP"],
+        "INSTANCE": table["INSTANCE"],
+        "PID": pid,
+    }
+    version, base = table["STORED_VERSIONS"][pid]
+    saved = False
+    for i in range(GRADE_UPDATE_RETRIES):
+        if version is not None and grades == base:
+            break   # nothing (more) to save
+        gstring = write_pairs_dict(grades)
+        if version is None:
+            saved = db_new_unique_row("GRADES",
+                list(keys),
+                LEVEL=pupil_data(pid)["LEVEL"],
+                GRADE_MAP=gstring,
+                VERSION=1,
+                **keys
+            )
+        else:
+            saved = db_update_fields("GRADES",
+                [("GRADE_MAP", gstring), ("VERSION", version + 1)],
+                VERSION=version,
+                **keys
+            )
+        if saved:
+            version = 1 if version is None else version + 1
+            base = grades
+            break
+        # The entry has been changed elsewhere
+        rlist = db_read_table("GRADES", ["VERSION", "GRADE_MAP"], **keys)[1]
+        if rlist:
+            db_version, db_grades = rlist[0]
+            db_grades = dict(read_pairs(db_grades))
+        else:
+            db_version, db_grades = None, {}
+        merged, rejected = merge_grades(base, grades, db_grades)
+        if rejected:
+            pname = pupil_name(table["PUPIL_LIST"].get(pid)[0])
+            for sid, g, db_g in rejected:
+                REPORT("WARNING", T["GRADE_EDIT_CONFLICT"].format(
+                    name=pname, sid=sid, grade=g, db_grade=db_g
+                ))
+        # Show the changes from elsewhere in the table
+        grade_map = table["PUPIL_LIST"].get(pid)[1]
+        for sid in grades.keys() | merged.keys():
+            grade_map[sid] = merged.get(sid, "")
+        version, base, grades = db_version, db_grades, merged
+    else:
+        REPORT("ERROR", T["GRADES_NOT_SAVED"].format(
+            name=pupil_name(table["PUPIL_LIST"].get(pid)[0])
+        ))
+    table["STORED_VERSIONS"][pid] = (version, base)
+    if not saved:
+        return table["MODIFIED"]
+    grade_history_update(
+        SCHOOLYEAR,
+        keys["OCCASION"],
+        keys["CLASS_GROUP"],
+        keys["INSTANCE"],
+        pid,
+        grades
+    )
     timestamp = set_grade_update_time(table)
     return timestamp
 
 
+def merge_grades(
+    base: dict[str, str],
+    grades: dict[str, str],
+    db_grades: dict[str, str],
+) -> tuple[dict[str, str], list[tuple[str, str, str]]]:
+    """Merge the local changes to a pupil's grades (<grades>) with
+    those made elsewhere (<db_grades>, the current database entry),
+    both starting from <base>. An entry changed in only one of the
+    two takes the changed value. If both have changed an entry to
+    different values, the database value is kept, i.e. the local
+    change is rejected.
+    Return the merged grades (without empty entries) and a list of
+    the rejected changes: [(sid, local grade, database grade), ... ].
+    """
+    merged = {}
+    rejected = []
+    for sid in dict.fromkeys([*grades, *db_grades, *base]):
+        g0 = base.get(sid) or ""
+        g = grades.get(sid) or ""
+        db_g = db_grades.get(sid) or ""
+        if g == g0 or g == db_g:
+            g = db_g
+        elif db_g != g0:
+            rejected.append((sid, g, db_g))
+            g = db_g
+        if g:
+            merged[sid] = g
+    return merged, rejected
+
+
+__versioned_databases = set()
+
+
+def ensure_grade_versions():
+    """Add the VERSION field to the GRADES table of the current
+    database if it is missing (older databases).
+    """
+    dbpath = DATAPATH(DATABASE)
+    if dbpath not in __versioned_databases:
+        fields = [row[1] for row in db_query("PRAGMA table_info(GRADES)")]
+        if "VERSION" not in fields:
+            db_query(
+                "ALTER TABLE GRADES"
+                " ADD COLUMN VERSION INTEGER NOT NULL DEFAULT 0"
+            )
+        __versioned_databases.add(dbpath)
+
+
+### Cross-year grade history
+
+# The grades of all years are also kept in a separate database, one row
+# per grade, indexed by pupil and by subject. This allows all the grades
+# of a pupil, or of a cohort in a subject, to be found without reading
+# the GRADES tables of all the years. The location of the source entry
+# is given by the year's database and the GRADES key (OCCASION,
+# CLASS_GROUP, INSTANCE, PID).
+# The index is updated whenever a grade entry is saved. For existing
+# data – or if the index is lost or out of date – it can be rebuilt
+# using <rebuild_grade_history>.
+
+__grade_history = None
+
+
+def grade_history_db(path: Optional[str] = None) -> sqlite3.Connection:
+    """Return the connection to the grade history database, opening
+    (and if necessary creating) it on first use. <path> is a different
+    database file to use, e.g. for testing; it is only relevant on
+    first use.
+    """
+    global __grade_history
+    if __grade_history is None:
+        con = sqlite3.connect(path or start.base_data_path(GRADE_HISTORY))
+        # The same settings – in particular the journal mode – as for
+        # the main database
+        for pragma in db_pragmas():
+            con.execute(pragma)
+        with con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS GRADE_HISTORY ("
+                " SCHOOLYEAR TEXT NOT NULL,"
+                " OCCASION TEXT NOT NULL,"
+                " CLASS_GROUP TEXT NOT NULL,"
+                " INSTANCE TEXT NOT NULL,"
+                " PID TEXT NOT NULL,"
+                " SID TEXT NOT NULL,"
+                " GRADE TEXT NOT NULL)"
+            )
+            # For the entries of a report instance (updates, cohorts)
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS GRADE_HISTORY_ENTRY"
+                " ON GRADE_HISTORY"
+                " (SCHOOLYEAR, CLASS_GROUP, OCCASION, INSTANCE, PID)"
+            )
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS GRADE_HISTORY_PID"
+                " ON GRADE_HISTORY (PID, SCHOOLYEAR)"
+            )
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS GRADE_HISTORY_SID"
+                " ON GRADE_HISTORY (SID, PID)"
+            )
+        __grade_history = con
+    return __grade_history
+
+
+def grade_history_update(
+    schoolyear: str,
+    occasion: str,
+    class_group: str,
+    instance: str,
+    pid: str,
+    grades: Optional[dict[str, str]],
+):
+    """Replace the grades of a GRADES entry in the grade history.
+    If <grades> is <None>, the entry is removed.
+    """
+    key = (schoolyear, class_group, occasion, instance or "", pid)
+    con = grade_history_db()
+    with con:
+        con.execute(
+            "DELETE FROM GRADE_HISTORY WHERE SCHOOLYEAR = ?"
+            " AND CLASS_GROUP = ? AND OCCASION = ? AND INSTANCE = ?"
+            " AND PID = ?",
+            key
+        )
+        if grades:
+            con.executemany(
+                "INSERT INTO GRADE_HISTORY (SCHOOLYEAR, CLASS_GROUP,"
+                " OCCASION, INSTANCE, PID, SID, GRADE)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [key + (sid, g) for sid, g in grades.items()]
+            )
+
+
+def pupil_grade_history(
+    pid: str
+) -> list[tuple[str, str, str, str, dict[str, str]]]:
+    """Return all the grades of the given pupil, as a list of
+        (schoolyear, occasion, class-group, instance, {sid: grade, ...})
+    ordered by school-year.
+    """
+    result = []
+    last = None
+    for *key, sid, grade in grade_history_db().execute(
+        "SELECT SCHOOLYEAR, OCCASION, CLASS_GROUP, INSTANCE, SID, GRADE"
+        " FROM GRADE_HISTORY WHERE PID = ?"
+        " ORDER BY SCHOOLYEAR, OCCASION, CLASS_GROUP, INSTANCE",
+        (pid,)
+    ):
+        if key != last:
+            grades = {}
+            result.append((*key, grades))
+            last = key
+        grades[sid] = grade
+    return result
+
+
+def subject_grade_history(
+    sid: str,
+    schoolyear: Optional[str] = None,
+    class_group: Optional[str] = None,
+) -> list[tuple[str, str, str, str, str, str]]:
+    """Return the grades in the given subject, as a list of
+        (pid, schoolyear, occasion, class-group, instance, grade)
+    ordered by pupil and school-year.
+    If <schoolyear> and <class_group> are given, the result is
+    restricted to a cohort: the pupils with grades in this class-group
+    in this year. Their grades from all years are included.
+    """
+    query = (
+        "SELECT PID, SCHOOLYEAR, OCCASION, CLASS_GROUP, INSTANCE, GRADE"
+        " FROM GRADE_HISTORY WHERE SID = ?"
+    )
+    params = [sid]
+    if schoolyear and class_group:
+        query += (
+            " AND PID IN (SELECT PID FROM GRADE_HISTORY"
+            " WHERE SCHOOLYEAR = ? AND CLASS_GROUP = ?)"
+        )
+        params += [schoolyear, class_group]
+    elif schoolyear or class_group:
+        raise Bug("subject_grade_history: cohort needs year and class-group")
+    query += " ORDER BY PID, SCHOOLYEAR, OCCASION, INSTANCE"
+    return grade_history_db().execute(query, params).fetchall()
+
+
+def rebuild_grade_history(
+    schoolyears: Optional[list[str]] = None,
+    pack_folders: list[str] = (),
+) -> int:
+    """Rebuild the grade history for the given school-years (default:
+    all years with a database) and the older grade files in the given
+    folders (see <grades.grade_export.pack_grade_rows>). The existing
+    entries for these years are replaced.
+    Return the number of grades indexed.
+    """
+    # Imported here because the export module is only needed for this
+    from grades.grade_export import year_grade_rows
+
+    if schoolyears is None:
+        schoolyears = sorted(
+            os.path.basename(os.path.dirname(p))[5:]    # "DATA-<year>"
+            for p in glob(start.year_data_path("*", DATABASE))
+        )
+    con = grade_history_db()
+    cleared = set()
+    n = 0
+
+    def new_rows():
+        nonlocal n
+        # The years of the older grade files are only known on reading
+        for row in year_grade_rows(schoolyears, pack_folders):
+            if row[0] not in cleared:
+                con.execute(
+                    "DELETE FROM GRADE_HISTORY WHERE SCHOOLYEAR = ?",
+                    (row[0],)
+                )
+                cleared.add(row[0])
+            n += 1
+            yield row
+
+    with con:
+        for y in schoolyears:
+            con.execute(
+                "DELETE FROM GRADE_HISTORY WHERE SCHOOLYEAR = ?", (y,)
+            )
+            cleared.add(y)
+        con.executemany(
+            "INSERT INTO GRADE_HISTORY (SCHOOLYEAR, OCCASION,"
+            " CLASS_GROUP, INSTANCE, PID, SID, GRADE)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            new_rows()
+        )
+    return n
+
+
 #TODO: Needs updating? If it is still used ...
 def FullGradeTableUpdate(table, pupil_grades):
     """Update the grades in a report category (a <FullGradeTable>) from
@@ -907,6 +1344,29 @@ def MakeGradeTable(table:dict, clear:bool=False) -> bytes:
     """Build a basic pupil/subject table for grade input using a
     template appropriate for the given group.
     """
+    gtable = grade_table_matrix(table)
+    if gtable is None:
+        return b''
+    return gtable.save_bytes()
+
+
+def MakeGradeTables(
+    tables: list[dict], processes: Optional[int] = None
+) -> list[bytes]:
+    """Build the grade input tables (see <MakeGradeTable>) for a number
+    of groups. The xlsx-files are generated concurrently in worker
+    processes (at most <processes>, default: the number of CPUs).
+    """
+    gtables = [grade_table_matrix(table) for table in tables]
+    tbytes = iter(save_tables([g for g in gtables if g], processes))
+    return [next(tbytes) if g else b'' for g in gtables]
+
+
+def grade_table_matrix(table:dict) -> Optional[KlassMatrix]:
+    """Fill the grade input template for the given grade table. The
+    result is not yet saved, see <MakeGradeTable>.
+    Return <None> if there was an error.
+    """
     grade_info = GetGradeConfig()
 
     ### Get template file
@@ -921,7 +1381,7 @@ def MakeGradeTable(table:dict, clear:bool=False) -> bytes:
                 CLASS_GROUP=table["CLASS_GROUP"],
             )
         )
-        return b''
+        return None
     template_path = RESOURCEPATH("templates/" + gefile)
     gtable = KlassMatrix(template_path)
 
@@ -959,7 +1419,7 @@ def MakeGradeTable(table:dict, clear:bool=False) -> bytes:
             "ERROR",
             T["TEMPLATE_HEADER_WRONG"].format(path=template_path)
         )
-        return b''
+        return None
     sidcol: list[tuple[str, int]] = []
     sid: str
     sdata: dict
@@ -993,9 +1453,9 @@ def MakeGradeTable(table:dict, clear:bool=False) -> bytes:
     row = gtable.nextrow()
     gtable.delEndRows(row)
 
-    ### Save file
+    ### Protect sheet
     gtable.protectSheet()
-    return gtable.save_bytes()
+    return gtable
 
 
 def LoadFromFile(
@@ -1161,6 +1621,11 @@ def collate_grade_tables(
 # --#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
 
 if __name__ == "__main__":
+    if sys.argv[1:] == ["--rebuild-history"]:
+        n = rebuild_grade_history()
+        print(f"Grade history: {n} grades indexed")
+        quit(0)
+
     from core.db_access import open_database
 
     open_database()
@@ -1221,9 +1686,11 @@ if __name__ == "__main__":
             #    print("\n $$$", k, v)
             FullGradeTableUpdate(fgtable, itable)
 
-    for __cg in ("13", "11G", "12G.G", "12G.R"):
-        fgtable = FullGradeTable("1. Halbjahr", __cg, "")
-        tbytes = MakeGradeTable(fgtable, True)
+    __cgs = ("13", "11G", "12G.G", "12G.R")
+    __tables = MakeGradeTables(
+        [FullGradeTable("1. Halbjahr", __cg, "") for __cg in __cgs]
+    )
+    for __cg, tbytes in zip(__cgs, __tables):
         tpath = DATAPATH(f"testing/tmp/GradeInput-{__cg}.xlsx")
         tdir = os.path.dirname(tpath)
         if not os.path.isdir(tdir):
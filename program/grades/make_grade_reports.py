@@ -1,7 +1,7 @@
 """
 grades/make_grade_reports.py
 
-Last updated:  2023-06-28
+Last updated:  2026-10-19
 
 Generate the grade reports for a given group and "occasion" (term,
 semester, special, ...).
@@ -67,7 +67,7 @@ import re
 
 from core.base import Dates, wipe_folder_contents
 from core.pupils import pupil_name
-from template_engine.template_sub import Template, merge_pdf
+from template_engine.template_sub import Template, merge_pdf, convert_odts
 from grades.grades_base import FullGradeTable, GetGradeConfig
 from local.grade_processing import ProcessGradeData, NOGRADE
 
@@ -155,6 +155,23 @@ class MakeGroupReports:
         displayed.
         """
         print("§gen_files", repr(rtype), clean_folder, show_data)
+        odt_list = self.gen_odts(rtype, clean_folder, show_data)
+        if odt_list is None:
+            return
+        save_dir = DATAPATH(f"GRADES/{self.group_folder}")
+        pdfs = convert_odts(
+            odt_list,
+            save_dir,
+            show_run_messages=2 if show_data else 1
+        )
+        self.pdf_path_list = [os.path.join(save_dir, pdf) for pdf in pdfs]
+
+    def gen_odts(self, rtype, clean_folder=True, show_data=False):
+        """The first stage of <gen_files>: generate the odt-files for
+        the reports of type <rtype>, see <gen_files> for the parameters.
+        Return a list of the odt-file paths, <None> if the reports
+        can't be made.
+        """
         pid_list = self.report_types[rtype]
         template, error = get_template(self.full_grade_table, rtype)
         if error:
@@ -164,7 +181,7 @@ class MakeGroupReports:
                 plist = ", ".join(plist),
                 message=error
             ))
-            return
+            return None
         gmaplist = collect_report_type_data(
             template,
             pid_list,
@@ -180,13 +197,11 @@ class MakeGroupReports:
             # This should probably be done for whole-group generation,
             # not for single report generation.
             wipe_folder_contents(save_dir)
-        # Generate files
-        pdfs = template.make_pdfs(
+        return template.make_odts(
             gmaplist,
             save_dir,
             show_run_messages=2 if show_data else 1
         )
-        self.pdf_path_list = [os.path.join(save_dir, pdf) for pdf in pdfs]
 
     def group_file_name(self):
         """Return a name suggestion for a group file.
@@ -0,0 +1,540 @@
+"""
+grades/report_jobs.py
+
+Last updated:  2026-10-19
+
+Build all the documents for a "report day" – grade reports for each
+class-group and report type, cover sheets for the text reports and
+attendance tables – as a set of jobs.
+
+The jobs form a directed acyclic graph: a job can depend on the results
+(lists of file paths) of other jobs. For example, the odt-files for the
+reports of one class-group and report type must be ready before they are
+converted to pdf-files, and these must be ready before they can be
+joined to a single file.
+
+The data is read from the database in the main process, when the jobs
+are added. The CPU-bound stages (filling the templates, joining pdfs,
+building the attendance tables) are run in a pool of worker processes,
+the conversions by LibreOffice in a pool of threads, so that several
+conversions run at the same time as the further preparation.
+
+Each completed job is recorded in a checkpoint file, so that a run which
+was interrupted can be resumed, the completed jobs being skipped.
+
+=+LICENCE=============================
+Copyright 2026 Michael Towers
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+=-LICENCE========================================
+"""
+
+CHECKPOINT_DIR = "REPORT_JOBS"
+ATTENDANCE_TABLE = "ATTENDANCE/{name}_{year}_{klass}.xlsx"
+
+###############################################################
+
+import sys, os
+
+if __name__ == "__main__":
+    # Enable package import if running as module
+    this = sys.path[0]
+    appdir = os.path.dirname(this)
+    sys.path[0] = appdir
+    basedir = os.path.dirname(appdir)
+    from core.base import start
+
+    #    start.setup(os.path.join(basedir, 'TESTDATA'))
+    start.setup(os.path.join(basedir, "DATA-2023"))
+
+T = TRANSLATIONS("grades.report_jobs")
+
+### +++++
+
+from typing import NamedTuple, Callable, Optional
+import builtins
+import json
+import queue
+import tempfile
+from zipfile import ZipFile, ZIP_DEFLATED
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    Future,
+    wait,
+    FIRST_COMPLETED,
+)
+
+from core.base import wipe_folder_contents
+from core.worker import WorkerPool
+from core.basic_data import get_classes
+from grades.grades_base import FullGradeTable, get_occasions_groups
+from grades.make_grade_reports import (
+    MakeGroupReports,
+    report_folder,
+    report_name,
+)
+from template_engine.template_sub import (
+    Template,
+    merge_pdf,
+    libre_office,
+    pdf_names,
+)
+from template_engine.coversheet import (
+    COVER_CLASS,
+    WHOLE_SCHOOL,
+    filter_class,
+    cover_template,
+    class_data,
+)
+from template_engine.attendance import (
+    _ATTENDANCE,
+    get_month_data,
+    pupil_list,
+)
+
+### -----
+
+
+class ReportJob(NamedTuple):
+    key: str
+    function: Callable  # (inputs, *args) -> [file path, ...]
+    args: tuple
+    after: tuple[str, ...]  # the keys of the jobs supplying the inputs
+    convert: bool = False   # run LibreOffice (in a thread)
+
+
+class ReportJobs:
+    """Collect a set of jobs and run them, see the module docstring.
+    The job keys must be unique within the run. A job can only depend
+    on jobs which have already been added, so that there can be no
+    dependency cycles.
+    """
+    def __init__(
+        self,
+        name: str,
+        processes: Optional[int] = None,
+        converters: Optional[int] = None,
+    ):
+        """<name> identifies the run, it is used for the name of the
+        checkpoint file.
+        <processes> is the maximum number of worker processes, default
+        is the number of CPUs. With <processes = 1> the CPU-bound jobs
+        are run in the main process.
+        <converters> is the maximum number of LibreOffice conversions
+        running at the same time, default is the number of CPUs.
+        """
+        self.name = name
+        self.processes = processes
+        self.converters = converters or os.cpu_count() or 1
+        self.jobs: dict[str, ReportJob] = {}
+
+    def add(self, key, function, *args, after=(), convert=False):
+        """Add a job. <function> is called with the concatenated results
+        of the jobs in <after>, followed by <args>. It must return a
+        list of the paths of the files it has produced. For convert-jobs
+        the keyword argument <profile> (see <template_sub.libre_office>)
+        is added.
+        Return the key.
+        """
+        if key in self.jobs:
+            raise Bug(f"Report job added twice: {key}")
+        for k in after:
+            if k not in self.jobs:
+                raise Bug(f"Report job {key} depends on unknown job {k}")
+        self.jobs[key] = ReportJob(key, function, args, tuple(after), convert)
+        return key
+
+    def add_grade_reports(self, occasion, class_group, instance=""):
+        """Add the jobs to make the grade reports for the given
+        class-group, one chain for each report type.
+        Return the keys of the final jobs (joining the pdf-files).
+        """
+        full_grade_table = FullGradeTable(occasion, class_group, instance)
+        mgr = MakeGroupReports(full_grade_table)
+        keys = []
+        for rtype in mgr.split_report_types():
+            if not rtype:
+                continue
+            folder = report_folder(full_grade_table, rtype)
+            save_dir = DATAPATH(f"GRADES/{folder}")
+            k = self.add(
+                f"GRADES:{folder}:odt",
+                grade_report_odts,
+                full_grade_table,
+                rtype,
+            )
+            k = self.add(
+                f"GRADES:{folder}:pdf",
+                convert_odts_job,
+                save_dir,
+                after=(k,),
+                convert=True,
+            )
+            keys.append(self.add(
+                f"GRADES:{folder}",
+                join_pdfs_job,
+                DATAPATH(f"GRADES/{report_name(full_grade_table, rtype)}"),
+                after=(k,),
+            ))
+        return keys
+
+    def add_covers(self, klass, date):
+        """Add the jobs to make the cover sheets for the text reports of
+        the given class.
+        Return the key of the final job (joining the pdf-files).
+        """
+        save_dir = DATAPATH(COVER_CLASS.format(klass=klass))
+        k = self.add(
+            f"COVER:{klass}:odt",
+            cover_odts,
+            cover_template(klass),
+            class_data(klass, date),
+            save_dir,
+        )
+        k = self.add(
+            f"COVER:{klass}:pdf",
+            convert_odts_job,
+            save_dir,
+            after=(k,),
+            convert=True,
+        )
+        return self.add(
+            f"COVER:{klass}",
+            join_pdfs_job,
+            save_dir,
+            after=(k,),
+        )
+
+    def add_cover_archive(self, cover_keys):
+        """Add a job to pack the class cover sheets (the results of the
+        jobs <cover_keys>) into a single archive.
+        """
+        return self.add(
+            "COVER",
+            zip_job,
+            DATAPATH(WHOLE_SCHOOL),
+            after=cover_keys,
+        )
+
+    def add_attendance(self, klass, month_data):
+        """Add a job to make the attendance table for the given class.
+        <month_data> is the result of <attendance.get_month_data>.
+        """
+        return self.add(
+            f"ATTENDANCE:{klass}",
+            attendance_job,
+            klass,
+            pupil_list(klass),
+            month_data,
+            DATAPATH(ATTENDANCE_TABLE.format(
+                name=_ATTENDANCE, year=SCHOOLYEAR, klass=klass
+            )),
+        )
+
+    def checkpoint_path(self):
+        return DATAPATH(f"{CHECKPOINT_DIR}/{self.name}.json".replace(
+            " ", "_"
+        ))
+
+    def read_checkpoint(self) -> dict[str, list[str]]:
+        """Return the completed jobs recorded by a previous (interrupted)
+        run: {key: [file path, ...], ... }.
+        """
+        try:
+            with open(self.checkpoint_path(), "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {}
+
+    def write_checkpoint(self, done: dict[str, list[str]]):
+        """Save the completed jobs, via a temporary file, so that an
+        interruption can't leave a damaged file.
+        """
+        path = self.checkpoint_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(done, fh, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def run(self, resume=True) -> dict[str, list[str]]:
+        """Run the jobs. If <resume> is true, jobs completed by a
+        previous run – according to the checkpoint file – are not run
+        again, as long as their files still exist and none of the jobs
+        they depend on must be run. When all jobs have completed, the
+        checkpoint file is removed.
+        If a job fails, the jobs which depend on it are not run.
+        Return the results of the completed jobs:
+            {key: [file path, ...], ... }
+        """
+        done = {}
+        if resume:
+            checkpoint = self.read_checkpoint()
+            # The jobs are in dependency order
+            for key, job in self.jobs.items():
+                try:
+                    files = checkpoint[key]
+                except KeyError:
+                    continue
+                if all(k in done for k in job.after) and all(
+                    os.path.exists(f) for f in files
+                ):
+                    done[key] = files
+            if done:
+                REPORT("INFO", T["JOBS_RESUMED"].format(n=len(done)))
+        # Only the jobs which are run are recorded in the new checkpoint
+        self.write_checkpoint(done)
+        waiting = {key for key in self.jobs if key not in done}
+        dependents = {}
+        for key in waiting:
+            for k in self.jobs[key].after:
+                dependents.setdefault(k, []).append(key)
+        failed = set()
+        running = {}    # {future: key}
+        profiles = queue.Queue()
+        with tempfile.TemporaryDirectory() as profile_dir:
+            for i in range(self.converters):
+                profiles.put(os.path.join(profile_dir, str(i)))
+            with self.process_pool() as pool, ThreadPoolExecutor(
+                max_workers=self.converters
+            ) as threads:
+
+                def submit(key):
+                    job = self.jobs[key]
+                    inputs = [f for k in job.after for f in done[k]]
+                    if job.convert:
+                        future = threads.submit(
+                            run_convert, job, inputs, profiles
+                        )
+                    elif pool:
+                        future = pool.submit(run_job, job, inputs)
+                    else:
+                        future = Future()
+                        try:
+                            future.set_result(run_job(job, inputs))
+                        except Exception as e:
+                            future.set_exception(e)
+                    waiting.discard(key)
+                    running[future] = key
+
+                for key in list(waiting):
+                    if all(k in done for k in self.jobs[key].after):
+                        submit(key)
+                while running:
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        key = running.pop(future)
+                        try:
+                            files, messages = future.result()
+                        except Exception as e:
+                            REPORT("ERROR", T["JOB_FAILED"].format(
+                                job=key, error=f"{type(e).__name__}: {e}"
+                            ))
+                            failed.add(key)
+                            continue
+                        for mtype, text in messages:
+                            REPORT(mtype, text)
+                        done[key] = files
+                        self.write_checkpoint(done)
+                        REPORT("INFO", T["JOB_DONE"].format(
+                            job=key, n=len(done), total=len(self.jobs)
+                        ))
+                        for k in dependents.get(key, ()):
+                            if k in waiting and all(
+                                kk in done for kk in self.jobs[k].after
+                            ):
+                                submit(k)
+        for key in sorted(waiting):
+            REPORT("WARNING", T["JOB_SKIPPED"].format(job=key))
+        if not (failed or waiting):
+            os.remove(self.checkpoint_path())
+        return done
+
+    def process_pool(self):
+        """Return the pool of worker processes, a <_NoPool> if the jobs
+        should be run in the main process.
+        The workers are set up like the main process, including the
+        connection to the database, see <core.worker>.
+        """
+        if self.processes == 1 or len(self.jobs) < 2:
+            return _NoPool()
+        return WorkerPool(self.processes, database=True)
+
+
+class _NoPool:
+    """Stand-in for the process pool when the jobs are run in the main
+    process.
+    """
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        return False
+
+
+def run_job(job: ReportJob, inputs: list[str]):
+    """Run a (CPU-bound) job, normally in a worker process.
+    The messages reported by the job are collected and returned with
+    the result, so that they can be passed on by the main process.
+    Return (list of file paths, [(message type, text), ... ]).
+    """
+    messages = []
+    report = builtins.REPORT
+    builtins.REPORT = lambda mtype, text: messages.append((mtype, text))
+    try:
+        files = job.function(inputs, *job.args)
+    finally:
+        builtins.REPORT = report
+    return files, messages
+
+
+def run_convert(job: ReportJob, inputs: list[str], profiles: queue.Queue):
+    """Run a LibreOffice conversion job, in a thread. Each running
+    instance of LibreOffice gets its own profile folder from the queue.
+    Return (list of file paths, [(message type, text), ... ]).
+    """
+    profile = profiles.get()
+    try:
+        return job.function(inputs, *job.args, profile=profile)
+    finally:
+        profiles.put(profile)
+
+
+### The job functions
+
+def grade_report_odts(inputs, full_grade_table, rtype):
+    """Make the odt-files for the grade reports of the given type.
+    """
+    mgr = MakeGroupReports(full_grade_table)
+    mgr.split_report_types()
+    return mgr.gen_odts(rtype, clean_folder=True) or []
+
+
+def cover_odts(inputs, template_path, gmaplist, save_dir):
+    """Make the odt-files for the cover sheets of a class.
+    """
+    wipe_folder_contents(save_dir)
+    return Template(template_path).make_odts(gmaplist, save_dir)
+
+
+def convert_odts_job(odt_list, save_dir, profile=None):
+    """Convert the odt-files to pdf-files in the folder <save_dir>.
+    This is run in a thread, so the messages are returned rather than
+    reported (see <run_convert>).
+    """
+    if not odt_list:
+        return [], []
+    libre_office(odt_list, save_dir, profile=profile)
+    pdfs, messages = [], []
+    for pf in pdf_names(odt_list):
+        path = os.path.join(save_dir, pf)
+        if os.path.isfile(path):
+            pdfs.append(path)
+        else:
+            messages.append(("ERROR", T["MISSING_PDF"].format(fpath=path)))
+    return pdfs, messages
+
+
+def join_pdfs_job(pdf_list, outfile):
+    """Join the pdf-files to a single file, <outfile> (the ".pdf"
+    ending is optional).
+    """
+    if not pdf_list:
+        return []
+    if not outfile.endswith(".pdf"):
+        outfile += ".pdf"
+    byte_array = merge_pdf(pdf_list, pad2sided=1)
+    with open(outfile, "bw") as fout:
+        fout.write(byte_array)
+    return [outfile]
+
+
+def zip_job(file_list, zip_path):
+    """Pack the files into a single archive.
+    """
+    os.makedirs(os.path.dirname(zip_path), exist_ok=True)
+    with ZipFile(zip_path, "w", compression=ZIP_DEFLATED) as zip:
+        for f in file_list:
+            zip.write(f, os.path.basename(f))
+    return [zip_path]
+
+
+def attendance_job(inputs, klass, pupilnames, month_data, outfile):
+    """Make the attendance table for a class, including the entries
+    already made.
+    """
+    from template_engine.attendance import Table, AttendanceData
+
+    adata = AttendanceData.load(klass)
+    if adata is None:
+        pupilmap = {}
+    else:
+        pupilmap = adata.pupilmap(month_data)
+    table = Table()
+    table.make_year(
+        int(SCHOOLYEAR), klass, pupilnames, pupilmap, month_data
+    )
+    os.makedirs(os.path.dirname(outfile), exist_ok=True)
+    table.save(outfile)
+    return [outfile]
+
+
+def report_day(
+    occasion: str,
+    date: str,
+    attendance: bool = True,
+    resume: bool = True,
+    processes: Optional[int] = None,
+    converters: Optional[int] = None,
+) -> dict[str, list[str]]:
+    """Make all the documents for a report day: the grade reports of
+    all class-groups for the given "occasion", the cover sheets for the
+    text reports (date of issue <date>) and, if <attendance> is true,
+    the attendance tables. Grade reports with "instances" are not
+    included, they are made individually.
+    See <ReportJobs.run> for <resume> and the result,
+    <ReportJobs.__init__> for <processes> and <converters>.
+    """
+    jobs = ReportJobs(f"{occasion}_{date}", processes, converters)
+    for class_group, group_data in (
+        get_occasions_groups().get(occasion) or {}
+    ).items():
+        if "INSTANCE" not in group_data:
+            jobs.add_grade_reports(occasion, class_group)
+    classes = get_classes().get_class_list()
+    jobs.add_cover_archive([
+        jobs.add_covers(klass, date)
+        for klass, name in classes
+        if not filter_class(klass)
+    ])
+    if attendance:
+        month_data = get_month_data(CALENDAR)
+        for klass, name in classes:
+            jobs.add_attendance(klass, month_data)
+    return jobs.run(resume)
+
+
+# --#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
+
+if __name__ == "__main__":
+    from core.db_access import open_database
+    open_database()
+
+    results = PROCESS(
+        report_day,
+        occasion="2. Halbjahr",
+        date="2023-07-05",
+    )
+    for key, files in results.items():
+        print(f"{key}:", files)
@@ -1,10 +1,15 @@
 """
 local/abi_wani_calc.py
 
-Last updated:  2023-04-10
+Last updated:  2026-10-19
 
 Handling Abitur qualifications in a Waldorf school in Niedersachsen.
 
+<Abi_calc> evaluates the results for one set of grades. Before the
+additional oral examinations the possible outcomes for all values of the
+pending oral grades can be explored with <abi_what_if>, which evaluates
+the rules over the whole grid of possible grades using numpy arrays.
+
 =+LICENCE=============================
 Copyright 2023 Michael Towers
 
@@ -43,10 +48,20 @@ COMPOSITES_NOT_SUPPORTED = (
 ### +++++
 
 from typing import Optional
+from itertools import combinations
+
+import numpy as np
+
 from core.basic_data import get_subjects
 
 COND_PRINT = {True: "Ja", False: "Nein"}
 
+# Possible values for a pending oral examination, -1 = no examination
+ORAL_VALUES = np.arange(-1, 16)
+# Outcome scores (see <outcome_score>)
+OUTCOME_FHS = 100
+OUTCOME_ABI = 200
+
 GRADE_TEXT = {
     "0": "null", "1": "eins", "2": "zwei", "3": "drei",
     "4": "vier", "5": "fünf", "6": "sechs", "7": "sieben",
@@ -377,3 +392,295 @@ def fhs(fields, indexes, fhs_subjects):
     fields["RESULT"] = "FHS: " + g1 + "," + g2
     # print("&&&&&& fhs ok:", fields)
     return True
+
+
+########################################################################
+# "What-if" exploration of the pending oral examinations
+
+# In the array calculations the averages of subjects 1 – 4 are stored
+# as doubled values (integers), i.e. the sum of written and oral grades.
+# To get the scaled values these are multiplied by:
+SCALE_2 = np.array([6, 6, 6, 4])
+
+
+def outcome_score(result: np.ndarray, grade10: np.ndarray) -> np.ndarray:
+    """Combine the result type (0: failed, <OUTCOME_FHS>, <OUTCOME_ABI>)
+    and the final grade (10 * grade, e.g. 23 for "2,3") to a single
+    number, higher is better.
+    """
+    return np.where(result > 0, result + 50 - grade10, 0)
+
+
+def outcome_text(score: int) -> str:
+    """Return the result text (as in field "RESULT") for an outcome score.
+    """
+    if score >= OUTCOME_ABI:
+        g = 50 - (score - OUTCOME_ABI)
+        return f"{g // 10},{g % 10}"
+    if score >= OUTCOME_FHS:
+        g = 50 - (score - OUTCOME_FHS)
+        return f"FHS: {g // 10},{g % 10}"
+    return "–––"
+
+
+def fhs_ranks(sidmap, fhs_subjects) -> tuple[int, int, np.ndarray]:
+    """Prepare the "best-of" selections of <fhs> for array evaluation.
+    Return the indexes (0 – 7) of the "Deutsch" and "Mathe" fields and
+    a (5, 8) array with the selection order of the fields in each of the
+    "best-of" steps. Fields which may not be chosen in a step have the
+    value 64.
+    """
+    indexes = {}    # {basic subject-id: field index}, in field order
+    for tag, sid in sidmap.items():
+        if tag[-1] != "n":
+            indexes[sid.rsplit(".", 1)[0]] = int(tag[1:]) - 1
+    ranks = np.full((5, 8), 64, dtype=np.int16)
+    try:
+        de = indexes[fhs_subjects["Deutsch"]]
+        ma = indexes[fhs_subjects["Mathe"]]
+        for step, group in enumerate(
+            ("NaWi", "Fremdsprachen", "BlockB")
+        ):
+            rank = 0
+            for s in fhs_subjects[group]:
+                try:
+                    ranks[step, indexes[s]] = rank
+                except KeyError:
+                    continue
+                rank += 1
+    except KeyError:
+        raise Bug("Missing subject/grade")
+    for rank, i in enumerate(indexes.values()):
+        ranks[3, i] = rank
+        ranks[4, i] = rank
+    return de, ma, ranks
+
+
+def abi_evaluate(
+    grades: np.ndarray,
+    orals: np.ndarray,
+    de: int,
+    ma: int,
+    ranks: np.ndarray,
+) -> np.ndarray:
+    """Apply the rules of <Abi_calc> and <fhs> to N grade sets. To keep
+    the array operations fast, the grade sets are columns:
+    <grades> is an (8, N) array of the grades of subjects 1 – 8, <orals>
+    a (4, N) array of the oral grades of subjects 1 – 4 (-1 if there is
+    no oral examination). Fixed grades may be passed as (8, 1) or (4, 1)
+    arrays. See <fhs_ranks> for the other arguments.
+    Return the outcome scores (see <outcome_score>) as an (N,) array.
+    """
+    grades = grades.astype(np.int16)
+    orals = orals.astype(np.int16)
+    g14 = grades[:4]
+    n = max(grades.shape[1], orals.shape[1])
+    ave2 = np.empty((8, n), dtype=np.int16)
+    ave2[:4] = np.where(orals >= 0, g14 + orals, g14 * 2)
+    ave2[4:] = grades[4:] * 2
+    scaled14 = ave2[:4] * SCALE_2[:, np.newaxis]
+    scaled58 = grades[4:] * 4
+    totalA = scaled14.sum(axis=0)
+    totalB = scaled58.sum(axis=0)
+    ok = (
+        # Check 1: none with 0 points
+        (scaled14 != 0).all(axis=0)
+        & (scaled58 != 0).all(axis=0)
+        # Check 2: at least two of first four >= 5 points
+        & (
+            (scaled14[:3] >= 60).sum(axis=0) + (scaled14[3] >= 40)
+            >= 2
+        )
+        # Check 3: at least two of last four >= 5 points
+        & ((scaled58 >= 20).sum(axis=0) >= 2)
+        # Checks 4 and 5
+        & (totalA >= 220)
+        & (totalB >= 80)
+    )
+    g180 = 1020 - (totalA + totalB)
+    g1 = g180 // 180
+    grade10 = np.where(g1 == 0, 10, g1 * 10 + (g180 % 180) // 18)
+    scores = outcome_score(np.where(ok, OUTCOME_ABI, 0), grade10)
+    ## "Fachhochschulreife" for those without Abitur
+    fail = np.flatnonzero(~ok)
+    if len(fail):
+        scores[fail] = fhs_evaluate(ave2[:, fail], de, ma, ranks)
+    return scores
+
+
+def fhs_evaluate(
+    ave2: np.ndarray, de: int, ma: int, ranks: np.ndarray
+) -> np.ndarray:
+    """The array version of <fhs>. <ave2> are the doubled averages of
+    the eight subjects, an (8, N) array.
+    Return the outcome scores as an (N,) array.
+    """
+    n = ave2.shape[1]
+    cols = np.arange(n)
+    available = np.ones(ave2.shape, dtype=bool)
+    available[[de, ma]] = False
+    chosen = [np.full(n, de), np.full(n, ma)]
+    # The best of each group, then the best two of the rest. Of equal
+    # grades, the first one (lowest rank) is chosen.
+    key0 = ave2.astype(np.int16) * 64
+    for rank in ranks:
+        key = np.where(
+            available & (rank < 64)[:, np.newaxis],
+            key0 - rank[:, np.newaxis],
+            -1,
+        )
+        i = key.argmax(axis=0)
+        if (key[i, cols] < 0).any():
+            raise Bug("Missing subject/grade")
+        available[i, cols] = False
+        chosen.append(i)
+    chosen = np.stack(chosen)
+    g2 = np.take_along_axis(ave2, chosen, axis=0)
+    zero = (g2 == 0).any(axis=0)
+    under5 = (g2 > 0) & (g2 < 10)
+    n5 = under5.sum(axis=0)
+    e5 = (under5 & (chosen < 3)).sum(axis=0)
+    points20 = (g2[:4].sum(axis=0) + 1) // 2
+    points35 = (points20 * 2 + g2[4:].sum(axis=0) + 1) // 2
+    ok = (
+        ~zero & (n5 <= 3) & (e5 <= 2) & (points20 >= 20) & (points35 >= 35)
+    )
+    g420 = 2380 - points35 * 20 + 21
+    grade10 = np.where(
+        points35 >= 97, 10, (g420 // 420) * 10 + (g420 % 420) // 42
+    )
+    return outcome_score(np.where(ok, OUTCOME_FHS, 0), grade10)
+
+
+def _int_grade(g: str) -> int:
+    try:
+        return int(g)
+    except ValueError:
+        return 0
+
+
+class AbiWhatIf:
+    """The possible outcomes for one pupil for all values of the pending
+    oral grades.
+    <pending> is the list of field indexes (1 – 4) with pending oral
+    examinations, <scores> an array with one axis for each of these,
+    indexed by <ORAL_VALUES> + 1 (0 for "no examination"), containing
+    the outcome scores (see <outcome_score>).
+    """
+    def __init__(self, grades: dict[str, str], pending: list[int],
+            scores: np.ndarray
+    ):
+        self.grades = grades
+        self.pending = pending
+        self.scores = scores
+
+    def outcome(self, orals: dict[int, int]) -> int:
+        """Return the outcome score for the given oral grades, a
+        mapping {field index: grade}. Missing fields are taken as
+        having no oral examination.
+        """
+        return int(
+            self.scores[tuple(orals.get(i, -1) + 1 for i in self.pending)]
+        )
+
+    def current(self) -> int:
+        """The outcome without (further) oral examinations."""
+        return self.outcome({})
+
+    def thresholds(self, max_exams: int = 2
+    ) -> list[tuple[int, list[dict[int, int]]]]:
+        """For each outcome which is better than the current one, list
+        the minimum oral grades with which it can be reached (at least).
+        Only combinations of up to <max_exams> oral examinations are
+        considered, outcomes which need more are not listed.
+        A combination is listed if it achieves the outcome, but lowering
+        any one of its grades doesn't.
+        Return [(outcome score, [{field index: grade}, ... ]), ... ],
+        best outcome first.
+        """
+        current = self.current()
+        result = []
+        k = len(self.pending)
+        for score in np.unique(self.scores)[::-1]:
+            if score <= current:
+                break
+            combis = []
+            for n in range(1, min(k, max_exams) + 1):
+                for axes in combinations(range(k), n):
+                    # The grid for these examinations, the others not
+                    # taking place
+                    index = tuple(
+                        slice(1, None) if a in axes else 0
+                        for a in range(k)
+                    )
+                    ok = self.scores[index] >= score
+                    minimal = ok.copy()
+                    for a in range(n):
+                        # A grade one lower is not sufficient
+                        lower = np.zeros_like(ok)
+                        s1 = [slice(None)] * n
+                        s0 = [slice(None)] * n
+                        s1[a] = slice(1, None)
+                        s0[a] = slice(None, -1)
+                        lower[tuple(s1)] = ok[tuple(s0)]
+                        minimal &= ~lower
+                    for ix in np.argwhere(minimal):
+                        combis.append(
+                            {
+                                self.pending[a]: int(g)
+                                for a, g in zip(axes, ix)
+                            }
+                        )
+            if combis:
+                result.append((int(score), combis))
+        return result
+
+
+def abi_what_if(
+    pupil_grades: list[dict[str, str]], fhs_subjects: dict
+) -> list[Optional[AbiWhatIf]]:
+    """Explore the outcomes for a number of pupils (e.g. the whole year
+    group) for all possible values of the pending (empty) oral grades.
+    <pupil_grades> are the grade mappings after processing by
+    <Abi_calc>, <fhs_subjects> is the "FHS" parameter.
+    Return a list of <AbiWhatIf> objects, <None> for pupils without
+    pending oral examinations.
+    """
+    result = []
+    for grades in pupil_grades:
+        orals = np.full(4, -1)
+        pending = []
+        for i in (1, 2, 3, 4):
+            gn = grades[f"G{i}n"]
+            if not gn:
+                pending.append(i)
+            elif gn != "*":
+                orals[i - 1] = int(gn)
+        if not pending:
+            result.append(None)
+            continue
+        fixed = np.array(
+            [_int_grade(grades[f"G{i}"]) for i in range(1, 9)]
+        )
+        k = len(pending)
+        # All combinations of the pending grades (0 – 15), one per
+        # column. No examination has the same effect as an oral grade
+        # equal to the written one, so this needn't be evaluated
+        # separately.
+        grid = np.indices((16,) * k).reshape(k, -1)
+        n = grid.shape[1]
+        all_orals = np.repeat(orals[:, np.newaxis], n, axis=1)
+        all_orals[[i - 1 for i in pending]] = grid
+        de, ma, ranks = fhs_ranks(grades["__SIDMAP__"], fhs_subjects)
+        scores = abi_evaluate(
+            fixed[:, np.newaxis],
+            all_orals,
+            de,
+            ma,
+            ranks,
+        ).reshape((16,) * k)
+        # Insert the "no examination" values at index 0 of each axis
+        for axis, i in enumerate(pending):
+            scores = np.take(scores, [fixed[i - 1]] + list(range(16)), axis)
+        result.append(AbiWhatIf(grades, pending, scores))
+    return result
@@ -1,7 +1,7 @@
 """
 minion.py
 
-Last updated:  2023-01-01
+Last updated:  2026-10-19
 
 Read MINION-formatted configuration data.
 
@@ -67,6 +67,11 @@ Within the input lines all unicode control characters will be ignored.
 The top level of a MINION text is a "dict" – without the surrounding
 braces ({ ... }).
 
+Parsed files are cached (see <Minion.parse_file>) in a per-user cache
+folder (not next to the source file, the data folders may be shared or
+read-only), keyed by the file's absolute path, modification time and
+size, so that unchanged files need not be parsed again.
+
 There is also a very limited macro-like feature. Elements declared at the
 top level which start with '&' may be referenced (which basically means
 included) at any later point in a data structure by means of the macro
@@ -104,10 +109,29 @@ _STRING = '"'
 _REGEX = r'(\s+|#|:|\[|\]|\{|\}|")'  # all special items
 ESCAPE_DICT = {r"\n": "\n", r"\/": "\\", r"\"": '"', r"\t": "\t"}
 
+# Cache files
+_CACHE_SUFFIX = ".minion-cache"
+_CACHE_FORMAT = 1   # change this if the parser's output changes
+
 from typing import Dict
-import re, gzip, unicodedata
+import os, re, gzip, marshal, hashlib, unicodedata
+
+# posix: ~/.cache/WZ/minion (or in $XDG_CACHE_HOME)
+# win: ~\AppData\Local\WZ\minion (or in %LOCALAPPDATA%)
+if os.name == "nt":
+    _CACHE_BASE = os.environ.get("LOCALAPPDATA") or os.path.expanduser(
+        os.path.join("~", "AppData", "Local")
+    )
+else:
+    _CACHE_BASE = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(
+        os.path.join("~", ".cache")
+    )
+_CACHE_FOLDER = os.path.join(_CACHE_BASE, "WZ", "minion")
 
 _RXSUB = "|".join([re.escape(e) for e in ESCAPE_DICT])
+_RX_SYMBOL = re.compile(_REGEX)
+_RX_STRING_END = re.compile(r'(?<!\\)"')
+_RX_ESCAPE = re.compile(_RXSUB)
 
 MACRO_BUILTINS: Dict[str, dict] = {}
 
@@ -151,6 +175,14 @@ class Minion:
 
     #
     def parse_file(self, fpath, **replacements):
+        """Parse a MINION file. If the file has not changed since the
+        last call (with the same replacements), the result is read from
+        a cache file.
+        """
+        key = self.cache_key(fpath, replacements)
+        data = read_cache(fpath, key)
+        if data is not None:
+            return data
         try:
             with open(fpath, "r", encoding="utf-8") as fh:
                 text = fh.read()
@@ -158,7 +190,27 @@ class Minion:
             self.report(_NO_FILE, path=fpath)
         except ValueError:
             self.report(_BAD_FILE, path=fpath)
-        return self.parse_replace(text, fpath, **replacements)
+        data = self.parse_replace(text, fpath, **replacements)
+        write_cache(fpath, key, data)
+        return data
+
+    #
+    def cache_key(self, fpath, replacements):
+        """Return a key identifying the current state of the file and
+        the parameters for parsing it. If the file doesn't exist, return
+        <None>.
+        """
+        try:
+            st = os.stat(fpath)
+        except OSError:
+            return None
+        return (
+            _CACHE_FORMAT,
+            os.path.abspath(fpath),
+            st.st_mtime_ns,
+            st.st_size,
+            tuple(sorted(replacements.items())),
+        )
 
     #
     def parse_replace(self, text, fpath, **params):
@@ -168,6 +220,10 @@ class Minion:
 
     #
     def parse_file_gz(self, fpath, **replacements):
+        key = self.cache_key(fpath, replacements)
+        data = read_cache(fpath, key)
+        if data is not None:
+            return data
         try:
             with gzip.open(fpath, "rt", encoding="UTF-8") as zipfile:
                 text = zipfile.read()
@@ -175,7 +231,9 @@ class Minion:
             self.report(_NO_FILE, path=fpath)
         except OSError:
             self.report(_BAD_GZ_FILE, path=fpath)
-        return self.parse_replace(text, fpath, **replacements)
+        data = self.parse_replace(text, fpath, **replacements)
+        write_cache(fpath, key, data)
+        return data
 
     #
     def read_line(self):
@@ -189,9 +247,12 @@ class Minion:
             line = self.lines[self.line_number]
             self.line_number += 1
             # "Strip" line and remove possible control characters.
-            l = "".join(
-                ch for ch in line.strip() if unicodedata.category(ch)[0] != "C"
-            )
+            # Most lines contain none, which is quickly tested.
+            l = line.strip()
+            if not l.isprintable():
+                l = "".join(
+                    ch for ch in l if unicodedata.category(ch)[0] != "C"
+                )
             if l:
                 return l
 
@@ -205,8 +266,9 @@ class Minion:
         """
         try:
             line = line.replace("\t", " ").strip()
-            sym, sep, rest = re.split(_REGEX, line, 1)
-        except:
+            sym, sep, rest = _RX_SYMBOL.split(line, 1)
+        except (AttributeError, ValueError):
+            # No line (<None>) or no break-item
             return line, None, None
         if sep == "#":
             # Comment
@@ -281,10 +343,10 @@ class Minion:
         lx = []
         while True:
             try:
-                line, rest = re.split(r'(?<!\\)"', line, maxsplit=1)
+                line, rest = _RX_STRING_END.split(line, maxsplit=1)
                 lx.append(line)
                 s0 = "".join(lx)
-                s0 = re.sub(_RXSUB, lambda m: ESCAPE_DICT[m.group(0)], s0)
+                s0 = _RX_ESCAPE.sub(lambda m: ESCAPE_DICT[m.group(0)], s0)
                 return s0, rest.lstrip()
             except ValueError:
                 # no end, continue to next line
@@ -341,6 +403,54 @@ class Minion:
             line = rest
 
 
+def cache_path(fpath):
+    """Return the path of the cache file for the given file. The name
+    is derived from the absolute path of the file, so that files with
+    the same name in different folders don't share an entry.
+    """
+    fpath = os.path.abspath(fpath)
+    digest = hashlib.sha1(fpath.encode("utf-8", "surrogateescape")).hexdigest()
+    name = os.path.basename(fpath)
+    return os.path.join(_CACHE_FOLDER, f"{name}-{digest}{_CACHE_SUFFIX}")
+
+
+def read_cache(fpath, key):
+    """Return the cached data for the given file if the cache entry
+    matches <key>, otherwise <None>.
+    """
+    if key is None:
+        return None
+    try:
+        with open(cache_path(fpath), "rb") as fh:
+            ckey, data = marshal.load(fh)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if ckey != key:
+        return None
+    return data
+
+
+def write_cache(fpath, key, data):
+    """Save the parsed data for the given file. Failure (e.g. because
+    the cache folder is not writable) is not an error, the file will
+    simply be parsed again next time.
+    """
+    if key is None:
+        return
+    cpath = cache_path(fpath)
+    tmp = f"{cpath}.{os.getpid()}"
+    try:
+        os.makedirs(os.path.dirname(cpath), exist_ok=True)
+        with open(tmp, "wb") as fh:
+            marshal.dump((key, data), fh)
+        os.replace(tmp, cpath)
+    except (OSError, ValueError):
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
 # --#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
 
 if __name__ == "__main__":
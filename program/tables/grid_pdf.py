@@ -0,0 +1,301 @@
+"""
+tables/grid_pdf.py
+
+Last updated:  2026-10-19
+
+Headless vector pdf output of table-grids.
+
+A <GridTable> describes a grid in the same terms as <ui.grid_base.GridView>
+(row heights, column widths, cell texts and styles, thick lines, titles),
+but it is plain data, so that it can be built without a widget and passed
+to worker processes. The cells are drawn directly with reportlab, texts
+are fitted to the cells in the same way as in the interactive grid.
+
+=+LICENCE=============================
+Copyright 2026 Michael Towers
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+=-LICENCE========================================
+"""
+
+##### Configuration #####################
+# These match the settings in <ui.grid_base>. Sizes are in points.
+GRID_COLOUR = "888800"  # rrggbb
+FONT_COLOUR = "442222"  # rrggbb
+FONT = "Helvetica"
+FONT_BOLD = "Helvetica-Bold"
+FONT_SIZE = 12
+BORDER_WIDTH = 1
+THICK_LINE_WIDTH = 3
+CELL_MARGIN = 3
+TITLE_MARGIN = 15  # Left & right title margin
+PDF_MARGINS = (50, 30, 30, 30)  # left, top, right, bottom
+
+#####################################################
+
+# Note that this module doesn't use the TRANSLATIONS mechanism, so that
+# it can be imported by worker processes which haven't run <core.base>.
+
+### +++++
+
+from typing import NamedTuple, Optional
+from io import BytesIO
+
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.lib.pagesizes import A4, landscape as landscape_size
+from reportlab.lib.colors import HexColor
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+### -----
+
+
+class GridCellData(NamedTuple):
+    text: str
+    bg: Optional[str] = None    # rrggbb
+    fg: str = FONT_COLOUR       # rrggbb
+    halign: str = "c"           # l, c, r
+    valign: str = "m"           # t, m, b
+    rotated: bool = False       # text rotated by 90° (reading upwards)
+
+
+class GridTitle(NamedTuple):
+    text: str
+    offset: float               # see <GridTable.set_title>
+    halign: str = "c"
+    font_scale: Optional[float] = None
+
+
+class GridTable:
+    """The data for a grid to be output as pdf. Rows and columns are
+    0-indexed, sizes are in points.
+    """
+    def __init__(
+        self,
+        rowheights: list[float],
+        columnwidths: list[float],
+        titleheight: float = 0,
+        footerheight: float = 0,
+        landscape: bool = False,
+        can_rotate: bool = True,
+        margins: tuple[float, float, float, float] = PDF_MARGINS,
+    ):
+        self.xmarks = [0]
+        for w in columnwidths:
+            self.xmarks.append(self.xmarks[-1] + w)
+        self.ymarks = [0]
+        for h in rowheights:
+            self.ymarks.append(self.ymarks[-1] + h)
+        self.grid_width = self.xmarks[-1]
+        self.grid_height = self.ymarks[-1]
+        self.titleheight = titleheight
+        self.footerheight = footerheight
+        self.landscape = landscape
+        self.can_rotate = can_rotate
+        self.margins = margins
+        self.cells: dict[tuple[int, int], GridCellData] = {}
+        self.lines_h: dict[int, float] = {}     # {row: width}
+        self.lines_v: dict[int, float] = {}     # {col: width}
+        self.titles: list[GridTitle] = []
+
+    def set_cell(self, row: int, col: int, text: str, **style):
+        """Set the text and style of a cell, see <GridCellData> for the
+        style parameters.
+        """
+        if not (
+            0 <= row < len(self.ymarks) - 1
+            and 0 <= col < len(self.xmarks) - 1
+        ):
+            raise ValueError(f"Grid cell out of range: ({row}, {col})")
+        self.cells[(row, col)] = GridCellData(text, **style)
+
+    def line_h(self, row: int, width: float = THICK_LINE_WIDTH):
+        """Draw a (thick) line above the given row."""
+        self.lines_h[row] = width
+
+    def line_v(self, col: int, width: float = THICK_LINE_WIDTH):
+        """Draw a (thick) line to the left of the given column."""
+        self.lines_v[col] = width
+
+    def set_title(self, text, offset, halign="c", font_scale=None):
+        """Place a text above or below the grid area. As with
+        <GridView.set_title>, a negative offset is measured upwards from
+        the top of the grid, a positive one downwards from the bottom.
+        """
+        self.titles.append(GridTitle(text, offset, halign, font_scale))
+
+
+def colour(rrggbb: str) -> HexColor:
+    return HexColor("#" + rrggbb)
+
+
+def fit_text(text, width, height, rotated, fontsize=FONT_SIZE):
+    """Fit the text to a cell in the same way as <ui.grid_base.Tile>.
+    Return (displayed text, scale factor, width, height), where width
+    and height are those of the area covered by the text.
+    """
+    w = stringWidth(text, FONT, fontsize)
+    h = fontsize * 1.2
+    scale = 1
+    maxw = width - CELL_MARGIN * 2
+    maxh = height - CELL_MARGIN * 2
+    if rotated:
+        maxw, maxh = maxh, maxw
+    if w > maxw:
+        scale = maxw / w
+    if h > maxh:
+        _scale = maxh / h
+        if _scale < scale:
+            scale = _scale
+    if scale < 0.6:
+        text = "###"
+        w = stringWidth(text, FONT, fontsize)
+        scale = min(maxw / w, 1)
+    w *= scale
+    h *= scale
+    if rotated:
+        w, h = h, w
+    return text, scale, w, h
+
+
+def page_setup(table: GridTable):
+    """Choose the page orientation and the scale factor for the table,
+    following the rules of <ui.grid_base.GridView.to_pdf>.
+    Return (page size, scale factor).
+    """
+    left, top, right, bottom = table.margins
+    height = table.titleheight + table.grid_height + table.footerheight
+    width = table.grid_width
+    pw, ph = A4
+    avail_w, avail_h = pw - left - right, ph - top - bottom
+    landscape = table.landscape
+    if table.can_rotate:
+        if width > height:
+            if (not landscape) and width > avail_w:
+                landscape = True
+        elif width < height:
+            if landscape and height > avail_h:
+                landscape = False
+    if landscape:
+        pw, ph = landscape_size(A4)
+        # The margins are rotated, so that "left" refers to the top margin
+        left, top, right, bottom = bottom, left, top, right
+        avail_w, avail_h = pw - left - right, ph - top - bottom
+    scale = min(1, avail_w / width, avail_h / height)
+    return (pw, ph), (left, top), scale
+
+
+def grid_pdf(table: GridTable) -> bytes:
+    """Render the table as a single pdf page. The result is returned as
+    a <bytes> object.
+    """
+    pdf = BytesIO()
+    pagesize, (left, top), scale = page_setup(table)
+    canvas = Canvas(pdf, pagesize=pagesize)
+    # Use grid coordinates (origin at the top left of the grid), but
+    # with the y-axis pointing upwards, i.e. y-values are negated.
+    canvas.translate(left, pagesize[1] - top)
+    canvas.scale(scale, scale)
+    canvas.translate(0, -table.titleheight)
+    xmarks, ymarks = table.xmarks, table.ymarks
+    # Cell backgrounds and texts
+    for (row, col), cell in table.cells.items():
+        x = xmarks[col]
+        y = ymarks[row]
+        w = xmarks[col + 1] - x
+        h = ymarks[row + 1] - y
+        if cell.bg:
+            canvas.setFillColor(colour(cell.bg))
+            canvas.rect(x, -y - h, w, h, stroke=0, fill=1)
+        if not cell.text:
+            continue
+        text, tscale, tw, th = fit_text(cell.text, w, h, cell.rotated)
+        if cell.halign == "l":
+            x0 = x + CELL_MARGIN
+        elif cell.halign == "r":
+            x0 = x + w - CELL_MARGIN - tw
+        else:
+            x0 = x + (w - tw) / 2
+        if cell.valign == "t":
+            y0 = y + CELL_MARGIN
+        elif cell.valign == "b":
+            y0 = y + h - CELL_MARGIN - th
+        else:
+            y0 = y + (h - th) / 2
+        canvas.saveState()
+        canvas.setFillColor(colour(cell.fg))
+        canvas.setFont(FONT, FONT_SIZE * tscale)
+        # The baseline is about 0.25 * size above the bottom of the text
+        # box (1.2 * size high).
+        descent = FONT_SIZE * 0.25 * tscale
+        if cell.rotated:
+            canvas.translate(x0 + tw - descent, -y0 - th)
+            canvas.rotate(90)
+            canvas.drawString(0, 0, text)
+        else:
+            canvas.drawString(x0, -y0 - th + descent, text)
+        canvas.restoreState()
+    # Grid lines
+    canvas.setStrokeColor(colour(GRID_COLOUR))
+    canvas.setLineWidth(BORDER_WIDTH)
+    x1, y1 = table.grid_width, -table.grid_height
+    for x in xmarks:
+        canvas.line(x, 0, x, y1)
+    for y in ymarks:
+        canvas.line(0, -y, x1, -y)
+    for col, width in table.lines_v.items():
+        canvas.setLineWidth(width)
+        canvas.line(xmarks[col], 0, xmarks[col], y1)
+    for row, width in table.lines_h.items():
+        canvas.setLineWidth(width)
+        canvas.line(0, -ymarks[row], x1, -ymarks[row])
+    # Titles and footers
+    canvas.setFillColor(colour(FONT_COLOUR))
+    for title in table.titles:
+        size = FONT_SIZE * (title.font_scale or 1)
+        w = stringWidth(title.text, FONT_BOLD, size)
+        if title.halign == "l":
+            x = TITLE_MARGIN
+        elif title.halign == "r":
+            x = table.grid_width - TITLE_MARGIN - w
+        else:
+            x = (table.grid_width - w) / 2
+        y = title.offset
+        if y > 0:
+            y += table.grid_height
+        canvas.setFont(FONT_BOLD, size)
+        canvas.drawString(x, -y - size * 0.35, title.text)
+    canvas.showPage()
+    canvas.save()
+    return pdf.getvalue()
+
+
+def export_grids(
+    tables: list[GridTable],
+    pad2sided: int = 0,
+    processes: Optional[int] = None,
+) -> bytes:
+    """Render the tables, one page each, and join them to a single pdf.
+    The tables are rendered concurrently in worker processes (at most
+    <processes>, default: the number of CPUs), see <core.worker>.
+    See <template_engine.template_sub.merge_pdf> for <pad2sided>.
+    The result is returned as a <bytes> object.
+    """
+    from template_engine.template_sub import merge_pdf
+    from core.worker import WorkerPool
+
+    if processes == 1 or len(tables) < 2:
+        pages = [grid_pdf(table) for table in tables]
+    else:
+        with WorkerPool(processes) as pool:
+            pages = pool.map(grid_pdf, tables)
+    return merge_pdf([BytesIO(page) for page in pages], pad2sided)
@@ -1,11 +1,13 @@
 """
 tables/matrix.py
 
-Last updated:  2022-09-10
+Last updated:  2026-10-19
 
 Edit a table template (xlsx).
 
-The base class is <Table>.
+The base class is <Table>. The template file is not loaded as an
+openpyxl workbook, the xml of the template sheet is filled directly (see
+<XlsxTemplate>), which is much faster.
 
 <KlassMatrix> handles writing to xlsx templates for pupil-subject matrices.
 
@@ -40,25 +42,227 @@ _WARN_HIDE_NOT_WORKING = (
 
 from typing import Dict, List, Optional
 
-import datetime
+import os, re, html
 from io import BytesIO
+from zipfile import ZipFile, ZIP_DEFLATED
+from xml.etree import ElementTree
+from concurrent.futures import ProcessPoolExecutor
 
-from openpyxl import load_workbook
-from openpyxl.utils import get_column_letter  # , column_index_from_string
-from openpyxl.styles import Protection
+from openpyxl.utils import get_column_letter, column_index_from_string
+from openpyxl.utils.cell import coordinate_from_string
+from openpyxl.utils.datetime import from_excel
+from openpyxl.utils.protection import hash_password
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
 
 ### +++++
 
+# The template sheet is not loaded as an openpyxl workbook. Instead the
+# sheet xml is split into rows and cells, which are copied unchanged to
+# the output unless they have been written to. Rows and columns beyond
+# the end of the table are simply not copied. Cell protection is set by
+# choosing a cell style (xf) with the required "locked" state, new styles
+# are added to "styles.xml" as necessary.
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_REL = (
+    "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+)
+NS_PKGREL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_ROW_RE = re.compile(r"<row\b([^>]*?)(?:/>|>(.*?)</row>)", re.S)
+_CELL_RE = re.compile(r"<c\b([^>]*?)(?:/>|>(.*?)</c>)", re.S)
+_ATTR_RE = re.compile(r'([\w:]+)="([^"]*)"')
+_V_RE = re.compile(r"<v>(.*?)</v>", re.S)
+_T_RE = re.compile(r"<t\b[^>]*>(.*?)</t>", re.S)
+_F_RE = re.compile(r"<f\b[^>]*>(.*?)</f>", re.S)
+_XF_RE = re.compile(r"<xf\b[^>]*?(?:/>|>.*?</xf>)", re.S)
+_CELLXFS_RE = re.compile(r"(<cellXfs\b[^>]*>)(.*?)(</cellXfs>)", re.S)
+_PROTECTION_RE = re.compile(r"<protection\b([^>]*?)/>", re.S)
+
 
 class MatrixError(Exception):
     pass
 
 
+class XlsxTemplate:
+    """The contents of an xlsx template file, with the active sheet split
+    into rows and cells:
+        <rows>: {row: (row-attributes, {col: (cell-xml, style, value)})},
+    where row and col are 0-based indexes.
+    """
+
+    def __init__(self, filepath: str) -> None:
+        with ZipFile(filepath) as zf:
+            self.files: Dict[str, bytes] = {
+                info.filename: zf.read(info) for info in zf.infolist()
+            }
+        self.sheet_path = self.active_sheet()
+        strings = self.shared_strings()
+        styles = self.files["xl/styles.xml"].decode("utf-8")
+        m = _CELLXFS_RE.search(styles)
+        self.styles_head = styles[: m.start(2)]
+        self.styles_tail = styles[m.end(2) :]
+        self.xfs: List[str] = _XF_RE.findall(m.group(2))
+        numfmts = dict(BUILTIN_FORMATS)
+        for f in ElementTree.fromstring(styles).iter(NS_MAIN + "numFmt"):
+            numfmts[int(f.get("numFmtId"))] = f.get("formatCode")
+        date_styles = set()
+        for i, xf in enumerate(self.xfs):
+            a = dict(_ATTR_RE.findall(xf[: xf.index(">")]))
+            if is_date_format(numfmts.get(int(a.get("numFmtId", 0)))):
+                date_styles.add(i)
+        sheet = self.files[self.sheet_path].decode("utf-8")
+        i0 = sheet.index("<sheetData")
+        i1 = sheet.index(">", i0) + 1
+        if sheet[i1 - 2] == "/":
+            # Empty sheet: "<sheetData/>"
+            self.sheet_head = sheet[:i0] + "<sheetData>"
+            self.sheet_tail = "</sheetData>" + sheet[i1:]
+            body = ""
+        else:
+            i2 = sheet.index("</sheetData>", i1)
+            self.sheet_head = sheet[:i1]
+            self.sheet_tail = sheet[i2:]
+            body = sheet[i1:i2]
+        self.rows = {}
+        r = -1
+        for rm in _ROW_RE.finditer(body):
+            rattr = rm.group(1)
+            a = dict(_ATTR_RE.findall(rattr))
+            r = int(a["r"]) - 1 if "r" in a else r + 1
+            # Remove the row number and the (optional) column span
+            rattr = re.sub(r'\s+(?:r|spans)="[^"]*"', "", rattr)
+            cells = {}
+            c = -1
+            for cm in _CELL_RE.finditer(rm.group(2) or ""):
+                a = dict(_ATTR_RE.findall(cm.group(1)))
+                cxml = cm.group(0)
+                if "r" in a:
+                    c = column_index_from_string(
+                        coordinate_from_string(a["r"])[0]
+                    ) - 1
+                else:
+                    c += 1
+                    cxml = f'<c r="{get_column_letter(c + 1)}{r + 1}"{cxml[2:]}'
+                style = int(a.get("s", 0))
+                inner = cm.group(2) or ""
+                t = a.get("t", "n")
+                fm = _F_RE.search(inner)
+                if fm:
+                    # Formula
+                    t = "f"
+                    v = "=" + fm.group(1)
+                elif t == "inlineStr":
+                    v = "".join(_T_RE.findall(inner))
+                else:
+                    vm = _V_RE.search(inner)
+                    v = vm.group(1) if vm else ""
+                v = html.unescape(v)
+                if t == "s" and v:
+                    v = strings[int(v)]
+                elif t == "n" and v:
+                    if style in date_styles:
+                        v = from_excel(float(v)).strftime("%Y-%m-%d")
+                    else:
+                        f = float(v)
+                        if f.is_integer():
+                            v = str(int(f))
+                cells[c] = (cxml, style, v.strip())
+            self.rows[r] = (rattr, cells)
+
+    def active_sheet(self) -> str:
+        """Return the path (within the zip-file) of the active sheet."""
+        wb = ElementTree.fromstring(self.files["xl/workbook.xml"])
+        active = 0
+        for view in wb.iter(NS_MAIN + "workbookView"):
+            active = int(view.get("activeTab", 0))
+            break
+        sheet = list(wb.iter(NS_MAIN + "sheet"))[active]
+        rid = sheet.get(NS_REL + "id")
+        rels = ElementTree.fromstring(
+            self.files["xl/_rels/workbook.xml.rels"]
+        )
+        for rel in rels.iter(NS_PKGREL + "Relationship"):
+            if rel.get("Id") == rid:
+                target = rel.get("Target")
+                if target.startswith("/"):
+                    return target[1:]
+                return "xl/" + target
+        raise MatrixError(f"Bad xlsx file (no active sheet): {rid}")
+
+    def shared_strings(self) -> List[str]:
+        try:
+            data = self.files["xl/sharedStrings.xml"]
+        except KeyError:
+            return []
+        strings = []
+        for si in ElementTree.fromstring(data):
+            # Plain text (<t>) or rich text runs (<r><t>), ignoring
+            # phonetic hints (<rPh>)
+            strings.append(
+                "".join(
+                    t.text or ""
+                    for e in si
+                    if e.tag != NS_MAIN + "rPh"
+                    for t in (e if e.tag == NS_MAIN + "r" else [e])
+                    if t.tag == NS_MAIN + "t"
+                )
+            )
+        return strings
+
+
+def xf_locked(xf: str) -> bool:
+    """Return the "locked" state of a cell style (default is locked)."""
+    m = _PROTECTION_RE.search(xf)
+    if m:
+        a = dict(_ATTR_RE.findall(m.group(1)))
+        return a.get("locked", "1") not in ("0", "false")
+    return True
+
+
+def xf_with_protection(xf: str, locked: bool) -> str:
+    """Return a copy of the cell style with the given "locked" state."""
+    xf = _PROTECTION_RE.sub("", xf)
+    xf = re.sub(r'\s+applyProtection="[^"]*"', "", xf)
+    p = f'<protection locked="{int(locked)}" hidden="0"/>'
+    if xf.endswith("/>"):
+        return f'{xf[:-2].rstrip()} applyProtection="1">{p}</xf>'
+    i = xf.find("<extLst")
+    if i < 0:
+        i = len(xf) - 5  # before "</xf>"
+    i0 = xf.index(">")
+    return f'{xf[:i0]} applyProtection="1"{xf[i0:i]}{p}{xf[i:]}'
+
+
+__templates: Dict[str, tuple[XlsxTemplate, int]] = {}  # {path: (template, mtime)}
+
+
+def read_template(filepath: str) -> XlsxTemplate:
+    """Return the parsed template, using a cached version if the file
+    has not changed.
+    """
+    mtime = os.stat(filepath).st_mtime_ns
+    try:
+        t, m = __templates[filepath]
+        if m == mtime:
+            return t
+    except KeyError:
+        pass
+    t = XlsxTemplate(filepath)
+    __templates[filepath] = (t, mtime)
+    return t
+
+
 ### -----
 
 
 class Table:
-    """openpyxl based spreadsheet handler ('.xlsx'-files)."""
+    """Spreadsheet handler ('.xlsx'-files) for filling a template.
+    The template is not changed, all writes are recorded and applied in
+    one pass over the template sheet when the result is saved. Thus the
+    table can also be pickled and saved in a different process (see
+    <save_tables>).
+    """
 
     @staticmethod
     def columnLetter(i: int) -> str:
@@ -69,24 +273,36 @@ class Table:
         if not filepath.endswith(".xlsx"):
             filepath += ".xlsx"
         self.template: str = filepath
-        self._wb = load_workbook(self.template)
-        self.rows: List[List[str]] = []
-        for row in self._wb.active.iter_rows():
-            values: List[str] = []
-            for cell in row:
-                v = cell.value
-                if isinstance(v, datetime.datetime):
-                    v = v.strftime("%Y-%m-%d")
-                elif isinstance(v, str):
-                    v = v.strip()
-                elif v == None:
-                    v = ""
-                else:
-                    v = str(v)
-                values.append(v)
-            self.rows.append(values)
-        self.protected = Protection(locked=True)
-        self.unprotected = Protection(locked=False)
+        self._xlsx = read_template(self.template)
+        # The cell values, up to the last non-empty row and column.
+        # Styled but empty cells (possibly extending to the end of the
+        # sheet) are not included.
+        values = {
+            (r, c): cell[2]
+            for r, (_, cells) in self._xlsx.rows.items()
+            for c, cell in cells.items()
+            if cell[2]
+        }
+        nrows = max((r for r, c in values), default=-1) + 1
+        ncols = max((c for r, c in values), default=-1) + 1
+        self.rows: List[List[str]] = [[""] * ncols for r in range(nrows)]
+        for (r, c), v in values.items():
+            self.rows[r][c] = v
+        # Rows and columns from these indexes will be dropped
+        self.nrows: Optional[int] = None
+        self.ncols: Optional[int] = None
+        # {(row, col): (value, protect)}
+        self.cells: Dict[tuple[int, int], tuple[str, Optional[bool]]] = {}
+        self.protection: Optional[str] = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_xlsx"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._xlsx = read_template(self.template)
 
     #    def getCell(self, celltag: str) -> Any:
     #        return self._wb.active[celltag].value
@@ -97,48 +313,177 @@ class Table:
     #        return self.getCell(f"{self.columnLetter(col)}{row+1}")
 
     def setCell(self, celltag: str, value: str) -> None:
-        cell = self._wb.active[celltag]
-        cell.value = value
-        # To set some "style" (see openpyxl docs):
-        # cell.style = style
+        col, row = coordinate_from_string(celltag)
+        self.write(row - 1, column_index_from_string(col) - 1, value)
 
     def write(self, row: int, col: int, val: str,
             protect: Optional[bool] = None) -> None:
-        """Write to the cell at the given position (0-based indexes)."""
-        cell = self._wb.active[f"{self.columnLetter(col)}{row+1}"]
-        cell.value = val
-        # To set/clear cell protection
-        if protect != None:
-            cell.protection = self.protected if protect else self.unprotected
+        """Write to the cell at the given position (0-based indexes).
+        If <protect> is not <None>, the cell is locked (<True>) or
+        unlocked (<False>) by choosing an appropriate style.
+        """
+        self.cells[(row, col)] = (val, protect)
 
     def delEndCols(self, col0: int) -> None:
         """Delete last columns, starting at index <col0> (0-based)."""
-        ndel: int = len(self.rows[0]) - col0
-        if ndel > 0:
-            self._wb.active.delete_cols(col0 + 1, ndel)
+        if self.ncols is None or col0 < self.ncols:
+            self.ncols = col0
 
     def delEndRows(self, row0: int) -> None:
         """Delete last rows, starting at index <row0> (0-based)."""
-        ndel = len(self.rows) - row0
-        if ndel > 0:
-            self._wb.active.delete_rows(row0 + 1, ndel)
+        if self.nrows is None or row0 < self.nrows:
+            self.nrows = row0
 
     def protectSheet(self, pw: str = None) -> None:
         if pw:
-            self._wb.active.protection.set_password(pw)
+            self.protection = (
+                f'<sheetProtection password="{hash_password(pw)}"'
+                ' sheet="1"/>'
+            )
         else:
-            self._wb.active.protection.enable()
+            self.protection = '<sheetProtection sheet="1"/>'
 
     def save(self, filepath: str) -> str:
         if not filepath.endswith(".xlsx"):
             filepath += ".xlsx"
-        self._wb.save(filepath)
+        with open(filepath, "wb") as fh:
+            fh.write(self.save_bytes())
         return filepath
 
     def save_bytes(self) -> bytes:
-        virtual_workbook = BytesIO()
-        self._wb.save(virtual_workbook)
-        return virtual_workbook.getvalue()
+        xlsx = self._xlsx
+        xfs = list(xlsx.xfs)
+        variants = {}  # {(style, locked): style}
+
+        def style_variant(style: int, locked: bool) -> int:
+            try:
+                return variants[(style, locked)]
+            except KeyError:
+                pass
+            if xf_locked(xfs[style]) == locked:
+                v = style
+            else:
+                xf = xf_with_protection(xfs[style], locked)
+                try:
+                    v = xfs.index(xf)
+                except ValueError:
+                    v = len(xfs)
+                    xfs.append(xf)
+            variants[(style, locked)] = v
+            return v
+
+        nrows = self.nrows
+        if nrows is None:
+            nrows = max(
+                max(xlsx.rows, default=-1),
+                max((r for r, c in self.cells), default=-1),
+            ) + 1
+        ncols = self.ncols
+        if ncols is None:
+            ncols = max(
+                max(
+                    (max(cells, default=-1) for _, cells in xlsx.rows.values()),
+                    default=-1,
+                ),
+                max((c for r, c in self.cells), default=-1),
+            ) + 1
+        # Group the written cells by row
+        written: Dict[int, Dict[int, tuple[str, Optional[bool]]]] = {}
+        for (r, c), v in self.cells.items():
+            if r < nrows and c < ncols:
+                try:
+                    written[r][c] = v
+                except KeyError:
+                    written[r] = {c: v}
+        empty = ("", {})
+        parts = [xlsx.sheet_head]
+        for r in sorted(set(xlsx.rows) | set(written)):
+            if r >= nrows:
+                break
+            rattr, tcells = xlsx.rows.get(r, empty)
+            wcells = written.get(r)
+            rn = r + 1
+            parts.append(f'<row r="{rn}"{rattr}>')
+            if wcells:
+                cols = sorted(
+                    c for c in set(tcells) | set(wcells) if c < ncols
+                )
+            else:
+                cols = [c for c in tcells if c < ncols]
+            for c in cols:
+                try:
+                    val, protect = wcells[c]
+                except (KeyError, TypeError):
+                    parts.append(tcells[c][0])
+                    continue
+                try:
+                    style = tcells[c][1]
+                except KeyError:
+                    style = 0
+                if protect is not None:
+                    style = style_variant(style, protect)
+                ref = f"{get_column_letter(c + 1)}{rn}"
+                s = f' s="{style}"' if style else ""
+                if val is None or val == "":
+                    parts.append(f'<c r="{ref}"{s}/>')
+                elif isinstance(val, (int, float)) and not isinstance(
+                    val, bool
+                ):
+                    parts.append(f'<c r="{ref}"{s}><v>{val}</v></c>')
+                else:
+                    parts.append(
+                        f'<c r="{ref}"{s} t="inlineStr"><is>'
+                        f'<t xml:space="preserve">{html.escape(str(val), False)}'
+                        "</t></is></c>"
+                    )
+            parts.append("</row>")
+        tail = xlsx.sheet_tail
+        if self.protection:
+            tail = re.sub(r"<sheetProtection\b[^>]*/>", "", tail)
+            # <sheetProtection> follows <sheetData> and <sheetCalcPr>
+            i = len("</sheetData>")
+            m = re.match(r"</sheetData>\s*<sheetCalcPr\b[^>]*/>", tail)
+            if m:
+                i = m.end()
+            tail = tail[:i] + self.protection + tail[i:]
+        parts.append(tail)
+        sheet = "".join(parts)
+        if nrows and ncols:
+            dim = f"A1:{get_column_letter(ncols)}{nrows}"
+        else:
+            dim = "A1"
+        sheet = re.sub(
+            r'(<dimension\b[^>]*\bref=")[^"]*', rf"\g<1>{dim}", sheet, 1
+        )
+        files = dict(xlsx.files)
+        files[xlsx.sheet_path] = sheet.encode("utf-8")
+        if len(xfs) > len(xlsx.xfs):
+            head = re.sub(
+                r'(<cellXfs\b[^>]*\bcount=")\d+',
+                rf"\g<1>{len(xfs)}",
+                xlsx.styles_head,
+            )
+            files["xl/styles.xml"] = (
+                head + "".join(xfs) + xlsx.styles_tail
+            ).encode("utf-8")
+        xlsxbytes = BytesIO()
+        with ZipFile(xlsxbytes, "w", ZIP_DEFLATED) as zf:
+            for name, data in files.items():
+                zf.writestr(name, data)
+        return xlsxbytes.getvalue()
+
+
+def save_tables(
+    tables: List[Table], processes: Optional[int] = None
+) -> List[bytes]:
+    """Build the xlsx-files for the given tables, concurrently in worker
+    processes (at most <processes>, default: the number of CPUs).
+    Return a list of the file contents as <bytes>.
+    """
+    if processes == 1 or len(tables) < 2:
+        return [table.save_bytes() for table in tables]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(Table.save_bytes, tables))
 
 
 class KlassMatrix(Table):
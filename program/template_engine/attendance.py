@@ -1,9 +1,15 @@
 # -*- coding: utf-8 -*-
 """
-template_engine/attendance.py - last updated 2021-12-19
+template_engine/attendance.py - last updated 2026-10-19
 
 Create attendance table for a class.
 
+The attendance entries for a class are held as a compact array
+(<AttendanceData>): pupils × months × days, each entry being a small
+integer, the index of the entry code (see <ATTENDANCE_CODES>). Every
+month has 31 day-slots, so that a month corresponds directly to a page
+of the attendance table. The array is saved as a binary (numpy) file.
+
 ==============================
 Copyright 2021 Michael Towers
 
@@ -59,6 +65,8 @@ _CLASS_MISMATCH = "Klasse hat unterschiedliche Namen: {class1}" \
 _BAD_LINE = "ungültige Zeile in Anwesenheitstabelle (Seite = {sheet}):\n" \
         "  {line}\n    in {path}"
 _FILE_TYPE_ERROR = "Ungültiger Dateityp: {path}"
+_TOO_MANY_CODES = "Klasse {klass}: zu viele verschiedene Einträge in" \
+        " der Anwesenheitstabelle"
 
 ########################################################################
 
@@ -81,12 +89,14 @@ from core.base import Dates
 
 import datetime, calendar, json
 
+import numpy
+
 from openpyxl import load_workbook
 #from openpyxl.worksheet.properties import WorksheetProperties, PageSetupProperties
 from openpyxl.utils import column_index_from_string#, get_column_letter
 from openpyxl.styles import PatternFill
 
-from core.pupils import Pupils
+from core.pupils import get_pupils, pupil_name
 from tables.spreadsheet import Spreadsheet
 
 class AttendanceError(Exception):
@@ -366,9 +376,11 @@ class Table:
 #TODO ...
 
 
-def pupil_list(pupils, klass):
-    pdatalist = pupils.class_pupils(klass)
-    return [(pdata["PID"], pdata.name()) for pdata in pdatalist]
+def pupil_list(klass):
+    """Return the pupils of the given class as a list of pairs:
+        [(pid, pupil-name), ...]
+    """
+    return [(pdata["PID"], pupil_name(pdata)) for pdata in get_pupils(klass)]
 
 
 def attendanceData(klass):
@@ -401,36 +413,6 @@ def attendanceData(klass):
     return None
 
 
-def saveAttendanceData(klass, data):
-    """Save the attendance data for the given class "internally".
-
-TODO: describe data ...
-
-    Return pupil attendance data as a mapping: {
-        "__MODIFIED__": timestamp,
-        pupil-id: {
-            "__NAME__": pupil-name (short form),
-            date ("yyyy-mm-dd"): entry,
-            ... (further dates)
-            "yyyy-mm-A": total number of A-entries (as string),
-            "yyyy-mm-V": total number of V-entries (as string)
-        },
-        ... (further pupils)
-    }
-    If there is no data for this class, return <None>.
-    """
-    d = {
-        "TYPE": "ATTENDANCE",
-        "__MODIFIED__": Dates.timestamp(),
-        "SCHOOLYEAR": SCHOOLYEAR,
-        "CLASS": klass,
-        "DATA": data
-    }
-    filepath = DATAPATH(CONFIG["ATTENDANCE"].format(klass=klass))
-    with open(filepath, "w", encoding="utf-8") as fh:
-        json.dump(d, fh)
-
-
 def attendanceTable(filepath):
     """Read the file at <filepath> as an attendance table.
     """
@@ -532,13 +514,231 @@ def analyse_attendance(last_year_month, pupildata):
     return year_months, pupil_A, pupil_V
 
 
+# The possible entries (see also the editor, <ui.modules.attendance>).
+# In the data arrays the index of the entry in this list is stored.
+# Other codes (e.g. from imported tables) are added to a class's code
+# list as they are needed.
+ATTENDANCE_CODES = ("", "A", "Ae", "T", "Te", "V", "Ve")
+# The codes which are counted in the summaries
+SUMMARY_CODES = {
+    "A": ("A", "Ae"),   # absent for the whole day
+    "T": ("T", "Te"),   # absent for part of the day
+    "V": ("V", "Ve"),   # late
+}
+
+
+def attendance_path(klass):
+    """Return the path to the attendance data (array) file for the given
+    class.
+    """
+    return DATAPATH(CONFIG["ATTENDANCE"].format(klass=klass)).rsplit(
+        ".", 1)[0] + ".npz"
+
+
+def schoolday_mask(month_data):
+    """Return a boolean array (months × 31 days), true for school days,
+    i.e. not for weekends, holidays or non-existent dates.
+    <month_data> is the list returned by <get_month_data>.
+    """
+    return numpy.array(
+        [[colour is None for colour in md[3]] for md in month_data],
+        dtype=bool,
+    )
+
+
+class AttendanceData:
+    """The attendance entries for a class in the current school-year.
+
+    The entries are in the array <data>: pupils × months × days (31),
+    the pupils being in the order of the list <pids>, the months starting
+    with the first month of the school-year. The values are indexes into
+    the list of entry codes, <codes>, so that 0 ("") means present.
+    """
+    def __init__(self, klass, pids=None, codes=None, data=None):
+        self.klass = klass
+        self.pids = list(pids or [])
+        self.codes = list(codes or ATTENDANCE_CODES)
+        if data is None:
+            data = numpy.zeros((len(self.pids), 12, 31), dtype=numpy.uint8)
+        self.data = data
+        self.__code_index = {c: i for i, c in enumerate(self.codes)}
+
+    @classmethod
+    def load(cls, klass):
+        """Read the attendance data for the given class. If there is no
+        array file, but old (json) attendance data, that is converted.
+        If there is no data for this class, return <None>.
+        """
+        filepath = attendance_path(klass)
+        if not os.path.isfile(filepath):
+            pupilmap = attendanceData(klass)
+            if pupilmap is None:
+                return None
+            return cls.from_pupilmap(klass, pupilmap,
+                    get_month_data(CALENDAR))
+        with numpy.load(filepath, allow_pickle=False) as npz:
+            if (
+                str(npz["TYPE"]) != "ATTENDANCE"
+                or str(npz["SCHOOLYEAR"]) != SCHOOLYEAR
+                or str(npz["CLASS"]) != klass
+            ):
+                raise AttendanceError(_FILE_TYPE_ERROR.format(
+                        path=filepath))
+            return cls(klass, npz["PIDS"].tolist(), npz["CODES"].tolist(),
+                    npz["DATA"])
+
+    @classmethod
+    def from_pupilmap(cls, klass, pupilmap, month_data):
+        """Build the array from a mapping {pid: {date: entry, ...}, ...},
+        as supplied by <attendanceData>. Other keys are ignored.
+        """
+        self = cls(klass, [pid for pid in pupilmap if pid[0] != "_"])
+        days = {}
+        for m, md in enumerate(month_data):
+            for d, date in enumerate(md[4]):
+                if date:
+                    days[date] = (m, d)
+        for row, pid in enumerate(self.pids):
+            for key, entry in pupilmap[pid].items():
+                try:
+                    m, d = days[key]
+                except KeyError:
+                    continue
+                self.data[row, m, d] = self.code(entry)
+        return self
+
+    def save(self):
+        """Save the attendance data for the class "internally".
+        The file is written via a temporary file, which then replaces the
+        old one.
+        """
+        filepath = attendance_path(self.klass)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        tpath = filepath + ".tmp"
+        with open(tpath, "wb") as fh:
+            numpy.savez_compressed(fh,
+                TYPE="ATTENDANCE",
+                __MODIFIED__=Dates.timestamp(),
+                SCHOOLYEAR=SCHOOLYEAR,
+                CLASS=self.klass,
+                PIDS=numpy.array(self.pids, dtype=str),
+                CODES=numpy.array(self.codes, dtype=str),
+                DATA=self.data
+            )
+        os.replace(tpath, filepath)
+
+    def code(self, entry):
+        """Return the index for the given entry code, adding it to the
+        code list if necessary.
+        """
+        try:
+            return self.__code_index[entry]
+        except KeyError:
+            pass
+        i = len(self.codes)
+        if i > 255:
+            raise AttendanceError(_TOO_MANY_CODES.format(klass=self.klass))
+        self.codes.append(entry)
+        self.__code_index[entry] = i
+        return i
+
+    def set_pupils(self, pids):
+        """Arrange the rows according to the given list of pupil-ids.
+        Pupils without data get empty rows. Pupils which are not in the
+        list are retained (at the end), as the data is supposed to be a
+        record of the whole year.
+        """
+        rows = {pid: i for i, pid in enumerate(self.pids)}
+        pidset = set(pids)
+        old = [pid for pid in self.pids if pid not in pidset]
+        self.pids = list(pids) + old
+        data = numpy.zeros((len(self.pids), 12, 31), dtype=numpy.uint8)
+        for i, pid in enumerate(self.pids):
+            try:
+                data[i] = self.data[rows[pid]]
+            except KeyError:
+                pass
+        self.data = data
+
+    def get(self, row, month_index, day_index):
+        return self.codes[self.data[row, month_index, day_index]]
+
+    def set(self, row, month_index, day_index, entry):
+        """Set an entry, return true if it was changed."""
+        i = self.code(entry)
+        if self.data[row, month_index, day_index] == i:
+            return False
+        self.data[row, month_index, day_index] = i
+        return True
+
+    def month_entries(self, month_index):
+        """Return the entries for the given month as a list of rows, one
+        per pupil, each with 31 entries (<str>).
+        """
+        codes = numpy.array(self.codes, dtype=object)
+        return codes[self.data[:, month_index]].tolist()
+
+    def counts(self, schooldays):
+        """Count the entries in each of the categories of <SUMMARY_CODES>
+        for each pupil and month. Entries on days which are not school
+        days (see <schoolday_mask>) are ignored.
+        Return a mapping {category: array (pupils × 13)}, the last column
+        being the total for the school-year.
+        """
+        result = {}
+        for cat, codes in SUMMARY_CODES.items():
+            lookup = numpy.zeros(len(self.codes), dtype=bool)
+            for c in codes:
+                try:
+                    lookup[self.__code_index[c]] = True
+                except KeyError:
+                    pass
+            monthly = (lookup[self.data] & schooldays).sum(axis=2)
+            result[cat] = numpy.concatenate(
+                (monthly, monthly.sum(axis=1, keepdims=True)), axis=1
+            )
+        return result
+
+    def pupilmap(self, month_data):
+        """Return the entries as a mapping {pid: {date: entry, ...}, ...},
+        as used by <Table.make_year>.
+        """
+        pmap = {pid: {} for pid in self.pids}
+        for row, m, d in zip(*numpy.nonzero(self.data)):
+            date = month_data[m][4][d]
+            if date:
+                pmap[self.pids[row]][date] = self.codes[self.data[row, m, d]]
+        return pmap
+
+
+def attendance_totals(classes, calendar_data):
+    """Return the annual totals for the given classes, e.g. for the
+    report cards: {class: {pid: {category: count, ...}, ...}, ...}.
+    The categories are those of <SUMMARY_CODES>. Classes without data
+    are not included.
+    """
+    schooldays = schoolday_mask(get_month_data(calendar_data))
+    totals = {}
+    for klass in classes:
+        adata = AttendanceData.load(klass)
+        if adata is None:
+            continue
+        counts = {cat: a[:, -1].tolist()
+                for cat, a in adata.counts(schooldays).items()}
+        totals[klass] = {
+            pid: {cat: c[i] for cat, c in counts.items()}
+            for i, pid in enumerate(adata.pids)
+        }
+    return totals
+
+
 #--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
 
 if __name__ == '__main__':
     table = Table()
     month_data = get_month_data(CALENDAR)
     klass = "12G"
-    pupilnames = pupil_list(Pupils(), klass)
+    pupilnames = pupil_list(klass)
 
 #    pupilnames = [
 #        ("001", "Fritz Blume"),
@@ -3,7 +3,7 @@
 """
 template_engine/coversheet.py
 
-Last updated:  2023-04-29
+Last updated:  2026-10-19
 
 Build the outer sheets (cover sheets) for the text reports.
 User fields in template files are replaced by the report information.
@@ -84,17 +84,10 @@ def for_class(klass, date):
         <klass>: the class id
     Return the path to the resulting pdf-file.
     """
-    pdlist = pupils_in_group(klass, date)
     template = Template(cover_template(klass))
-    gmap0 = base_data(klass, date)
-    gmaplist = []
-    for pdata in pdlist:
-        gmap = pupil_data_filter(pdata)
-        gmap.update(gmap0)
-        gmaplist.append(gmap)
     save_dir = DATAPATH(COVER_CLASS.format(klass=klass))
     pdfs = template.make_pdfs(
-        gmaplist,
+        class_data(klass, date),
         save_dir,
         show_run_messages=1
     )
@@ -103,6 +96,19 @@ def for_class(klass, date):
     return join_pdfs(pdf_path_list, save_dir)
 
 
+def class_data(klass, date):
+    """Return the list of data mappings for the cover sheets of the
+    pupils in the given class (see <for_class>).
+    """
+    gmap0 = base_data(klass, date)
+    gmaplist = []
+    for pdata in pupils_in_group(klass, date):
+        gmap = pupil_data_filter(pdata)
+        gmap.update(gmap0)
+        gmaplist.append(gmap)
+    return gmaplist
+
+
 def join_pdfs(pdf_path_list, outfile):
     if not outfile.endswith(".pdf"):
         outfile += ".pdf"
@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 
 """
-simpleodt.py - last updated 2021-04-11
+simpleodt.py - last updated 2026-10-19
 
 1) OdtReader
 =============
@@ -12,6 +12,9 @@ Read the text content of odt files ignoring all formatting/style information.
 ===============
 (a) Fetch the names of the "fields" from a LibreOfffice Writer file.
 (b) Fill the "fields" in a LibreOfffice Writer file.
+The template files are read only once (see <OdtTemplate>): the field
+list, the metadata and a "substitution plan" – the content split into
+static byte chunks and fields – are cached.
 
 ==============================
 Copyright 2021 Michael Towers
@@ -125,6 +128,157 @@ def substituteZipContent(infile, process = None, metaprocess = None):
 
 ###
 
+class OdtTemplate:
+    """The parts of an odt-file needed for reading and filling its
+    fields, read once and cached (see <get>):
+        <base>: the zip archive without the content and meta files, as
+            a <bytes> array – when filling, these two files are added,
+            so the other parts don't need to be compressed again;
+        <chunks>: the static parts of the content file, with the fields
+            (<slots>) between them;
+        <slots>: for each field a tuple (tag, paragraph prefix or <None>,
+            field text), see <OdtFields>;
+        <fields>: the list of fields, as returned by
+            <OdtFields.listUserFields>;
+        <meta>: the meta file (or <None>).
+    """
+    _registry = {}
+#
+    @classmethod
+    def get(cls, odtfile):
+        """Return the (cached) instance for the given file path. If the
+        file has changed since it was read, it is read again.
+        """
+        st = os.stat(odtfile)
+        key = (st.st_mtime_ns, st.st_size)
+        odt = cls._registry.get(odtfile)
+        if odt is None or odt.key != key:
+            odt = cls(odtfile, key)
+            cls._registry[odtfile] = odt
+        return odt
+#
+    def __init__(self, odtfile, key = None):
+        self.odtfile = odtfile
+        self.key = key
+        self.meta = None
+        content = b''
+        sio = io.BytesIO()
+        with zf.ZipFile(sio, "w") as zio:
+            with zf.ZipFile(odtfile, "r") as za:
+                for zinfo in za.infolist():
+                    indata = za.read(zinfo)
+                    if zinfo.filename == _ODT_CONTENT_FILE:
+                        content = indata
+                    elif zinfo.filename == _ODT_META_FILE:
+                        self.meta = indata
+                    else:
+                        # Keep the compression type, the "mimetype"
+                        # file should be stored uncompressed.
+                        zio.writestr(zinfo, indata)
+        self.base = sio.getvalue()
+        self.chunks = []
+        self.slots = []
+        self.fields = []
+        pos = 0
+        for rem in re.finditer(OdtFields._combex, content):
+            style = rem.group(1)
+            if style:
+                tag = rem.group(2).decode('utf-8')
+                para = rem.group(0).split(b'[', 1)[0]
+                self.fields.append((tag, style.decode('utf-8')))
+            else:
+                tag = rem.group(3).decode('utf-8')
+                para = None
+                self.fields.append((tag, None))
+            self.chunks.append(content[pos:rem.start()])
+            self.slots.append((tag, para, rem.group(0)))
+            pos = rem.end()
+        self.chunks.append(content[pos:])
+        self.__meta = {}
+        # Further data derived from the template, e.g. by <Template>
+        self.cache = {}
+#
+    def fill(self, itemdict, FIELD_INFO = None):
+        """Substitute the fields, see <OdtFields.fillUserFields>.
+        """
+        useditems = set()
+        nonitems = set()
+        parts = [self.chunks[0]]
+        for (tag, para, field), chunk in zip(self.slots, self.chunks[1:]):
+            try:
+                item = itemdict[tag]
+            except KeyError:
+                nonitems.add(tag)
+                if itemdict:
+                    # If the tag mapping is not empty, leave the tag field
+                    parts.append(field)
+                    parts.append(chunk)
+                    continue
+                sub_string = ('{' + tag + '}').encode('utf-8')
+            else:
+                if item == None:
+                    raise Bug("tag '%s': None" % tag)
+                sub_string = xmlescape(item).encode('utf-8')
+                useditems.add(tag)
+            lines = sub_string.splitlines()
+            if para:
+                ## Reconstruct the paragraph
+                for line in lines:
+                    parts.append(para)
+                    parts.append(line)
+                    parts.append(b'</text:p>')
+            elif len(lines) > 1:
+                raise DocumentError(_MULTILINE_NO_PARA.format(tag = tag))
+            else:
+                parts.append(sub_string)
+            parts.append(chunk)
+        sio = io.BytesIO(self.base)
+        with zf.ZipFile(sio, "a", compression=zf.ZIP_DEFLATED) as zio:
+            zio.writestr(_ODT_CONTENT_FILE, b''.join(parts))
+            if self.meta is not None:
+                if FIELD_INFO == None:
+                    zio.writestr(_ODT_META_FILE, self.meta)
+                else:
+                    zio.writestr(_ODT_META_FILE,
+                            self.meta_with_info(FIELD_INFO))
+        return (sio.getvalue(), useditems, nonitems)
+#
+    def meta_with_info(self, FIELD_INFO):
+        """Return the meta file with a new "comment" metadata item
+        ("dc.description"). If <FIELD_INFO> is '', the item is removed.
+        """
+        if FIELD_INFO:
+            bc = b'<dc:description>%s</dc:description>' % \
+                    escape(FIELD_INFO).encode('utf-8')
+        else:
+            bc = b''
+        return re.sub(b'<dc:description>[^<]*</dc:description>',
+                bc, self.meta)
+#
+    def doc_meta(self):
+        """Return the "normal" metadata, see <Metadata.doc_meta>.
+        """
+        try:
+            return self.__meta['doc']
+        except KeyError:
+            pass
+        md = Metadata(self.odtfile, self.meta).doc_meta()
+        self.__meta['doc'] = md
+        return md
+#
+    def user_meta(self):
+        """Return the "custom" metadata, see <Metadata.user_meta>.
+        """
+        try:
+            return self.__meta['user']
+        except KeyError:
+            pass
+        md = Metadata(self.odtfile, self.meta).user_meta()
+        self.__meta['user'] = md
+        return md
+
+###
+
 class OdtFields:
     """Manage substitution of "fields" in an odt document.
     A field is a text snippet like "[[key]]". The key may contain ASCII
@@ -156,19 +310,7 @@ class OdtFields:
             [[tag]]
         in the xml content file.
         """
-        tagmap = []
-        def _process(xmldata):
-            for vals in re.findall(cls._combex, xmldata):
-                style = vals[0] or None
-                if style:
-                    tagmap.append((vals[1].decode('utf-8'),
-                            style.decode('utf-8')))
-                else:
-                    tagmap.append((vals[2].decode('utf-8'), None))
-            return None
-
-        substituteZipContent(odtfile, _process)
-        return tagmap
+        return list(OdtTemplate.get(odtfile).fields)
 #
     @classmethod
     def fillUserFields(cls, odtfile, itemdict, FIELD_INFO = None):
@@ -177,65 +319,11 @@ class OdtFields:
         <FIELD_INFO> may be a <str>, specifying a new "comment" metadata
         ("dc.description"). If the value is '', the metadata item
         will be removed.
+        The template file is read only once, see <OdtTemplate>.
+        Return a tuple: (odt-file as <bytes>, set of substituted tags,
+        set of tags without value).
         """
-        useditems = set()
-        nonitems = set()
-#
-        def _sub(rem):
-            #print(":::", rem.group(0), "->")
-            style = rem.group(1) or None
-            # The tags are converted to <str> so that the item mapping
-            # doesn't need to work with <bytes>.
-            if style:
-                tag = rem.group(2).decode('utf-8')
-            else:
-                tag = rem.group(3).decode('utf-8')
-            try:
-                item = itemdict[tag]
-                if item == None:
-                    raise Bug("tag '%s': None" % tag)
-                sub_string = xmlescape(item).encode('utf-8')
-                useditems.add(tag)
-            except KeyError:
-                nonitems.add(tag)
-                if itemdict:
-                    # If the tag mapping is not empty, leave the tag field
-                    return rem.group(0)
-                sub_string = ('{' + tag + '}').encode('utf-8')
-            lines = sub_string.splitlines()
-            if style:
-                ## Reconstruct the paragraph
-                # Get paragraph prefix
-                para = rem.group(0).split(b'[', 1)[0]
-                # Build the lines
-                sub_lines = [para + line + b'</text:p>' for line in lines]
-                sub_string = b''.join(sub_lines)
-            elif len(lines) > 1:
-                raise DocumentError(_MULTILINE_NO_PARA.format(tag = tag))
-            #print(sub_string)
-            return sub_string
-#
-        def _process(xmldata):
-            """Use the regular expression to find all field declarations.
-            Those for which an entry is provided in <itemdict> will have
-            their values substituted.
-            """
-            return re.sub(cls._combex, _sub, xmldata)
-#
-        def _metaprocess(xmldata):
-            """Remove user-defined fields.
-            """
-            if FIELD_INFO:
-                bc = b'<dc:description>%s</dc:description>' % \
-                        escape(FIELD_INFO).encode('utf-8')
-            else:
-                bc = b''
-            return re.sub(b'<dc:description>[^<]*</dc:description>',
-                    bc, xmldata)
-
-        odtBytes = substituteZipContent(odtfile, _process,
-                metaprocess = None if FIELD_INFO == None else _metaprocess)
-        return (odtBytes, useditems, nonitems)
+        return OdtTemplate.get(odtfile).fill(itemdict, FIELD_INFO)
 
 ###
 
@@ -243,12 +331,16 @@ class Metadata:
     """Manage the metadata of an odt-file (it could also be used on an
     ods-file).
     """
-    def __init__(self, odtfile):
+    def __init__(self, odtfile, xmldata = None):
         """<odtfile> is the full path to the file to be processed.
-        Its metadata will be read (to <self.xmldict>).
+        Its metadata will be read (to <self.xmldict>), unless the
+        contents of the meta file are passed as <xmldata>.
         """
         self.odtfile = odtfile
-        substituteZipContent(odtfile, metaprocess = self._process)
+        if xmldata is None:
+            substituteZipContent(odtfile, metaprocess = self._process)
+        else:
+            self._process(xmldata)
 #
     def _process(self, xmldata):
         self.xmldict = xmltodict.parse(xmldata)
@@ -1,7 +1,7 @@
 """
 template_engine/template_sub.py
 
-Last updated:  2023-04-25
+Last updated:  2026-10-19
 
 Manage the substitution of "special" fields in an odt template.
 
@@ -53,14 +53,16 @@ T = TRANSLATIONS("template_engine.template_sub")
 
 from io import BytesIO
 import tempfile
+import pathlib
 
-from pikepdf import Pdf, Page
-
+from core.base import lazy_import
 from core.run_extern import run_extern
-from template_engine.simpleodt import OdtFields, Metadata
+from template_engine.simpleodt import OdtFields, OdtTemplate
 from template_engine.simpleodt import DocumentError as TemplateError
 from minion2 import Minion, MinionError
 
+pikepdf = lazy_import("pikepdf")
+
 ### -----
 
 
@@ -73,13 +75,13 @@ def merge_pdf(ifile_list: list[str], pad2sided: int=0) -> bytes:
     padding), 1 (padding if odd number of pages, but more than 1 page)
     or 2 (padding if odd number of pages).
     """
-    pdf = Pdf.new()
+    pdf = pikepdf.Pdf.new()
     for ifile in ifile_list:
-        src = Pdf.open(ifile)
+        src = pikepdf.Pdf.open(ifile)
         pdf.pages.extend(src.pages)
         if pad2sided and (len(src.pages) & 1):
             if pad2sided != 1 or len(src.pages) > 1:
-                page = Page(src.pages[0])
+                page = pikepdf.Page(src.pages[0])
                 w = page.trimbox[2]
                 h = page.trimbox[3]
                 pdf.add_blank_page(page_size=(w, h))
@@ -88,11 +90,15 @@ def merge_pdf(ifile_list: list[str], pad2sided: int=0) -> bytes:
     return bstream.getvalue()
 
 
-def libre_office(odt_list, pdf_dir, show_output=False):
+def libre_office(odt_list, pdf_dir, show_output=False, profile=None):
     """Convert a list of odt-files to pdf-files.
     The input files are provided as a list of absolute paths,
     <pdf_dir> is the absolute path to the output folder.
     If <show_output> is true, LibreOffice output will be displayed.
+    <profile> is an optional (absolute) path to a folder for the
+    LibreOffice user profile. Instances of LibreOffice which run at the
+    same time must each have their own profile folder, otherwise the
+    later ones just pass their work to the first one.
     """
     # Use LibreOffice to convert the odt-files to pdf-files.
     # If using the appimage, the paths MUST be absolute, so I use absolute
@@ -108,8 +114,15 @@ def libre_office(odt_list, pdf_dir, show_output=False):
         if show_output:
             REPORT("OUT", line)
 
+    if profile:
+        options = (
+            "-env:UserInstallation=" + pathlib.Path(profile).as_uri(),
+        )
+    else:
+        options = ()
     rc, msg = run_extern(
         CONFIG["LIBREOFFICE"],
+        *options,
         "--headless",
         "--convert-to",
         "pdf",
@@ -161,11 +174,19 @@ class Template:
 
     def user_info(self):
         """Return "custom" metadata from the template."""
-        return Metadata(self.template_path).user_meta()
+        return OdtTemplate.get(self.template_path).user_meta()
 
     def metadata(self):
-        """Return "normal" metadata from the template."""
-        md = Metadata(self.template_path).doc_meta()
+        """Return "normal" metadata from the template.
+        The result is cached with the template data (see
+        <simpleodt.OdtTemplate>), so it should not be modified.
+        """
+        odt = OdtTemplate.get(self.template_path)
+        try:
+            return odt.cache["METADATA"]
+        except KeyError:
+            pass
+        md = odt.doc_meta().copy()
         _fi = md.pop("description", None)
         if _fi:
             try:
@@ -177,6 +198,7 @@ class Template:
                         error=str(e), path=self.template_path
                     ),
                 )
+        odt.cache["METADATA"] = md
         return md
 
     def make_pdfs(
@@ -194,12 +216,25 @@ class Template:
             1: file creation (odt, pdf) messages
             2: as 1, but also LibreOffice output (via "OUT")
         """
+        odt_list = self.make_odts(data_list, save_dir, show_run_messages)
+        return convert_odts(odt_list, save_dir, show_run_messages)
+
+    def make_odts(
+        self,
+        data_list: list[dict],
+        save_dir: str,
+        show_run_messages: int=0
+    ) -> list[str]:
+        """The first stage of <make_pdfs>: from each entry in the
+        supplied list of data mappings produce an odt-file in the
+        subdirectory "odt" of <save_dir>.
+        Return a list of the (absolute) odt-file paths.
+        """
         # "Intermediate" files (odt) are in the subdirectory "odt".
         odt_dir = os.path.join(save_dir, "odt")
         if not os.path.isdir(odt_dir):
             os.makedirs(odt_dir)
         odt_list = []
-        pdf_list = []
         for datamap in data_list:
             outfile = os.path.join(odt_dir, datamap["SORT_NAME"] + ".odt")
             # Force removal of comment-metadata
@@ -210,22 +245,7 @@ class Template:
             odt_list.append(outfile)
             if show_run_messages > 0:
                 REPORT("INFO", T["ODT_FILE"].format(path=outfile))
-            pdf_list.append(datamap["SORT_NAME"] + ".pdf")
-        libre_office(
-            odt_list,
-            save_dir,
-            show_output=(show_run_messages > 1)
-        )
-        pdfs = []
-        for pf in pdf_list:
-            path = os.path.join(save_dir, pf)
-            if os.path.isfile(path):
-                pdfs.append(pf)
-                if show_run_messages > 0:
-                    REPORT("INFO", T["PDF_FILE"].format(path=path))
-            else:
-                REPORT("ERROR", T["MISSING_PDF"].format(fpath=path))
-        return pdfs
+        return odt_list
 
     def make_doc(self, datamap):
         """From the supplied data mapping produce a text document (odt)
@@ -257,6 +277,42 @@ class Template:
         return odtBytes
 
 
+def convert_odts(
+    odt_list: list[str],
+    save_dir: str,
+    show_run_messages: int=0
+) -> list[str]:
+    """The second stage of <Template.make_pdfs>: convert the odt-files
+    to pdf-files in the directory <save_dir>.
+    Return a list of the pdf-file names.
+    """
+    libre_office(
+        odt_list,
+        save_dir,
+        show_output=(show_run_messages > 1)
+    )
+    pdfs = []
+    for pf in pdf_names(odt_list):
+        path = os.path.join(save_dir, pf)
+        if os.path.isfile(path):
+            pdfs.append(pf)
+            if show_run_messages > 0:
+                REPORT("INFO", T["PDF_FILE"].format(path=path))
+        else:
+            REPORT("ERROR", T["MISSING_PDF"].format(fpath=path))
+    return pdfs
+
+
+def pdf_names(odt_list: list[str]) -> list[str]:
+    """Return the names of the pdf-files which LibreOffice makes from
+    the given odt-files.
+    """
+    return [
+        os.path.basename(odt).rsplit(".", 1)[0] + ".pdf"
+        for odt in odt_list
+    ]
+
+
 #################### below here: deprecated? ####################
 
 def clean_dir(dpath, remove=False):
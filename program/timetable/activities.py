@@ -1,7 +1,7 @@
 """
 timetable/activities.py
 
-Last updated:  2022-08-27
+Last updated:  2026-10-19
 
 Collect information on "activities" – from the BLOCKS and COURSES db tables.
 
@@ -28,9 +28,9 @@ T = TRANSLATIONS("timetable.activities")
 
 ### +++++
 
-from typing import NamedTuple
+from typing import NamedTuple, Optional
 
-from core.db_access import db_read_fields
+from core.db_access import db_read_fields, db_read_table
 from core.basic_data import (
     get_classes,
     get_rooms,
@@ -40,6 +40,7 @@ from core.basic_data import (
     BlockTag,
     PaymentData,
 )
+from timetable.room_allocation import roomlists_feasible
 
 ### -----
 
@@ -110,6 +111,81 @@ def lesson_rooms(room: str, course: CourseData, lesson_id: int) -> list[str]:
     return rlist
 
 
+COURSE_FIELDS = ("course", "CLASS", "GRP", "SUBJECT", "TEACHER")
+BLOCK_FIELDS = ("id", "course", "PAYMENT", "ROOM", "LESSON_TAG", "NOTES")
+
+
+def make_course_data(klass, group, sid, tid) -> Optional[CourseData]:
+    """Check the fields of a COURSES record and return a <CourseData>
+    instance. If there is an error, report it and return <None>.
+    """
+    # CLASS, SUBJECT and TEACHER are foreign keys and should be
+    # automatically bound to appropriate entries in the database.
+    # GRP should be checked here ...
+    if klass == "--":
+        if group:
+            REPORT(
+                "ERROR",
+                T["NULL_CLASS_GROUP"].format(group=group, sid=sid, tid=tid),
+            )
+            return None
+    elif not check_group(klass, group):
+        REPORT(
+            "ERROR",
+            T["UNKNOWN_GROUP"].format(
+                klass=klass, group=group, sid=sid, tid=tid
+            ),
+        )
+        return None
+    coursedata = CourseData(klass=klass, group=group, sid=sid, tid=tid)
+    if not tid:
+        raise Bug(f"Empty teacher field in {coursedata}")
+    return coursedata
+
+
+def tag_entries(tag: str) -> list[BlockInfo]:
+    """Read the BLOCKS entries with the given lesson-tag (and their
+    courses) from the database. This allows the information for a
+    single block to be refreshed without rereading the whole of the
+    COURSES and BLOCKS tables (cf. <Courses>).
+    """
+    entries = []
+    course2data = {}
+    for id, course, payment, room, tag_, notes in db_read_table(
+        "BLOCKS", BLOCK_FIELDS, LESSON_TAG=tag
+    )[1]:
+        try:
+            coursedata = course2data[course]
+        except KeyError:
+            flist, rlist = db_read_table(
+                "COURSES", COURSE_FIELDS[1:], course=course
+            )
+            if not rlist:
+                REPORT(
+                    "ERROR",
+                    f"[tag_entries: Unknown course in BLOCKS table: {course}]"
+                )
+                continue
+            coursedata = make_course_data(*rlist[0])
+            course2data[course] = coursedata
+        if not coursedata:
+            continue
+        try:
+            payment_data = read_payment(payment)
+            blocktag = read_block_tag(tag)
+        except ValueError as e:
+            REPORT(
+                "ERROR",
+                T["LESSON_ERROR"].format(id=id, course=coursedata, e=e),
+            )
+            continue
+        roomlist = lesson_rooms(room, coursedata, id)
+        entries.append(
+            BlockInfo(coursedata, blocktag, roomlist, payment_data, notes)
+        )
+    return entries
+
+
 class Courses:
     __slots__ = (
         # "paydata",
@@ -123,34 +199,11 @@ class Courses:
         ### First read the COURSES table.
         course2data = {}
         for course, klass, group, sid, tid in db_read_fields(
-            "COURSES", ("course", "CLASS", "GRP", "SUBJECT", "TEACHER")
+            "COURSES", COURSE_FIELDS
         ):
-            # CLASS, SUBJECT and TEACHER are foreign keys and should be
-            # automatically bound to appropriate entries in the database.
-            # GRP should be checked here ...
-            if klass == "--":
-                if group:
-                    REPORT(
-                        "ERROR",
-                        T["NULL_CLASS_GROUP"].format(
-                            group=group, sid=sid, tid=tid
-                        ),
-                    )
-                    continue
-            elif not check_group(klass, group):
-                REPORT(
-                    "ERROR",
-                    T["UNKNOWN_GROUP"].format(
-                        klass=klass, group=group, sid=sid, tid=tid
-                    ),
-                )
-                continue
-
-            course2data[course] = CourseData(
-                klass=klass, group=group, sid=sid, tid=tid
-            )
-            if not tid:
-                raise Bug(f"Empty teacher field in {course2data[course]}")
+            coursedata = make_course_data(klass, group, sid, tid)
+            if coursedata:
+                course2data[course] = coursedata
 
         ### Now read the BLOCKS table.
 
@@ -168,8 +221,7 @@ class Courses:
         paycourses = set()
         # The "id" field is read only for error reports
         for id, course, payment, room, tag, notes in db_read_fields(
-            "BLOCKS",
-            ("id", "course", "PAYMENT", "ROOM", "LESSON_TAG", "NOTES"),
+            "BLOCKS", BLOCK_FIELDS
         ):
             try:
                 coursedata = course2data[course]
@@ -307,4 +359,8 @@ def filter_roomlists(roomlists: list[list[str]]) -> list[list[str]]:
             singles.update(singles1)
             roomlists = roomlists1
             continue
+        # The remaining choices may still be in conflict with each other
+        # (e.g. three lists choosing from the same two rooms).
+        if not roomlists_feasible(roomlists1):
+            raise ValueError
         return [[s] for s in sorted(singles)] + extra + roomlists1
@@ -0,0 +1,335 @@
+"""
+timetable/activity_model.py
+
+Last updated:  2026-10-19
+
+A persistent model of the timetable "activities" (one for each lesson
+block-tag) with indexes for classes and teachers. It is built once and
+afterwards only the entries for changed block-tags are reread from the
+database.
+
+=+LICENCE=============================
+Copyright 2026 Michael Towers
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+=-LICENCE========================================
+"""
+
+###############################################################
+
+T = TRANSLATIONS("ui.modules.timetable_editor")
+
+### +++++
+
+from typing import NamedTuple, Optional
+
+from core.db_access import db_read_table
+from core.basic_data import (
+    get_classes,
+    get_subjects,
+    get_sublessons,
+    Sublesson,
+)
+from core.classes import class_divisions, ChipData
+from timetable.activities import (
+    Courses,
+    BlockInfo,
+    filter_roomlists,
+    tag_entries,
+)
+
+### -----
+
+
+class Activity(NamedTuple):
+    sid: str
+    subject: str
+    tag: str
+    classgroups: list[tuple[str,set[str],set[str]]]
+    roomlists: list[list[str]]
+    alltids: set[str]
+
+    def __str__(self):
+        rooms = []
+        for rl in self.roomlists:
+            rooms.append('|'.join(rl))
+        cg = [
+            f"{k}:{','.join(gs)}/{','.join(gr) or '-'}"
+            for k, gs, gr in self.classgroups
+        ]
+        return (
+            f"<Activity {self.tag}: {self.sid} ({self.subject})"
+            f" {'|'.join(sorted(cg))}"
+            f" // {','.join(sorted(self.alltids))}"
+            f" [{'&'.join(rooms)}]>"
+        )
+
+
+class ClassActivity(NamedTuple):
+    """The parts of an activity relevant to the display of one class."""
+    tag: str
+    sid: str
+    subject: str
+    tids: list[str]         # teachers for just this class
+    groups: list[str]       # groups for just this class
+    chipdata: ChipData      # tile size and offset
+
+
+def make_activity(tag: str, infolist: list[BlockInfo]) -> Activity:
+    """Collect the information for the activity with the given block-tag
+    from its list of <BlockInfo> entries.
+    """
+    classes = get_classes()
+    info_ = infolist[0]
+    sid = info_.block.sid or info_.course.sid
+    name = get_subjects().map(sid)
+    a_classes = {}      # {class: {group, ...}} for the activity
+    alltids = set()     # tids for the activity as a whole
+    allroomlists = []   # rooms for the activity as a whole
+    for info_ in infolist:
+        tid_ = info_.course.tid
+        if tid_ != "--":
+            alltids.add(tid_)
+        klass = info_.course.klass
+        group = info_.course.group
+
+        # Everything in this list should be related to some
+        # timetabled activity.
+        # The class can be '--', the group can be empty.
+        # Group '*' means "whole class".
+        # If class is '--', group must be empty (but that may
+        # have been checked earlier).
+
+        if group and klass != "--":
+            if group == '*':
+                a_classes[klass] = None
+            else:
+                try:
+                    a_classes[klass].add(group)
+                except KeyError:
+                    # no entry for class yet
+                    a_classes[klass] = {group}
+                except AttributeError:
+                    # whole class already entered
+                    pass
+        if info_.rooms:
+            allroomlists.append(info_.rooms)
+    class_groups = []
+    for k in sorted(a_classes):
+        gset = a_classes[k]
+        if gset:
+            ginfo = classes.group_info(k)
+            chipdata = class_divisions(
+                gset,
+                ginfo["GROUP_MAP"],
+                ginfo["INDEPENDENT_DIVISIONS"]
+            )
+            class_groups.append(
+                (k, chipdata.basic_groups, chipdata.rest_groups)
+            )
+        else:
+            class_groups.append((k, {'*'}, set()))
+    try:
+        room_lists = filter_roomlists(allroomlists)
+    except ValueError:
+        SHOW_ERROR(
+            T["BLOCK_ROOM_CONFLICT"].format(
+                klass=klass,
+                sid=sid,
+                tag=tag,
+                rooms=repr(allroomlists),
+            ),
+        )
+        room_lists = [['+']]
+    return Activity(
+        sid=sid,
+        subject=name,
+        tag=tag,
+        classgroups=class_groups,
+        roomlists=room_lists,
+        alltids=alltids,
+    )
+
+
+def make_class_activity(
+    klass: str, activity: Activity, infolist: list[BlockInfo]
+) -> ClassActivity:
+    """Build the class-specific view of the given activity."""
+    tids_ = set()       # tids for just this class
+    groups_ = set()     # groups for just this class
+    for info_ in infolist:
+        if info_.course.klass != klass:
+            continue
+        tid_ = info_.course.tid
+        if tid_ != "--":
+            tids_.add(tid_)
+        if info_.course.group:
+            groups_.add(info_.course.group)
+    group_info = get_classes().group_info(klass)
+    chipdata = class_divisions(
+        groups_,
+        group_info["GROUP_MAP"],
+        group_info["INDEPENDENT_DIVISIONS"]
+    )
+    return ClassActivity(
+        tag=activity.tag,
+        sid=activity.sid,
+        subject=activity.subject,
+        tids=sorted(tids_),
+        groups=sorted(groups_),
+        chipdata=chipdata,
+    )
+
+
+class ActivityModel:
+    """The activities are held in a list, so that they can be referred
+    to by index. When an activity is removed, its entry is set to
+    <None>, so that the indexes of the others remain valid.
+    """
+    def __init__(self):
+        self.activity_list: list[Optional[Activity]] = []
+        self.tag2activity_index: dict[str, int] = {}
+        # {block-tag -> [BlockInfo, ... ]}
+        self.tag2entries: dict[str, list[BlockInfo]] = {}
+        # {block-tag -> [Sublesson, ... ]}
+        self.tag2lessons: dict[str, list[Sublesson]] = {}
+        # {class -> {block-tag, ... }}
+        self.klass2tags: dict[str, set[str]] = {}
+        # {tid -> {block-tag, ... }}
+        self.tid2tags: dict[str, set[str]] = {}
+        # Cache for the class views: {class -> [ClassActivity, ... ]}
+        self.class_views: dict[str, list[ClassActivity]] = {}
+        courses = Courses()
+        tag2lessons = get_sublessons()
+        for tag, infolist in courses.tag2entries.items():
+            self.__set_tag(tag, infolist, tag2lessons.get(tag) or [])
+
+    def __set_tag(self, tag, infolist, lessons):
+        """Enter the data for the given block-tag into the model and
+        the indexes. Any existing entry for the tag must have been
+        removed beforehand.
+        """
+        activity = make_activity(tag, infolist)
+        try:
+            ix = self.tag2activity_index[tag]
+        except KeyError:
+            ix = len(self.activity_list)
+            self.activity_list.append(activity)
+            self.tag2activity_index[tag] = ix
+        else:
+            self.activity_list[ix] = activity
+        self.tag2entries[tag] = infolist
+        self.tag2lessons[tag] = lessons
+        for info_ in infolist:
+            klass = info_.course.klass
+            try:
+                self.klass2tags[klass].add(tag)
+            except KeyError:
+                self.klass2tags[klass] = {tag}
+            self.class_views.pop(klass, None)
+            tid = info_.course.tid
+            try:
+                self.tid2tags[tid].add(tag)
+            except KeyError:
+                self.tid2tags[tid] = {tag}
+
+    def __remove_tag(self, tag):
+        """Remove the given block-tag from the indexes. Its activity
+        entry is set to <None>.
+        """
+        for info_ in self.tag2entries.pop(tag, None) or []:
+            klass = info_.course.klass
+            self.klass2tags[klass].discard(tag)
+            self.class_views.pop(klass, None)
+            self.tid2tags[info_.course.tid].discard(tag)
+        self.tag2lessons.pop(tag, None)
+        try:
+            self.activity_list[self.tag2activity_index[tag]] = None
+        except KeyError:
+            pass
+
+    def update_tags(self, tags) -> set[str]:
+        """Reread the entries for the given block-tags from the database.
+        Return the set of tags whose activity indexes are affected.
+        """
+        changed = set()
+        for tag in tags:
+            if not tag:
+                continue
+            self.__remove_tag(tag)
+            infolist = tag_entries(tag)
+            if infolist:
+                lessons = [
+                    Sublesson(*row)
+                    for row in db_read_table(
+                        "LESSONS", Sublesson._fields, TAG=tag
+                    )[1]
+                ]
+                self.__set_tag(tag, infolist, lessons)
+            if tag in self.tag2activity_index:
+                changed.add(tag)
+        return changed
+
+    def activity(self, tag: str) -> Optional[Activity]:
+        return self.activity_list[self.tag2activity_index[tag]]
+
+    def class_activities(self, klass: str) -> list[ClassActivity]:
+        """Return the (cached) activities of the given class, sorted
+        by subject name.
+        """
+        try:
+            return self.class_views[klass]
+        except KeyError:
+            pass
+        alist = [
+            make_class_activity(
+                klass, self.activity(tag), self.tag2entries[tag]
+            )
+            for tag in self.klass2tags.get(klass) or ()
+        ]
+        alist.sort(key=lambda a: (a.subject, a.tag))
+        self.class_views[klass] = alist
+        return alist
+
+    def teacher_tags(self, tid: str) -> set[str]:
+        return self.tid2tags.get(tid) or set()
+
+
+### Management of the shared model
+
+__MODEL = None
+__CHANGED_TAGS = set()
+
+
+def tags_changed(*tags: str):
+    """Call this after changes to the COURSES, BLOCKS or LESSONS table
+    affecting the given block-tags. The model is then updated when it
+    is next fetched by <get_activity_model>.
+    """
+    __CHANGED_TAGS.update(tags)
+
+
+def get_activity_model() -> tuple[ActivityModel, set[str]]:
+    """Return the shared <ActivityModel> instance, building it if
+    necessary. Pending changes (see <tags_changed>) are applied first.
+    Also return the set of block-tags whose activities have changed
+    since the last call.
+    """
+    global __MODEL
+    if __MODEL is None:
+        __MODEL = ActivityModel()
+        __CHANGED_TAGS.clear()
+        return __MODEL, set()
+    changed = __MODEL.update_tags(__CHANGED_TAGS)
+    __CHANGED_TAGS.clear()
+    return __MODEL, changed
@@ -0,0 +1,406 @@
+"""
+timetable/feasibility.py
+
+Last updated:  2026-10-19
+
+A quick analysis of the timetable data before a (possibly very long)
+run of the timetable generator. Simple lower bounds are calculated for
+the resources – teachers, atomic pupil groups, rooms, days – and
+compared with what is available. The result is a list of "bottlenecks",
+ranked by load (demand / capacity). A load greater than 1 means that
+the data cannot be solved.
+
+The analysis uses the structures built by
+<fet_data.TimetableCourses.read_lessons>, so it must be called after
+that method and before any lunch-break activities are added.
+
+=+LICENCE=============================
+Copyright 2026 Michael Towers
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+=-LICENCE========================================
+"""
+
+###############################################################
+
+import sys, os
+
+if __name__ == "__main__":
+    # Enable package import if running as module
+    this = sys.path[0]
+    appdir = os.path.dirname(this)
+    sys.path[0] = appdir
+    basedir = os.path.dirname(appdir)
+    from core.base import start
+
+    start.setup(os.path.join(basedir, "DATA-2023"))
+
+T = TRANSLATIONS("timetable.feasibility")
+
+### +++++
+
+from time import perf_counter
+from typing import NamedTuple
+
+from core.base import class_group_split
+from core.basic_data import get_days, get_periods, get_classes, get_teachers
+from timetable.occupancy import available_periods
+from timetable.room_allocation import match_rooms
+
+### -----
+
+
+class Bottleneck(NamedTuple):
+    load: float     # demand / capacity, infinite if there is no capacity
+    kind: str       # the type of check, also the message key
+    item: str       # the resource or activities concerned
+    demand: int
+    capacity: int
+
+    def __str__(self):
+        return T[self.kind].format(
+            item=self.item, demand=self.demand, capacity=self.capacity
+        )
+
+
+def bottleneck(kind: str, item: str, demand: int, capacity: int
+) -> Bottleneck:
+    load = demand / capacity if capacity > 0 else float("inf")
+    return Bottleneck(load, kind, item, demand, capacity)
+
+
+def as_list(value) -> list[str]:
+    """The "Teacher" and "Students" fields of a fet activity can be a
+    single value or a list.
+    """
+    if not value:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def resource_capacity(flags: list[str], nperiods: int) -> int:
+    """Return the number of periods available for lessons, given the
+    availability flags (see <occupancy.available_periods>). On a day
+    with possible lunch-break periods ('*') one of these is needed for
+    the break.
+    """
+    n = 0
+    for d in range(0, len(flags), nperiods):
+        day = flags[d:d + nperiods]
+        n += nperiods - day.count("-")
+        if "*" in day:
+            n -= 1
+    return n
+
+
+def max_free_run(flagslist: list[list[str]], ndays: int, nperiods: int
+) -> int:
+    """Return the length of the longest block of periods within a day
+    in which none of the given resources is "not available".
+    """
+    maxrun = 0
+    for d in range(ndays):
+        run = 0
+        for i in range(d * nperiods, (d + 1) * nperiods):
+            if any(flags[i] == "-" for flags in flagslist):
+                run = 0
+            else:
+                run += 1
+                if run > maxrun:
+                    maxrun = run
+    return maxrun
+
+
+def shared_resources(aids: list[str], aid_data: dict
+) -> dict[tuple[str, ...], list[str]]:
+    """Find the teachers and atomic groups which are needed by more than
+    one of the given activities (which take place at the same time).
+    Return a mapping {(activity-id, ... ) -> [resource, ... ]}.
+    """
+    users = {}
+    for aid in aids:
+        length, tids, groups = aid_data[aid]
+        for r in tids:
+            users.setdefault(r, []).append(aid)
+        for klass, a in groups:
+            users.setdefault(f"{klass}.{a}" if a else klass, []).append(aid)
+    shared = {}
+    for r, raids in sorted(users.items()):
+        if len(raids) > 1:
+            shared.setdefault(tuple(raids), []).append(r)
+    return shared
+
+
+def analyse_feasibility(courses) -> list[Bottleneck]:
+    """Check the activities of the given <TimetableCourses> instance
+    against the available resources.
+    Return a list of <Bottleneck> items, the worst first.
+    """
+    days = get_days()
+    periods = get_periods()
+    ndays, nperiods = len(days), len(periods)
+    nslots = ndays * nperiods
+    # The lunch-break "subject", see <fet_data>
+    lb_sid = TRANSLATIONS("timetable.fet_data")["LUNCH_BREAK"].split(":", 1)[0]
+    bottlenecks = []
+
+    ### Availability of the resources: {resource -> flags}
+    availability = {}
+    teachers = get_teachers()
+    classes = get_classes()
+
+    def teacher_flags(tid):
+        try:
+            return availability[tid]
+        except KeyError:
+            flags = available_periods(teachers[tid].tt_data, ndays, nperiods)
+            availability[tid] = flags
+            return flags
+
+    def class_flags(klass):
+        key = ("C", klass)
+        try:
+            return availability[key]
+        except KeyError:
+            flags = available_periods(classes[klass].tt_data, ndays, nperiods)
+            availability[key] = flags
+            return flags
+
+    ### Resources and lengths of the activities
+    # {activity-id -> (length, {tid, ... }, {(class, atomic group), ... })}
+    aid_data = {}
+    # {tid -> periods}, {(class, atomic group) -> periods}
+    tid_demand = {}
+    group_demand = {}
+    # {(tids, classes) -> longest block of periods available to all}
+    maxruns = {}
+    for activity in courses.activities:
+        if activity["Subject"] == lb_sid:
+            continue
+        aid = activity["Id"]
+        length = int(activity["Duration"])
+        tids = set(as_list(activity.get("Teacher")))
+        groups = set()
+        for group in as_list(activity.get("Students")):
+            klass, g = class_group_split(group)
+            for a in courses.group2atoms[klass][g] or [""]:
+                groups.add((klass, a))
+        aid_data[aid] = (length, tids, groups)
+        for tid in tids:
+            tid_demand[tid] = tid_demand.get(tid, 0) + length
+        for kg in groups:
+            group_demand[kg] = group_demand.get(kg, 0) + length
+
+        ## Multi-period lessons must fit in a day, in a block of periods
+        ## in which all the resources are available
+        if length > 1:
+            key = (frozenset(tids), frozenset(k for k, a in groups))
+            try:
+                maxrun = maxruns[key]
+            except KeyError:
+                maxrun = max_free_run(
+                    [teacher_flags(tid) for tid in key[0]]
+                    + [class_flags(k) for k in key[1]],
+                    ndays,
+                    nperiods,
+                )
+                maxruns[key] = maxrun
+            bottlenecks.append(bottleneck(
+                "LESSON_LENGTH",
+                f"{activity['Subject']} ({aid}, {activity['Comments']})",
+                length,
+                maxrun,
+            ))
+
+    ### Teachers: demanded periods against available periods
+    for tid, n in tid_demand.items():
+        bottlenecks.append(bottleneck(
+            "TEACHER_PERIODS",
+            tid,
+            n,
+            resource_capacity(teacher_flags(tid), nperiods),
+        ))
+
+    ### Atomic groups: demanded periods against available periods
+    for kg, n in group_demand.items():
+        klass, a = kg
+        bottlenecks.append(bottleneck(
+            "GROUP_PERIODS",
+            f"{klass}.{a}" if a else klass,
+            n,
+            resource_capacity(class_flags(klass), nperiods),
+        ))
+
+    ### Rooms: for each set of rooms, the requirements which can only be
+    ### satisfied from this set against its total capacity (a necessary
+    ### condition for a complete matching, see Hall's theorem)
+    # {frozenset of rooms -> periods}
+    room_demand = {}
+    for aid, roomlists in courses.activity_roomlists.items():
+        try:
+            length = aid_data[aid][0]
+        except KeyError:
+            continue
+        for rl in roomlists:
+            rs = frozenset(rl)
+            room_demand[rs] = room_demand.get(rs, 0) + length
+    for rs in room_demand:
+        n = sum(v for s, v in room_demand.items() if s <= rs)
+        bottlenecks.append(bottleneck(
+            "ROOM_PERIODS",
+            ",".join(sorted(rs)),
+            n,
+            len(rs) * nslots,
+        ))
+
+    ### Lessons with fixed times
+    # {slot-index -> [activity-id, ... ]}, for all periods of the lessons
+    slot_aids = {}
+    for aid, dp in courses.locked_aids.items():
+        try:
+            length, tids, groups = aid_data[aid]
+        except KeyError:
+            continue
+        d, p = days.index(dp[0]), periods.index(dp[1])
+        if p + length > nperiods:
+            bottlenecks.append(bottleneck(
+                "LOCKED_DAY_END", f"{aid} ({'.'.join(dp)})", length,
+                nperiods - p
+            ))
+        s = d * nperiods + p
+        for i in range(s, min(s + length, (d + 1) * nperiods)):
+            try:
+                slot_aids[i].append(aid)
+            except KeyError:
+                slot_aids[i] = [aid]
+            if any(teacher_flags(tid)[i] == "-" for tid in tids) or any(
+                class_flags(k)[i] == "-" for k, a in groups
+            ):
+                bottlenecks.append(bottleneck(
+                    "LOCKED_BLOCKED", f"{aid} ({'.'.join(dp)})", 1, 0
+                ))
+    for i, aids in sorted(slot_aids.items()):
+        if len(aids) < 2:
+            continue
+        d, p = divmod(i, nperiods)
+        slot = f"{days[d][0]}.{periods[p][0]}"
+        # Teachers and groups
+        for raids, rnames in shared_resources(aids, aid_data).items():
+            bottlenecks.append(bottleneck(
+                "LOCKED_CLASH",
+                f"{slot}: {','.join(raids)} ({','.join(rnames)})",
+                len(raids),
+                1,
+            ))
+        # Rooms
+        demands = []
+        for aid in aids:
+            demands += courses.activity_roomlists.get(aid) or []
+        n = match_rooms(demands).count(None)
+        if n:
+            bottlenecks.append(bottleneck(
+                "LOCKED_ROOMS",
+                f"{slot}: {','.join(aids)}",
+                len(demands),
+                len(demands) - n,
+            ))
+
+    ### Activities which must start at the same time
+    for ptag, aids in courses.parallel_tags.items():
+        aids = [aid for aid in aids if aid in aid_data]
+        for raids, rnames in shared_resources(aids, aid_data).items():
+            bottlenecks.append(bottleneck(
+                "PARALLEL_CLASH",
+                f"{ptag}: {','.join(raids)} ({','.join(rnames)})",
+                len(raids),
+                1,
+            ))
+
+    ### Lessons of a subject which must be on different days
+    ### (see <TimetableCourses.constraint_day_separation>)
+    for klass, sid2ag2aids in courses.class2sid2ag2aids.items():
+        flags = class_flags(klass)
+        class_days = sum(
+            1 for d in range(0, nslots, nperiods)
+            if "+" in flags[d:d + nperiods] or "*" in flags[d:d + nperiods]
+        )
+        for sid, ag2aids in sid2ag2aids.items():
+            for ag, aids in ag2aids.items():
+                if len(aids) < 2:
+                    continue
+                bottlenecks.append(bottleneck(
+                    "DAY_SEPARATION",
+                    f"{ag}: {sid}",
+                    len(aids),
+                    class_days,
+                ))
+                locked_days = {}
+                for aid in aids:
+                    try:
+                        dp = courses.locked_aids[aid]
+                    except KeyError:
+                        continue
+                    try:
+                        locked_days[dp[0]].append(aid)
+                    except KeyError:
+                        locked_days[dp[0]] = [aid]
+                for d, laids in locked_days.items():
+                    if len(laids) > 1:
+                        bottlenecks.append(bottleneck(
+                            "DAY_SEPARATION_LOCKED",
+                            f"{ag}: {sid} ({d}: {','.join(laids)})",
+                            len(laids),
+                            1,
+                        ))
+    bottlenecks.sort(reverse=True)
+    return bottlenecks
+
+
+def print_bottlenecks(
+    bottlenecks: list[Bottleneck], threshold: float = 0.9, limit: int = 30
+):
+    """Print the bottlenecks with a load of at least <threshold>, the
+    worst first. At most <limit> entries are shown, but all those which
+    make the data unsolvable are counted.
+    """
+    print(f"\n{T['BOTTLENECKS']}")
+    n = 0
+    for b in bottlenecks:
+        if b.load < threshold:
+            break
+        if n < limit:
+            flag = "!!" if b.load > 1.0 else "  "
+            print(f" {flag} {b.load:6.2f}  {b}")
+        n += 1
+    if n > limit:
+        print(f"    ... ({n - limit})")
+    nbad = sum(1 for b in bottlenecks if b.load > 1.0)
+    print(T["UNSOLVABLE" if nbad else "NO_OBSTACLES"].format(n=nbad))
+
+
+# --#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
+
+if __name__ == "__main__":
+    from core.db_access import open_database
+    from timetable.fet_data import get_classes_fet, TimetableCourses
+
+    open_database()
+    courses = TimetableCourses()
+    courses.read_lessons(get_classes_fet())
+    t0 = perf_counter()
+    _bottlenecks = analyse_feasibility(courses)
+    t1 = perf_counter()
+    print_bottlenecks(_bottlenecks)
+    print(f"\n  ({(t1 - t0) * 1000:.1f} ms)")
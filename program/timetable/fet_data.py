@@ -56,9 +56,7 @@ Tc = TRANSLATIONS("ui.modules.classes")
 
 from itertools import product
 
-import xmltodict
-
-from core.base import class_group_split
+from core.base import class_group_split, lazy_import
 from core.basic_data import (
     get_days,
     get_periods,
@@ -71,9 +69,11 @@ from core.basic_data import (
     timeslot2index,
 )
 from core.classes import atomic_maps, atoms2groups
-from core.db_access import db_backup, db_update_fields
+from core.db_access import db_backup, db_update_rows
 from timetable.activities import Courses
+from timetable.fet_read_results import read_activities_timetable
 
+xmltodict = lazy_import("xmltodict")
 
 ### -----
 
@@ -265,6 +265,7 @@ class TimetableCourses(Courses):
         "space_constraints",
         "class2sid2ag2aids",
         "fancy_rooms",
+        "activity_roomlists",
     )
 
     def __init__(self):
@@ -286,6 +287,9 @@ class TimetableCourses(Courses):
         self.parallel_tags: dict[str, list[str]] = {}
         # Collect more complex room allocations
         self.fancy_rooms = []
+        # The (simplified) room requirements of each activity, without
+        # the open choices: {activity-id -> [[room, ... ], ... ]}
+        self.activity_roomlists: dict[str, list[list[str]]] = {}
 
         self.time_constraints = {}
         self.space_constraints = {}
@@ -458,6 +462,7 @@ class TimetableCourses(Courses):
                     activity["Duration"] = dstr
                     activity["Comments"] = str(sl.id)
                     self.add_placement(id_str, sl, rooms)
+                    self.activity_roomlists[id_str] = roomlists1
                     self.activities.append(activity)
                     # print("$$$$$", sid, groups, id_str)
                     self.subject_group_activity(sid, groups, id_str)
@@ -1355,16 +1360,14 @@ class TimetableCourses(Courses):
         """Get the preset placements from a fet "activities" file (passed
         as a file path) generated by a successful run of fet.
         The "locked" status is obtained from the original data.
+        The file is streamed and all placements are written to the
+        database in a single transaction. Non-placed activities are also
+        written (with "None" as day and hour).
         """
-        # Get the placement data
-        with open(xmlfile, "rb") as fh:
-            xml = fh.read()
-        pos_data = xmltodict.parse(xml)
-        pos_list = pos_data["Activities_Timetable"]["Activity"]
-        aid_data = {}
-        db_backup()
-        for p in pos_list:
-            aid = p["Id"]
+        updates = []
+        for aid, day, hour, rooms in read_activities_timetable(
+            xmlfile, unplaced=True
+        ):
             try:
                 activity = self.activities[int(aid) - 1]
             except:
@@ -1374,19 +1377,16 @@ class TimetableCourses(Courses):
             lesson_id = activity["Comments"]
             if lesson_id:
                 if aid in self.locked_aids:
-                    ptime = f"{p['Day']}.{p['Hour']}"
+                    ptime = f"{day}.{hour}"
                 else:
-                    ptime = f"?{p['Day']}.{p['Hour']}"
+                    ptime = f"?{day}.{hour}"
                 field_values = [("TIME", ptime)]
-                room = p['Room']
-                if room:
-                    rlist = p.get('Real_Room')
-                    if rlist:
-                        field_values.append(("ROOMS", ','.join(rlist)))
-                    else:
-                        field_values.append(("ROOMS", room))
-                # print("§§§", lesson_id, field_values)
-                db_update_fields("LESSONS", field_values, id=int(lesson_id))
+                if rooms:
+                    field_values.append(("ROOMS", ",".join(rooms)))
+                updates.append((int(lesson_id), field_values))
+        # print("§§§", updates)
+        db_backup()
+        db_update_rows("LESSONS", "id", updates)
 
 
 # TODO --
@@ -1605,6 +1605,7 @@ def getActivities(working_folder):
 
 if __name__ == "__main__":
     from core.db_access import open_database
+    from timetable.feasibility import analyse_feasibility, print_bottlenecks
 
     open_database()
 
@@ -1649,6 +1650,9 @@ if __name__ == "__main__":
         print("\n ********** READ LESSON DATA **********\n")
     courses.read_lessons(fet_classes)
 
+    # Quick check for data which can't be solved
+    print_bottlenecks(analyse_feasibility(courses))
+
     # quit(0)
 
     fet_subjects = get_subjects_fet(courses.timetable_subjects)
@@ -44,13 +44,36 @@ from typing import Optional
 
 ### +++++
 
-import xmltodict
+from xml.etree.ElementTree import iterparse
 
-from core.db_access import db_backup, db_update_fields
+from core.base import lazy_import
+from core.db_access import db_backup, db_update_rows
 from ui.ui_base import QFileDialog
 
+xmltodict = lazy_import("xmltodict")
+
 ### -----
 
+def iter_xml_elements(xmlfile, tags):
+    """Stream the elements with the given tags from an xml file.
+    Each element is complete (with its children) when it is yielded,
+    but it is discarded afterwards, as are the other top-level
+    sections, so that the memory usage doesn't grow with the size of
+    the file.
+    """
+    depth = 0
+    for event, elem in iterparse(xmlfile, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            continue
+        depth -= 1
+        if elem.tag in tags:
+            yield elem
+            elem.clear()
+        elif depth <= 1:
+            elem.clear()
+
+
 def read_fet_file(xmlfile):
     """Read the fet file used to generate the timetable.
     Only the activities and their placements are read.
@@ -58,53 +81,66 @@ def read_fet_file(xmlfile):
     Return a mapping {activity-id -> lesson-id} and a set of "locked"
     activity-ids.
     """
-    with open(xmlfile, "rb") as fh:
-        xml = fh.read()
-    activity_data = xmltodict.parse(xml)["fet"]
-    activities = activity_data["Activities_List"]["Activity"]
     a2lid = {}
-    for activity in activities:
-        lid = activity["Comments"]
-        if lid:
-            a2lid[activity["Id"]] = lid
-    placements = activity_data["Time_Constraints_List"][
-        "ConstraintActivityPreferredStartingTime"
-    ]
     locked_set = set()
-    for placement in placements:
-        if placement["Permanently_Locked"] == "true":
-            locked_set.add(placement["Activity_Id"])
+    for elem in iter_xml_elements(
+        xmlfile, {"Activity", "ConstraintActivityPreferredStartingTime"}
+    ):
+        if elem.tag == "Activity":
+            lid = elem.findtext("Comments")
+            if lid:
+                a2lid[elem.findtext("Id")] = lid
+        elif elem.findtext("Permanently_Locked") == "true":
+            locked_set.add(elem.findtext("Activity_Id"))
     return a2lid, locked_set
 
 
+def read_activities_timetable(placement_file, unplaced=False):
+    """Stream the placements from a fet "activities" file (passed
+    as a file path) generated by a successful run of fet.
+    Yield (activity-id, day, hour, room-list) for each placed activity.
+    Non-placed activities have no day, they are skipped unless
+    <unplaced> is true, in which case they are yielded with <None> as
+    day and hour.
+    The room-list is empty if no room is allocated, otherwise it
+    contains the real rooms of a virtual room, or else the single room.
+    """
+    for elem in iter_xml_elements(placement_file, {"Activity"}):
+        day = elem.findtext("Day")
+        if not day:
+            if not unplaced:
+                continue
+            yield elem.findtext("Id"), None, None, []
+            continue
+        room = elem.findtext("Room")
+        if room:
+            rooms = [r.text for r in elem.iterfind("Real_Room")] or [room]
+        else:
+            rooms = []
+        yield elem.findtext("Id"), day, elem.findtext("Hour"), rooms
+
+
 def read_placements(fet_file, placement_file):
     """Get the preset placements from a fet "activities" file (passed
     as a file path) generated by a successful run of fet.
     The lesson identifiers and the "locked" status is obtained from the
     original data.
+    All placements are written to the database in a single transaction.
+    Return the number of updated lessons.
     """
     # Get the activity data
     activity2lesson, locked_activities = read_fet_file(fet_file)
     # Get the placement data
-    with open(placement_file, "rb") as fh:
-        xml = fh.read()
-    pos_data = xmltodict.parse(xml)
-    pos_list = pos_data["Activities_Timetable"]["Activity"]
-    for p in pos_list:
-        aid = p["Id"]
+    updates = []
+    for aid, day, hour, rooms in read_activities_timetable(placement_file):
         lesson_id = activity2lesson.get(aid)
-        if lesson_id and p['Day']:
-            # Non-placed activities have no day, they must be skipped.
-            field_values = [("PLACEMENT", f"{p['Day']}.{p['Hour']}")]
-            room = p['Room']
-            if room:
-                rlist = p.get('Real_Room')
-                if rlist:
-                    field_values.append(("ROOMS", ','.join(rlist)))
-                else:
-                    field_values.append(("ROOMS", room))
-            # print("§§§", lesson_id, field_values)
-            db_update_fields("LESSONS", field_values, id=int(lesson_id))
+        if lesson_id:
+            field_values = [("PLACEMENT", f"{day}.{hour}")]
+            if rooms:
+                field_values.append(("ROOMS", ",".join(rooms)))
+            updates.append((int(lesson_id), field_values))
+    # print("§§§", updates)
+    return db_update_rows("LESSONS", "id", updates)
 
 
 def getActivities(working_folder):
@@ -0,0 +1,336 @@
+"""
+timetable/occupancy.py
+
+Last updated:  2026-10-19
+
+An index of the resources (teachers, pupil groups, rooms) occupied in
+each time slot of the week. It is used by the timetable editor to find
+possible placements for a lesson.
+
+=+LICENCE=============================
+Copyright 2026 Michael Towers
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+=-LICENCE========================================
+"""
+
+###############################################################
+
+# Penalty weights for the "soft" constraints
+PENALTY_SAME_DAY = 10       # another lesson of the activity on the same day
+PENALTY_BREAK = 2           # a possible lunch-break period is used
+
+### +++++
+
+from typing import NamedTuple, Optional
+
+from core.basic_data import get_classes, get_teachers, timeslot2index
+from timetable.room_allocation import match_rooms
+
+### -----
+
+
+class SlotInfo(NamedTuple):
+    clashes: int    # number of other lessons which would have to move
+    blocked: bool   # a resource is "not available" in this slot
+    penalty: int    # weighted sum of soft-constraint violations
+
+
+def lesson_slot(sublesson) -> tuple[int, int]:
+    """Return the (day, period) indexes of the given <Sublesson>.
+    A fixed time (the TIME field) takes precedence over a placement
+    determined by the timetable generator (the PLACEMENT field).
+    "Parallel" tags are not times. If there is no placement, return
+    (-1, -1).
+    """
+    for t in (sublesson.TIME, sublesson.PLACEMENT):
+        if t and "." in t:
+            try:
+                return timeslot2index(t.lstrip("?"))
+            except ValueError as e:
+                REPORT("ERROR", str(e))
+    return -1, -1
+
+
+def class_atoms(klass: str, basic_groups: set[str]) -> list[str]:
+    """Return the "atomic" groups (minimal subgroups) of the class which
+    are covered by the given groups. Group '*' is the whole class.
+    """
+    atoms = get_classes().group_info(klass).get("MINIMAL_SUBGROUPS") or [""]
+    if "*" in basic_groups:
+        return list(atoms)
+    gsets = [set(g.split(".")) for g in basic_groups]
+    return [
+        a for a in atoms
+        if any(gs <= set(a.split(".")) for gs in gsets)
+    ]
+
+
+def available_periods(tt_data: dict, ndays: int, nperiods: int) -> list[str]:
+    """Decode the "AVAILABLE" entry of a TT_DATA field to a list
+    containing a flag for each slot ((day * nperiods) + period):
+        '+': available, '-': not available, '*': possible break.
+    Missing entries are handled as in <fet_data.timeoff_fet>.
+    """
+    try:
+        day_periods = tt_data["AVAILABLE"].split("_")
+    except KeyError:
+        day_periods = []
+    flags = []
+    for d in range(ndays):
+        try:
+            ddata = day_periods[d]
+        except IndexError:
+            ddata = ""
+        pval = "+"
+        for p in range(nperiods):
+            try:
+                pval = ddata[p]
+            except IndexError:
+                if pval == "*":
+                    pval = "+"
+            flags.append(pval)
+    return flags
+
+
+class Occupancy:
+    """For each resource keep a list, one entry per time slot, of the
+    lessons occupying it.
+    Resources are teachers ("T", tid), atomic groups ("G", class, atom)
+    and rooms ("R", rid). The activity of a lesson supplies the teachers,
+    groups and possible rooms. Single-room choices are handled as fixed
+    resources, the other choices of a lesson clash if they cannot be
+    satisfied together by the free rooms (see <match_rooms>). Open
+    choices ('+') are ignored.
+    The index is built once and then kept up to date by calling
+    <place> and <unplace> when a lesson is moved.
+    """
+    def __init__(self, ndays: int, nperiods: int, activity_list: list):
+        self.ndays = ndays
+        self.nperiods = nperiods
+        self.nslots = ndays * nperiods
+        # {resource -> [{lesson-id, ... }, ... ]}, one set per slot
+        self.resource_slots: dict[tuple, list[set[int]]] = {}
+        # {lesson-id -> (activity-index, length, slot-index or -1)}
+        self.lessons: dict[int, tuple[int, int, int]] = {}
+        # {activity-index -> [lesson-id, ... ]}
+        self.activity_lessons: dict[int, list[int]] = {}
+        # {lesson-id -> [room, ... ]}, the actually allocated rooms
+        self.lesson_rooms: dict[int, list[str]] = {}
+        # For each activity: (fixed resources, room choice lists)
+        self.activity_resources: list[tuple[frozenset, list[list[str]]]] = []
+        # {resource -> availability flags}, only for teachers and classes
+        self.availability: dict[tuple, list[str]] = {}
+        for activity in activity_list:
+            self.add_activity(activity)
+
+    def add_activity(self, activity) -> int:
+        """Add an <Activity> (see <activity_model>) to the index.
+        Return its index.
+        """
+        index = len(self.activity_resources)
+        self.activity_resources.append(self.__activity_resources(activity))
+        return index
+
+    def reset_activity(self, index: int, activity):
+        """Replace the activity at the given index (<None> if it has
+        been removed). Its lessons are removed from the index, any
+        current lessons must be added again (<add_lesson>).
+        """
+        for lid in self.activity_lessons.pop(index, None) or []:
+            self.unplace(lid)
+            del self.lessons[lid]
+            self.lesson_rooms.pop(lid, None)
+        while index >= len(self.activity_resources):
+            self.activity_resources.append((frozenset(), []))
+        self.activity_resources[index] = self.__activity_resources(activity)
+
+    def __activity_resources(self, activity):
+        """Return the fixed resources and the room choice lists of
+        the activity.
+        """
+        if activity is None:
+            return frozenset(), []
+        resources = set()
+        for tid in activity.alltids:
+            resources.add(("T", tid))
+            self.__availability(("T", tid))
+        for klass, basic_groups, rest_groups in activity.classgroups:
+            for a in class_atoms(klass, basic_groups):
+                resources.add(("G", klass, a))
+            self.__availability(("C", klass))
+        choices = []
+        for rl in activity.roomlists:
+            if len(rl) == 1:
+                if rl[0] != "+":
+                    resources.add(("R", rl[0]))
+            elif "+" not in rl:
+                # Choices including an open one ('+') never clash
+                choices.append(rl)
+        return frozenset(resources), choices
+
+    def __availability(self, resource):
+        if resource in self.availability:
+            return
+        if resource[0] == "T":
+            tt_data = get_teachers()[resource[1]].tt_data
+        else:
+            tt_data = get_classes()[resource[1]].tt_data
+        self.availability[resource] = available_periods(
+            tt_data, self.ndays, self.nperiods
+        )
+
+    def __slots(self, resource) -> list[set[int]]:
+        try:
+            return self.resource_slots[resource]
+        except KeyError:
+            slots = [set() for i in range(self.nslots)]
+            self.resource_slots[resource] = slots
+            return slots
+
+    def __lesson_resources(self, lesson_id: int) -> set:
+        a_index = self.lessons[lesson_id][0]
+        resources = set(self.activity_resources[a_index][0])
+        for r in self.lesson_rooms.get(lesson_id) or []:
+            resources.add(("R", r))
+        return resources
+
+    def add_lesson(
+        self,
+        lesson_id: int,
+        activity_index: int,
+        length: int,
+        slot: tuple[int, int],
+        rooms: Optional[list[str]] = None,
+    ):
+        """Register a lesson of the given activity. If <slot> (a pair of
+        day and period indexes) is valid, the lesson is placed there.
+        <rooms> are the rooms actually allocated to the lesson.
+        """
+        self.lessons[lesson_id] = (activity_index, length, -1)
+        try:
+            self.activity_lessons[activity_index].append(lesson_id)
+        except KeyError:
+            self.activity_lessons[activity_index] = [lesson_id]
+        if rooms:
+            self.lesson_rooms[lesson_id] = [r for r in rooms if r]
+        if slot[0] >= 0:
+            self.place(lesson_id, slot)
+
+    def lesson_slot(self, lesson_id: int) -> tuple[int, int]:
+        """Return the (day, period) of the lesson, (-1, -1) if unplaced."""
+        s = self.lessons[lesson_id][2]
+        if s < 0:
+            return -1, -1
+        return divmod(s, self.nperiods)
+
+    def place(self, lesson_id: int, slot: tuple[int, int]):
+        """Move the lesson to the given (day, period) slot."""
+        self.unplace(lesson_id)
+        a_index, length, s0 = self.lessons[lesson_id]
+        d, p = slot
+        s = d * self.nperiods + p
+        self.lessons[lesson_id] = (a_index, length, s)
+        for r in self.__lesson_resources(lesson_id):
+            slots = self.__slots(r)
+            for i in range(s, min(s + length, (d + 1) * self.nperiods)):
+                slots[i].add(lesson_id)
+
+    def unplace(self, lesson_id: int):
+        """Remove the lesson from its current slot, if it has one."""
+        a_index, length, s = self.lessons[lesson_id]
+        if s < 0:
+            return
+        day_end = (s // self.nperiods + 1) * self.nperiods
+        for r in self.__lesson_resources(lesson_id):
+            slots = self.resource_slots[r]
+            for i in range(s, min(s + length, day_end)):
+                slots[i].discard(lesson_id)
+        self.lessons[lesson_id] = (a_index, length, -1)
+
+    def set_rooms(self, lesson_id: int, rooms: list[str]):
+        """Change the rooms actually allocated to the lesson."""
+        a_index, length, s = self.lessons[lesson_id]
+        self.unplace(lesson_id)
+        self.lesson_rooms[lesson_id] = [r for r in rooms if r]
+        if s >= 0:
+            self.place(lesson_id, divmod(s, self.nperiods))
+
+    def slot_info(self, lesson_id: int, slot: tuple[int, int]
+    ) -> Optional[SlotInfo]:
+        """Evaluate the placement of the given lesson in the given
+        (day, period) slot. Return <None> if the lesson doesn't fit in
+        the day at this position.
+        """
+        a_index, length, s0 = self.lessons[lesson_id]
+        d, p = slot
+        if p + length > self.nperiods:
+            return None
+        s = d * self.nperiods + p
+        resources, choices = self.activity_resources[a_index]
+        slot_range = range(s, s + length)
+        others = set()
+        blocked = False
+        penalty = 0
+        for r in resources:
+            slots = self.resource_slots.get(r)
+            if slots:
+                for i in slot_range:
+                    others.update(slots[i])
+            if r[0] == "G":
+                flags = self.availability.get(("C", r[1]))
+            else:
+                flags = self.availability.get(r)
+            if flags:
+                for i in slot_range:
+                    f = flags[i]
+                    if f == "-":
+                        blocked = True
+                    elif f == "*":
+                        penalty += PENALTY_BREAK
+        others.discard(lesson_id)
+        clashes = len(others)
+        if choices:
+            # The alternatives must be satisfiable together, using rooms
+            # which are free in all periods of the lesson.
+            free_choices = [
+                [r for r in rl if self.__room_free(r, slot_range, lesson_id)]
+                for rl in choices
+            ]
+            clashes += match_rooms(free_choices).count(None)
+        # Soft constraint: lessons of an activity on different days
+        for lid in self.activity_lessons[a_index]:
+            if lid != lesson_id:
+                s1 = self.lessons[lid][2]
+                if s1 >= 0 and s1 // self.nperiods == d:
+                    penalty += PENALTY_SAME_DAY
+        return SlotInfo(clashes, blocked, penalty)
+
+    def __room_free(self, room, slot_range, lesson_id):
+        slots = self.resource_slots.get(("R", room))
+        if slots:
+            for i in slot_range:
+                if slots[i] - {lesson_id}:
+                    return False
+        return True
+
+    def seek_slots(self, lesson_id: int
+    ) -> list[list[Optional[SlotInfo]]]:
+        """Evaluate all possible placements of the given lesson.
+        Return a matrix [day][period] of <SlotInfo> items (or <None>,
+        see <slot_info>).
+        """
+        return [
+            [self.slot_info(lesson_id, (d, p)) for p in range(self.nperiods)]
+            for d in range(self.ndays)
+        ]
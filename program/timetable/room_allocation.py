@@ -0,0 +1,359 @@
+"""
+timetable/room_allocation.py
+
+Last updated:  2026-10-19
+
+Allocate rooms to placed lessons. The room requirements of all lessons
+in a time slot are solved together as a bipartite matching problem
+(room requirements -> rooms), so that rooms with alternatives are
+allocated optimally and any requirements which cannot be satisfied are
+reported precisely.
+
+=+LICENCE=============================
+Copyright 2026 Michael Towers
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+=-LICENCE========================================
+"""
+
+BACKTRACK_STEPS = 20000     # limit for the search over lesson spans
+
+###############################################################
+
+from typing import NamedTuple, Optional
+
+### -----
+
+
+class RoomConflict(NamedTuple):
+    day: int
+    period: int
+    lesson_id: int
+    roomlist: list[str]     # the requirement which could not be met
+
+
+def match_rooms(
+    demands: list[list[str]],
+    preferred: Optional[list[Optional[str]]] = None,
+    pool: Optional[list[str]] = None,
+) -> list[Optional[str]]:
+    """Allocate a different room to each of the <demands> (lists of
+    acceptable rooms) by finding a maximum bipartite matching.
+    A demand containing '+' (an "open" choice) can also be satisfied
+    by any room in <pool>, but these demands only get rooms which are
+    not needed by the specific demands.
+    <preferred> optionally gives a room for each demand (e.g. the
+    current allocation), which is used as a starting point, so that
+    re-solving a slot after a small change moves as few lessons as
+    possible.
+    Return a list with the allocated room (or <None>) for each demand.
+    """
+    n = len(demands)
+    result: list[Optional[str]] = [None] * n
+    room2demand: dict[str, int] = {}
+    # The acceptable rooms of each demand. An open choice adds the pool
+    # rooms, so that the matching can move a demand with specific rooms
+    # and '+' to a pool room if its specific room is needed elsewhere.
+    choices = {}
+    for i, rl in enumerate(demands):
+        rooms = [r for r in rl if r != "+"]
+        if pool and "+" in rl:
+            rooms += [r for r in pool if r not in rooms]
+        if rooms:
+            choices[i] = rooms
+    # Seed the matching with the preferred rooms of the demands without
+    # an open choice. Seeding the others could block a room needed by a
+    # later demand, so for these the preferred room is just tried first.
+    if preferred:
+        for i, rooms in choices.items():
+            r = preferred[i]
+            if r and r in rooms:
+                if "+" in demands[i]:
+                    rooms.remove(r)
+                    rooms.insert(0, r)
+                elif r not in room2demand:
+                    room2demand[r] = i
+                    result[i] = r
+
+    def augment(i, seen):
+        """Seek an augmenting path for demand <i> (Kuhn's algorithm)."""
+        for r in choices[i]:
+            if r in seen:
+                continue
+            seen.add(r)
+            j = room2demand.get(r)
+            if j is None or augment(j, seen):
+                room2demand[r] = i
+                result[i] = r
+                return True
+        return False
+
+    # Demands without an open choice first, then those with specific
+    # rooms and '+', then the purely open ones – the most constrained
+    # first within each of these. An augmenting path never unmatches a
+    # demand, so the open demands only get rooms which are not needed
+    # by the others.
+    def order(i):
+        rl = demands[i]
+        return ("+" in rl, rl == ["+"], len(choices[i]))
+
+    for i in sorted(choices, key=order):
+        if result[i] is None:
+            augment(i, set())
+    return result
+
+
+def roomlists_feasible(roomlists: list[list[str]]) -> bool:
+    """Test whether the room requirements of a single activity can be
+    satisfied simultaneously (ignoring open choices).
+    """
+    return all(
+        r is not None
+        for r, rl in zip(match_rooms(roomlists), roomlists)
+        if rl != ["+"]
+    )
+
+
+class RoomAllocator:
+    """Manage the room allocations for the placed lessons of a whole
+    week.
+    Each lesson has a list of room requirements (one list of acceptable
+    rooms for each room needed). A lesson covering several periods must
+    keep the same rooms. The days are first solved period by period,
+    the continuation of a lesson being bound to the rooms allocated in
+    its first period. If this leaves conflicts on a day with lessons
+    covering several periods, a search over the whole spans of the
+    lessons is made (see <__solve_spans>), as an earlier choice of room
+    can cause the conflict.
+    Changes (<set_lesson>, <move>, <remove_lesson>) only mark the
+    affected days as "dirty", <solve> then re-solves just these.
+    """
+    def __init__(self, ndays: int, nperiods: int, pool: list[str]):
+        self.ndays = ndays
+        self.nperiods = nperiods
+        self.pool = pool
+        # {lesson-id -> (roomlists, length, (day, period) or None)}
+        self.lessons: dict[int, tuple[list[list[str]], int, Optional[tuple[int, int]]]] = {}
+        # {lesson-id -> [room or None, ... ]}, one entry per room list
+        self.allocation: dict[int, list[Optional[str]]] = {}
+        # {day -> [RoomConflict, ... ]}
+        self.day_conflicts: dict[int, list[RoomConflict]] = {}
+        self.dirty_days: set[int] = set()
+
+    def set_lesson(
+        self,
+        lesson_id: int,
+        roomlists: list[list[str]],
+        length: int,
+        slot: Optional[tuple[int, int]],
+        rooms: Optional[list[str]] = None,
+    ):
+        """Add or replace a lesson. <slot> is a (day, period) pair, or
+        <None> if the lesson is not placed. <rooms> is an existing
+        allocation, which will be retained as far as possible.
+        """
+        self.remove_lesson(lesson_id)
+        if slot and slot[0] < 0:
+            slot = None
+        self.lessons[lesson_id] = (roomlists, length, slot)
+        if rooms:
+            alloc = [None] * len(roomlists)
+            for i, r in enumerate(rooms[:len(roomlists)]):
+                alloc[i] = r or None
+            self.allocation[lesson_id] = alloc
+        if slot:
+            self.dirty_days.add(slot[0])
+
+    def remove_lesson(self, lesson_id: int):
+        try:
+            roomlists, length, slot = self.lessons.pop(lesson_id)
+        except KeyError:
+            return
+        self.allocation.pop(lesson_id, None)
+        if slot:
+            self.dirty_days.add(slot[0])
+
+    def move(self, lesson_id: int, slot: Optional[tuple[int, int]]):
+        roomlists, length, slot0 = self.lessons[lesson_id]
+        if slot0:
+            self.dirty_days.add(slot0[0])
+        if slot and slot[0] < 0:
+            slot = None
+        self.lessons[lesson_id] = (roomlists, length, slot)
+        if slot:
+            self.dirty_days.add(slot[0])
+
+    def rooms(self, lesson_id: int) -> list[Optional[str]]:
+        return self.allocation.get(lesson_id) or []
+
+    def conflicts(self) -> list[RoomConflict]:
+        """Return all unsatisfiable room requirements, sorted by time."""
+        return [c for d in sorted(self.day_conflicts)
+            for c in self.day_conflicts[d]
+        ]
+
+    def solve(self) -> set[int]:
+        """Re-solve the room allocation for the days affected by changes
+        since the last call.
+        Return the set of lesson-ids whose allocation has changed.
+        """
+        changed = set()
+        if not self.dirty_days:
+            return changed
+        # {day -> {period -> [lesson-id, ... ]}} for the dirty days
+        day_starts = {d: {} for d in self.dirty_days}
+        for lid, (roomlists, length, slot) in self.lessons.items():
+            if slot and slot[0] in day_starts and roomlists:
+                try:
+                    day_starts[slot[0]][slot[1]].append(lid)
+                except KeyError:
+                    day_starts[slot[0]][slot[1]] = [lid]
+        for d, starts in day_starts.items():
+            changed.update(self.__solve_day(d, starts))
+        self.dirty_days.clear()
+        return changed
+
+    def __solve_day(self, day, starts):
+        old_alloc = {
+            lid: self.allocation.get(lid)
+            for lids in starts.values()
+            for lid in lids
+        }
+        conflicts = []
+        running = []    # [(lesson-id, last period), ... ]
+        spans = False   # are there lessons covering several periods?
+        for p in range(self.nperiods):
+            running = [(lid, p1) for lid, p1 in running if p1 >= p]
+            new = starts.get(p) or []
+            if not new:
+                continue
+            demands = []
+            preferred = []
+            owners = []
+            # Continuing lessons keep the rooms from their first period
+            for lid, p1 in running:
+                for r in self.allocation[lid]:
+                    if r:
+                        demands.append([r])
+                        preferred.append(r)
+                        owners.append(None)
+            for lid in new:
+                roomlists, length, slot = self.lessons[lid]
+                old = self.allocation.get(lid) or []
+                for i, rl in enumerate(roomlists):
+                    demands.append(rl)
+                    preferred.append(old[i] if i < len(old) else None)
+                    owners.append((lid, i))
+            result = match_rooms(demands, preferred, self.pool)
+            new_alloc = {}
+            for lid in new:
+                roomlists, length, slot = self.lessons[lid]
+                new_alloc[lid] = [None] * len(roomlists)
+                running.append((lid, p + length - 1))
+                if length > 1:
+                    spans = True
+            for owner, r, rl in zip(owners, result, demands):
+                if owner:
+                    lid, i = owner
+                    if r is None:
+                        if rl != ["+"]:
+                            conflicts.append(RoomConflict(day, p, lid, rl))
+                    else:
+                        new_alloc[lid][i] = r
+            self.allocation.update(new_alloc)
+        if conflicts and spans:
+            alloc = self.__solve_spans(starts, old_alloc)
+            if alloc is not None:
+                self.allocation.update(alloc)
+                conflicts = []
+        self.day_conflicts[day] = conflicts
+        return {
+            lid for lid, alloc in old_alloc.items()
+            if self.allocation[lid] != alloc
+        }
+
+    def __solve_spans(self, starts, old_alloc):
+        """Search (with backtracking) for an allocation of the rooms for
+        the lessons of a day in which every lesson has the same rooms
+        over its whole span and all requirements other than purely open
+        ones ('+') are satisfied. The previous allocation is tried first.
+        The search is limited to <BACKTRACK_STEPS> steps.
+        Return the allocation, {lesson-id: [room or None, ... ], ... },
+        or <None> if none was found.
+        """
+        nodes = []      # [(lesson-id, index, p0, p1, rooms), ... ]
+        open_nodes = []
+        alloc = {}
+        for p, lids in starts.items():
+            for lid in lids:
+                roomlists, length, slot = self.lessons[lid]
+                alloc[lid] = [None] * len(roomlists)
+                old = old_alloc[lid] or []
+                for i, rl in enumerate(roomlists):
+                    rooms = [r for r in rl if r != "+"]
+                    if "+" in rl:
+                        rooms += [r for r in self.pool if r not in rooms]
+                    r = old[i] if i < len(old) else None
+                    if r in rooms:
+                        rooms.remove(r)
+                        rooms.insert(0, r)
+                    node = (lid, i, p, p + length - 1, rooms)
+                    if rl == ["+"]:
+                        open_nodes.append(node)
+                    else:
+                        nodes.append(node)
+        nodes.sort(key=lambda n: len(n[4]))
+        used = {}       # {room: [(p0, p1), ... ]}
+
+        def free(r, p0, p1):
+            return all(q1 < p0 or q0 > p1 for q0, q1 in used.get(r, ()))
+
+        # Depth-first search with an explicit stack (there can be more
+        # nodes than the recursion limit allows): <choice[k]> is the
+        # index of the next room to try for node k.
+        choice = [0] * len(nodes)
+        k = 0
+        steps = 0
+        while k < len(nodes):
+            steps += 1
+            if steps > BACKTRACK_STEPS:
+                return None
+            lid, i, p0, p1, rooms = nodes[k]
+            r = alloc[lid][i]
+            if r is not None:
+                # Back at this node: release its room. The deeper nodes
+                # have been released already, so it is the last entry.
+                used[r].pop()
+                alloc[lid][i] = None
+            j = choice[k]
+            while j < len(rooms) and not free(rooms[j], p0, p1):
+                j += 1
+            if j < len(rooms):
+                r = rooms[j]
+                used.setdefault(r, []).append((p0, p1))
+                alloc[lid][i] = r
+                choice[k] = j + 1
+                k += 1
+            else:
+                choice[k] = 0
+                k -= 1
+                if k < 0:
+                    return None
+        # The purely open requirements take any room which is still free
+        for lid, i, p0, p1, rooms in open_nodes:
+            for r in rooms:
+                if free(r, p0, p1):
+                    used.setdefault(r, []).append((p0, p1))
+                    alloc[lid][i] = r
+                    break
+        return alloc
@@ -73,7 +73,7 @@ from ui.ui_base import (
     QAction,
     APP,
 )
-from ui.editable import EdiTableWidget, table2tsv
+from ui.editable import EdiTableView, table2tsv
 
 # This seems to deactivate activate-on-single-click in filedialog
 # (presumably elsewhere as well?)
@@ -114,7 +114,7 @@ class TsvEditor(QWidget):
         vbox = QVBoxLayout(self)
         toolbar = QToolBar()
         vbox.addWidget(toolbar)
-        self.table = EdiTableWidget()
+        self.table = EdiTableView()
         vbox.addWidget(self.table)
 
         toolbar.addAction(self.action_open)
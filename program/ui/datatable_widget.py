@@ -54,7 +54,7 @@ from ui.ui_base import (
     QKeyEvent,
 )
 
-from ui.editable import EdiTableWidget, Change_X
+from ui.editable import EdiTableView, Change_X
 
 Change_INFO = Change_X
 
@@ -174,7 +174,7 @@ def send_control_key(key, widget):
     APP.postEvent(widget, eventRealease)
 
 
-class TableWidget(EdiTableWidget):
+class TableWidget(EdiTableView):
     def __init__(self, dteditor):
         super().__init__()
         self.dteditor = dteditor
@@ -1,10 +1,12 @@
 """
 ui/editable.py
 
-Last updated:  2022-08-21
+Last updated:  2026-10-19
 
 An editable table widget using QTableWidget as base class. Only text
 cells are handled.
+For larger tables there is a model/view version, <EdiTableView>, with
+the same interface.
 Originally inspired by "TableWidget.py" from the "silx" project (www.silx.org),
 thanks to P. Knobel, but it is now very different.
 
@@ -106,17 +108,34 @@ _VALIDATION_ERROR = "Ungültiger Wert"
 # _WARNING = "Warning"
 _WARNING = "Warnung"
 
+# Limits for the undo/redo journal: the number of steps and the number
+# of stored cell values. When one of these is exceeded, the oldest steps
+# are discarded.
+UNDO_MAX_STEPS = 1000
+UNDO_MAX_CELLS = 1000000
+
 ########################################################################
 
+from array import array
+
 from qtpy.QtWidgets import (
     QApplication,
     QTableWidget,
+    QTableView,
     QTableWidgetItem,
     QMessageBox,
     QStyledItemDelegate,
     QStyleOptionViewItem,
 )
-from qtpy.QtCore import Qt, QPointF, QRectF, QSize
+from qtpy.QtCore import (
+    Qt,
+    QPointF,
+    QRectF,
+    QSize,
+    QAbstractTableModel,
+    QModelIndex,
+    Signal,
+)
 from qtpy.QtGui import QKeySequence
 from qtpy.QtWidgets import QAction  # in Qt6 it is in QtGui
 
@@ -183,14 +202,63 @@ class RangeError(Exception):
     pass
 
 
+class BlockChange:
+    """A compact record of a change to a number of cells (Change_BLOCK).
+    It is built from a list of cell changes: [(row, col, old, new), ... ].
+    """
+
+    __slots__ = ("rows", "cols", "old", "new")
+
+    def __init__(self, change_list):
+        rows, cols, self.old, self.new = zip(*change_list)
+        self.rows = array("l", rows)
+        self.cols = array("l", cols)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def undo_cells(self):
+        return zip(self.rows, self.cols, self.old)
+
+    def redo_cells(self):
+        return zip(self.rows, self.cols, self.new)
+
+
+def change_cost(chtype, change):
+    """Return the number of cell values stored for a change."""
+    if chtype is Change_BLOCK:
+        return len(change)
+    if chtype is Change_DEL_ROW or chtype is Change_DEL_COL:
+        return len(change[1])
+    return 1
+
+
 class UndoRedo:
-    def __init__(self, table):
+    """The undo/redo journal for a table.
+    The journal is a list of steps, each step being a list of changes,
+    (change-type, change) pairs. All changes between a Change_GROUP and
+    the following Change_END_GROUP form a single step. Consecutive
+    changes to the same cell are combined. The steps are undone and
+    redone as a single update of the table (see
+    <EdiTableBase.begin_batch>).
+    The journal is limited to <max_steps> steps and <max_cells> stored
+    cell values, older steps are discarded when necessary.
+    """
+
+    def __init__(self, table,
+            max_steps=UNDO_MAX_STEPS,
+            max_cells=UNDO_MAX_CELLS):
         self.table = table
         self.blocked = False
+        self.max_steps = max_steps
+        self.max_cells = max_cells
+        self.group = None
 
     def mark0(self, clear):
         if clear:
-            self.changes = []
+            self.steps = []     # [(cost, [(chtype, change), ... ]), ... ]
+            self.cells = 0      # total cost of the steps
+            self.group = None
             self.table.undoAction.setEnabled(False)
             self.table.redoAction.setEnabled(False)
             self.index = 0
@@ -208,11 +276,65 @@ class UndoRedo:
     def change(self, chtype, change):
         #print("CHANGE:", chtype, change, self.enabled, self.blocked)
         if self.enabled and not self.blocked:
-            # print("CHANGE:", chtype, change)
-            del self.changes[self.index :]
-            self.changes.append((chtype, change))
-            self.table.undoAction.setEnabled(True)
-            self.index = len(self.changes)
+            if chtype is Change_GROUP:
+                self.group = []
+                return
+            if chtype is Change_END_GROUP:
+                step, self.group = self.group, None
+                if step:
+                    self.add_step(step)
+                return
+            if chtype is Change_BLOCK:
+                change = BlockChange(change)
+            if self.group is not None:
+                self.group.append((chtype, change))
+                return
+            if (
+                chtype is Change_CELL
+                and self.index > 0
+                and self.index != self.index0
+            ):
+                # Combine with a preceding change to the same cell, but
+                # not with one before the "saved" state.
+                cost, step = self.steps[self.index - 1]
+                if len(step) == 1:
+                    chtype0, change0 = step[0]
+                    if chtype0 is Change_CELL and change0[:2] == change[:2]:
+                        self.steps[self.index - 1] = (
+                            1,
+                            [(Change_CELL, (*change[:2], change0[2], change[3]))]
+                        )
+                        self.truncate()
+                        return
+            self.add_step([(chtype, change)])
+
+    def truncate(self):
+        """Remove the steps after the current one, they can no longer be
+        redone.
+        """
+        for cost, step in self.steps[self.index :]:
+            self.cells -= cost
+        del self.steps[self.index :]
+        self.table.redoAction.setEnabled(False)
+
+    def add_step(self, step):
+        self.truncate()
+        cost = sum(change_cost(*c) for c in step)
+        self.steps.append((cost, step))
+        self.cells += cost
+        # Keep within the limits, but retain at least the newest step
+        ndrop = 0
+        while (len(self.steps) - ndrop > 1) and (
+            len(self.steps) - ndrop > self.max_steps
+            or self.cells > self.max_cells
+        ):
+            self.cells -= self.steps[ndrop][0]
+            ndrop += 1
+        if ndrop:
+            del self.steps[:ndrop]
+            self.index0 -= ndrop
+        self.index = len(self.steps)
+        self.table.undoAction.setEnabled(True)
 
     def undo(self):
         def do_undo():
@@ -225,8 +347,7 @@ class UndoRedo:
             elif chtype is Change_DEL_ROW:
                 self.table.insertRow(change[0], data=change[1])
             elif chtype is Change_BLOCK:
-                for _change in change:  # <change> is here a list
-                    self.table.set_text(*_change[:3])
+                self.table.set_cells(change.undo_cells())
             elif chtype is Change_CELL:
                 self.table.set_text(*change[:3])
             elif not self.table.undoredo_extension(True, chtype, change):
@@ -235,16 +356,10 @@ class UndoRedo:
         if self.enabled and self.index > 0:
             self.blocked = True
             self.index -= 1
-            chtype, change = self.changes[self.index]
-            if chtype is Change_END_GROUP:
-                while True:
-                    self.index -= 1
-                    chtype, change = self.changes[self.index]
-                    if chtype is Change_GROUP:
-                        break
-                    do_undo()
-            else:
+            self.table.begin_batch()
+            for chtype, change in reversed(self.steps[self.index][1]):
                 do_undo()
+            self.table.end_batch()
             self.blocked = False
             if self.index == 0:
                 self.table.undoAction.setEnabled(False)
@@ -261,36 +376,31 @@ class UndoRedo:
             elif chtype is Change_DEL_ROW:
                 self.table.removeRow(change[0])
             elif chtype is Change_BLOCK:
-                for _change in change:  # <change> is here a list
-                    self.table.set_text(*_change[:2], _change[3])
+                self.table.set_cells(change.redo_cells())
             elif chtype is Change_CELL:
                 self.table.set_text(*change[:2], change[3])
             elif not self.table.undoredo_extension(False, chtype, change):
                 raise Bug(f"Invalid Redo-change: {chtype}")
 
-        if self.enabled and self.index < len(self.changes):
+        if self.enabled and self.index < len(self.steps):
             self.blocked = True
-            chtype, change = self.changes[self.index]
-            self.index += 1
-            if chtype is Change_GROUP:
-                while True:
-                    chtype, change = self.changes[self.index]
-                    self.index += 1
-                    if chtype is Change_END_GROUP:
-                        break
-                    do_redo()
-            else:
+            self.table.begin_batch()
+            for chtype, change in self.steps[self.index][1]:
                 do_redo()
+            self.table.end_batch()
+            self.index += 1
             self.blocked = False
-            if self.index == len(self.changes):
+            if self.index == len(self.steps):
                 self.table.redoAction.setEnabled(False)
             self.table.undoAction.setEnabled(True)
 
 
-class EdiTableWidget(QTableWidget):
-    """This adds features to the standard table widget and makes a
-    number of assumptions about the usage – specifically to provide a
-    useful base for a table editor dealing with string data only.
+class EdiTableBase:
+    """The editing features shared by <EdiTableWidget> and <EdiTableView>.
+    This must be the first base class, the second being the Qt table
+    class. The table data is accessed via the model of the Qt table,
+    other methods which depend on the Qt class are implemented in the
+    derived classes.
     """
 
     def new_action(
@@ -337,7 +447,6 @@ class EdiTableWidget(QTableWidget):
             align_centre = False,
             on_selection_state_change=None):
         super().__init__(parent=parent)
-        self.setItemPrototype(ValidatingWidgetItem())
         self.setSelectionMode(self.ContiguousSelection)
         self.has_selection = False
         self.align_centre = align_centre
@@ -544,36 +653,6 @@ class EdiTableWidget(QTableWidget):
             self.deleteColumnsAction.setEnabled(True)
         self.setFocus()
 
-    def init_data(self, data):
-        """Set the initial table data from a (complete) list of lists
-        of strings.
-        """
-
-        def dummy(*args):  # Don't report data changes
-            pass
-
-        # +
-        self.table_data0 = data
-        rows = len(data)
-        columns = len(data[0])
-        self.init0(rows, columns)
-        # Disable change reporting
-        self.set_change_report(dummy)
-        # Enter data
-        for r in range(rows):
-            for c in range(columns):
-                val = data[r][c]
-                # print("SET", r, c, repr(val))
-                if isinstance(val, str):
-                    item = ValidatingWidgetItem(val)
-                    if self.align_centre:
-                        item.setTextAlignment(Qt.AlignCenter)
-                    self.setItem(r, c, item)
-                else:
-                    raise Bug("Only string data is accepted")
-        # Enable change reporting
-        self.set_change_report()
-
     def init_sparse_data(self, rows, columns, data_list):
         """Set the initial table data from a list of cell values.
         data_list is a list of tuples: [(row, column, value), ... ].
@@ -611,6 +690,13 @@ class EdiTableWidget(QTableWidget):
         data_model = self.model()
         data_model.setData(data_model.index(row, col), text)
 
+    def set_cells(self, cells):
+        """Write a number of cells: <cells> is an iterable of
+        (row, col, text) tuples.
+        """
+        for r, c, text in cells:
+            self.set_text(r, c, text)
+
     def read_block(self, top, left, width, height):
         """Read a block of data from the table.
         Return list of rows, each row is a list of cell values.
@@ -630,18 +716,6 @@ class EdiTableWidget(QTableWidget):
             rows.append(rowdata)
         return rows
 
-    def set_validator(self, row, col, f_validate):
-        """Set a validator on the cell at (row, col).
-        This uses the <set_validator> method of the widget item
-        (QTableWidgetItem) at the given position. A <ValidatingWidgetItem>
-        provides this method.
-
-        <f_validate> is a function taking just the value as argument.
-        If this is valid, the function returns <None>. Otherwise it
-        returns an error message.
-        """
-        self.item(row, col).set_validator(f_validate)
-
     def cell_changed(self, r, c):
         """Handle cell-value changed. The arguments are row and column.
         OVERRIDE to use.
@@ -689,19 +763,6 @@ class EdiTableWidget(QTableWidget):
                 h -= 1
             self.add_change(Change_END_GROUP, None)
 
-    def insertRow(self, row, data=None):  # override
-        ncols = self.columnCount()
-        super().insertRow(row)
-        if data is None:
-            self.add_change(Change_ADD_ROW, row)
-            data = [""] * ncols
-        else:
-            # There should only be data when undoing, so no need to add
-            # a "change".
-            if len(data) != ncols:
-                raise Bug("insertRow: data length doesn't match table width")
-        self.paste_block(row, 0, [data])
-
     def insert_column(self):
         """Insert an empty column after the currently selected one(s).
         If multiple columns are selected, the same number of columns
@@ -723,20 +784,6 @@ class EdiTableWidget(QTableWidget):
                 w -= 1
             self.add_change(Change_END_GROUP, None)
 
-    def insertColumn(self, column, data=None):  # override
-        # Consistency check
-        nrows = self.row_count()
-        super().insertColumn(column)
-        if data is None:
-            self.add_change(Change_ADD_COL, column)
-            data = [""] * nrows
-        else:
-            # There should only be data when undoing, so no need to add
-            # a "change".
-            if len(data) != nrows:
-                raise Bug("insertColumn: data length doesn't match table height")
-            self.paste_block(0, column, [[data[row]] for row in range(nrows)])
-
     def delete_rows(self):
         """Delete the selected rows."""
         selected = self.get_selection()
@@ -758,11 +805,6 @@ class EdiTableWidget(QTableWidget):
                 self.removeRow(r)
             self.add_change(Change_END_GROUP, None)
 
-    def removeRow(self, row):  # override
-        rowdata = [self.get_text(row, col) for col in range(self.columnCount())]
-        super().removeRow(row)
-        self.add_change(Change_DEL_ROW, (row, rowdata))
-
     def delete_columns(self):
         """Delete the selected columns."""
         selected = self.get_selection()
@@ -784,10 +826,14 @@ class EdiTableWidget(QTableWidget):
                 self.removeColumn(c)
             self.add_change(Change_END_GROUP, None)
 
-    def removeColumn(self, column):  # override
-        coldata = [self.get_text(row, column) for row in range(self.rowCount())]
-        super().removeColumn(column)
-        self.add_change(Change_DEL_COL, (column, coldata))
+    def begin_batch(self):
+        """Start a sequence of changes which should be shown as a single
+        update of the table, ended by <end_batch>.
+        """
+        self.setUpdatesEnabled(False)
+
+    def end_batch(self):
+        self.setUpdatesEnabled(True)
 
     def set_change_report(self, handler=None):
         if handler:
@@ -798,7 +844,7 @@ class EdiTableWidget(QTableWidget):
     def click2(self):
         """Double-click"""
         print("click2")
-        self.editItem(self.currentItem())
+        self.edit(self.currentIndex())
 #        self.activated(self.currentRow(), self.currentColumn())
 
     def cell_clicked(self, row, col):
@@ -853,15 +899,16 @@ class EdiTableWidget(QTableWidget):
     def keyPressEvent(self, event):
         if self.state() != self.EditingState:
             key = event.key()
+            ix = self.currentIndex()
             if key == Qt.Key_Delete:
                 if self.cut_selection() is None:
-                    self.set_text(self.currentRow(), self.currentColumn(), "")
+                    self.set_text(ix.row(), ix.column(), "")
                 return  # in this case don't call the base class method
             if key == Qt.Key_Return and self.get_selection()[0] == 1:
                 if QApplication.keyboardModifiers() & Qt.ControlModifier:
-                    self.activated(self.currentRow(), self.currentColumn())
+                    self.activated(ix.row(), ix.column())
                 else:
-                    self.editItem(self.currentItem())
+                    self.edit(ix)
 #                self.newline_press(self.currentRow(), self.currentColumn())
         super().keyPressEvent(event)
 
@@ -931,22 +978,6 @@ class EdiTableWidget(QTableWidget):
                 self.add_change(Change_BLOCK, change_list)
         return table2tsv(block)
 
-    def get_selection(self):
-        """Return the current selection:
-        (number of cells, top row, left column, width, height)
-        """
-        selected = self.selectedRanges()
-        if len(selected) > 1:
-            raise Bug("Multiple selection is not supported")
-        if not selected:
-            return (0, -1, -1, 0, 0)
-        selrange = selected[0]
-        l = selrange.leftColumn()
-        w = selrange.rightColumn() - l + 1
-        t = selrange.topRow()
-        h = selrange.bottomRow() - t + 1
-        return (w * h, t, l, w, h)
-
     def pasteCellFromClipboard(self):
         """Paste text from clipboard into the table.
 
@@ -1060,6 +1091,119 @@ class EdiTableWidget(QTableWidget):
     def is_modified(self):
         return self.__modified
 
+
+class EdiTableWidget(EdiTableBase, QTableWidget):
+    """This adds features to the standard table widget and makes a
+    number of assumptions about the usage – specifically to provide a
+    useful base for a table editor dealing with string data only.
+    Each cell is a <ValidatingWidgetItem>, for large tables
+    <EdiTableView> is more efficient.
+    """
+
+    def __init__(self, parent=None,
+            align_centre = False,
+            on_selection_state_change=None):
+        super().__init__(parent=parent,
+            align_centre=align_centre,
+            on_selection_state_change=on_selection_state_change
+        )
+        self.setItemPrototype(ValidatingWidgetItem())
+
+    def init_data(self, data):
+        """Set the initial table data from a (complete) list of lists
+        of strings.
+        """
+
+        def dummy(*args):  # Don't report data changes
+            pass
+
+        # +
+        self.table_data0 = data
+        rows = len(data)
+        columns = len(data[0])
+        self.init0(rows, columns)
+        # Disable change reporting
+        self.set_change_report(dummy)
+        # Enter data
+        for r in range(rows):
+            for c in range(columns):
+                val = data[r][c]
+                # print("SET", r, c, repr(val))
+                if isinstance(val, str):
+                    item = ValidatingWidgetItem(val)
+                    if self.align_centre:
+                        item.setTextAlignment(Qt.AlignCenter)
+                    self.setItem(r, c, item)
+                else:
+                    raise Bug("Only string data is accepted")
+        # Enable change reporting
+        self.set_change_report()
+
+    def set_validator(self, row, col, f_validate):
+        """Set a validator on the cell at (row, col).
+        This uses the <set_validator> method of the widget item
+        (QTableWidgetItem) at the given position. A <ValidatingWidgetItem>
+        provides this method.
+
+        <f_validate> is a function taking just the value as argument.
+        If this is valid, the function returns <None>. Otherwise it
+        returns an error message.
+        """
+        self.item(row, col).set_validator(f_validate)
+
+    def insertRow(self, row, data=None):  # override
+        ncols = self.columnCount()
+        super().insertRow(row)
+        if data is None:
+            self.add_change(Change_ADD_ROW, row)
+            data = [""] * ncols
+        else:
+            # There should only be data when undoing, so no need to add
+            # a "change".
+            if len(data) != ncols:
+                raise Bug("insertRow: data length doesn't match table width")
+        self.paste_block(row, 0, [data])
+
+    def insertColumn(self, column, data=None):  # override
+        # Consistency check
+        nrows = self.row_count()
+        super().insertColumn(column)
+        if data is None:
+            self.add_change(Change_ADD_COL, column)
+            data = [""] * nrows
+        else:
+            # There should only be data when undoing, so no need to add
+            # a "change".
+            if len(data) != nrows:
+                raise Bug("insertColumn: data length doesn't match table height")
+            self.paste_block(0, column, [[data[row]] for row in range(nrows)])
+
+    def removeRow(self, row):  # override
+        rowdata = [self.get_text(row, col) for col in range(self.columnCount())]
+        super().removeRow(row)
+        self.add_change(Change_DEL_ROW, (row, rowdata))
+
+    def removeColumn(self, column):  # override
+        coldata = [self.get_text(row, column) for row in range(self.rowCount())]
+        super().removeColumn(column)
+        self.add_change(Change_DEL_COL, (column, coldata))
+
+    def get_selection(self):
+        """Return the current selection:
+        (number of cells, top row, left column, width, height)
+        """
+        selected = self.selectedRanges()
+        if len(selected) > 1:
+            raise Bug("Multiple selection is not supported")
+        if not selected:
+            return (0, -1, -1, 0, 0)
+        selrange = selected[0]
+        l = selrange.leftColumn()
+        w = selrange.rightColumn() - l + 1
+        t = selrange.topRow()
+        h = selrange.bottomRow() - t + 1
+        return (w * h, t, l, w, h)
+
     def selectionChanged(self, selected, deselected):
         """Override the slot. The parameters are <QItemSelection> items."""
         super().selectionChanged(selected, deselected)
@@ -1087,6 +1231,433 @@ class EdiTableWidget(QTableWidget):
         super().focusOutEvent(event)
     """
 
+class EdiTableModel(QAbstractTableModel):
+    """The data model for <EdiTableView>. The cell values (strings) are
+    stored as a list of columns, each a list of strings.
+    Validators can be set for whole columns or for single cells.
+    Also the protection (not editable) and the background colour can be
+    set for whole columns.
+    """
+
+    def __init__(self, view):
+        super().__init__()
+        self.view = view
+        self.columns = []
+        self.nrows = 0
+        self.colheaders = None
+        self.rowheaders = None
+        self.align_centre = view.align_centre
+        self.column_validators = {}     # {col: function}
+        self.cell_validators = {}       # {(row, col): function}
+        self.protected_columns = set()
+        self.column_backgrounds = {}    # {col: QBrush}
+        # While a "batch" is active, the changed cells are collected here
+        # and reported together at the end (see <end_batch>).
+        self.batch = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.nrows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole or role == Qt.EditRole:
+            return self.columns[index.column()][index.row()]
+        if role == Qt.TextAlignmentRole:
+            if self.align_centre:
+                return int(Qt.AlignCenter)
+        elif role == Qt.BackgroundRole:
+            return self.column_backgrounds.get(index.column())
+        return None
+
+    def flags(self, index):
+        if index.column() in self.protected_columns:
+            return Qt.ItemIsSelectable | Qt.ItemIsEnabled
+        return Qt.ItemIsSelectable | Qt.ItemIsEnabled | Qt.ItemIsEditable
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            headers = (
+                self.colheaders
+                if orientation == Qt.Horizontal
+                else self.rowheaders
+            )
+            try:
+                return headers[section]
+            except (TypeError, IndexError):
+                return str(section + 1)
+        return super().headerData(section, orientation, role)
+
+    def validate(self, row, col, value):
+        """Return <None> if the value is acceptable, otherwise an error
+        message.
+        """
+        try:
+            f_validate = self.cell_validators[(row, col)]
+        except KeyError:
+            f_validate = self.column_validators.get(col)
+        return f_validate(value) if f_validate else None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole:
+            return False
+        r, c = index.row(), index.column()
+        if self.validate(r, c, value):
+            QMessageBox.warning(
+                self.view,
+                _WARNING,
+                f"{_VALIDATION_ERROR} @({r}, {c}): {value}",
+            )
+            return False
+        column = self.columns[c]
+        v0 = column[r]
+        if v0 == value:
+            return False
+        self.view.cell_value_changed(r, c, value, v0)
+        column[r] = value
+        if self.batch is None:
+            self.dataChanged.emit(index, index)
+        else:
+            self.batch.add((r, c))
+        return True
+
+    def reset_data(self, rows, columns, data=None):
+        """Replace all the data. If <data> is supplied it is a list of
+        rows, each a list of strings.
+        """
+        self.beginResetModel()
+        self.nrows = rows
+        if data:
+            self.columns = [list(col) for col in zip(*data)]
+        else:
+            self.columns = [[""] * rows for c in range(columns)]
+        self.endResetModel()
+
+    def get_block(self, top, left, width, height):
+        """Return the block as a list of rows, each row is a list of
+        cell values.
+        """
+        bottom = top + height
+        return [
+            list(row)
+            for row in zip(
+                *[col[top:bottom] for col in self.columns[left:left + width]]
+            )
+        ]
+
+    def set_block(self, top, left, block):
+        """Write a block of values (list of rows, each a list of strings)
+        to the table, see <set_cells>.
+        """
+        self.set_cells(
+            (top + r, left + c, value)
+            for r, row in enumerate(block)
+            for c, value in enumerate(row)
+        )
+
+    def set_cells(self, cells):
+        """Write a number of cells, <cells> being an iterable of
+        (row, col, value) tuples. Only one data change is reported for
+        the model, covering all changed cells.
+        Values which fail validation are not written (one warning is
+        shown).
+        """
+        bad = None
+        changed = set()
+        for r, c, value in cells:
+            column = self.columns[c]
+            v0 = column[r]
+            if v0 != value:
+                if self.validate(r, c, value):
+                    if not bad:
+                        bad = (r, c, value)
+                else:
+                    self.view.cell_value_changed(r, c, value, v0)
+                    column[r] = value
+                    changed.add((r, c))
+        if self.batch is not None:
+            self.batch |= changed
+        elif changed:
+            rows = [r for r, c in changed]
+            cols = [c for r, c in changed]
+            self.dataChanged.emit(
+                self.index(min(rows), min(cols)),
+                self.index(max(rows), max(cols)),
+            )
+        if bad:
+            QMessageBox.warning(
+                self.view,
+                _WARNING,
+                f"{_VALIDATION_ERROR} @({bad[0]}, {bad[1]}): {bad[2]}",
+            )
+
+    def begin_batch(self):
+        self.batch = set()
+
+    def end_batch(self):
+        """Report the changes since <begin_batch> as a single change of
+        the display. Return the set of changed cells which are still in
+        the table: {(row, col), ... }.
+        """
+        cells, self.batch = self.batch, None
+        ncols = len(self.columns)
+        cells = {(r, c) for r, c in cells if r < self.nrows and c < ncols}
+        if cells:
+            rows = [r for r, c in cells]
+            cols = [c for r, c in cells]
+            self.dataChanged.emit(
+                self.index(min(rows), min(cols)),
+                self.index(max(rows), max(cols)),
+                [Qt.DisplayRole],
+            )
+        return cells
+
+    def insert_rows(self, row, rows):
+        """Insert the given rows (list of lists of strings) before <row>."""
+        self.beginInsertRows(QModelIndex(), row, row + len(rows) - 1)
+        for c, column in enumerate(self.columns):
+            column[row:row] = [r[c] for r in rows]
+        self.nrows += len(rows)
+        self.endInsertRows()
+
+    def remove_rows(self, row, count=1):
+        self.beginRemoveRows(QModelIndex(), row, row + count - 1)
+        for column in self.columns:
+            del column[row:row + count]
+        self.nrows -= count
+        self.endRemoveRows()
+
+    def insert_columns(self, col, columns):
+        """Insert the given columns (list of lists of strings) before
+        <col>.
+        """
+        self.beginInsertColumns(QModelIndex(), col, col + len(columns) - 1)
+        self.columns[col:col] = [list(column) for column in columns]
+        self.endInsertColumns()
+
+    def remove_columns(self, col, count=1):
+        self.beginRemoveColumns(QModelIndex(), col, col + count - 1)
+        del self.columns[col:col + count]
+        self.endRemoveColumns()
+
+
+class EdiTableView(EdiTableBase, QTableView):
+    """A model/view version of <EdiTableWidget> with the same interface,
+    for larger tables. The data is held in an <EdiTableModel>. Rather
+    than setting validators on single cells, they should be set on
+    columns (<set_column_validator>).
+    The signals <cellChanged>, <cellClicked> and <cellDoubleClicked>
+    are provided, as in <QTableWidget>.
+    """
+
+    cellChanged = Signal(int, int)
+    cellClicked = Signal(int, int)
+    cellDoubleClicked = Signal(int, int)
+
+    def __init__(self, parent=None,
+            align_centre = False,
+            on_selection_state_change=None):
+        super().__init__(parent=parent,
+            align_centre=align_centre,
+            on_selection_state_change=on_selection_state_change
+        )
+        self.__model = EdiTableModel(self)
+        self.setModel(self.__model)
+        self.__model.dataChanged.connect(self.__data_changed)
+        self.clicked.connect(
+            lambda ix: self.cellClicked.emit(ix.row(), ix.column())
+        )
+        self.doubleClicked.connect(
+            lambda ix: self.cellDoubleClicked.emit(ix.row(), ix.column())
+        )
+
+    def __data_changed(self, topleft, bottomright, roles=None):
+        if roles and Qt.EditRole not in roles:
+            return  # Not a change of value
+        for r in range(topleft.row(), bottomright.row() + 1):
+            for c in range(topleft.column(), bottomright.column() + 1):
+                self.cellChanged.emit(r, c)
+
+    ### Methods corresponding to those of <QTableWidget>
+
+    def rowCount(self):
+        return self.__model.nrows
+
+    def columnCount(self):
+        return len(self.__model.columns)
+
+    def setRowCount(self, rows):
+        self.__model.reset_data(rows, self.columnCount())
+
+    def setColumnCount(self, columns):
+        self.__model.reset_data(self.rowCount(), columns)
+
+    def setHorizontalHeaderLabels(self, headers):
+        self.__model.colheaders = list(headers)
+        self.__model.headerDataChanged.emit(
+            Qt.Horizontal, 0, len(headers) - 1
+        )
+
+    def setVerticalHeaderLabels(self, headers):
+        self.__model.rowheaders = list(headers)
+        self.__model.headerDataChanged.emit(Qt.Vertical, 0, len(headers) - 1)
+
+    def clearContents(self):
+        self.__model.reset_data(self.rowCount(), self.columnCount())
+
+    ###
+
+    def init_data(self, data):
+        """Set the initial table data from a (complete) list of lists
+        of strings.
+        """
+        self.table_data0 = data
+        rows = len(data)
+        columns = len(data[0])
+        self.init0(rows, columns)
+        self.__model.reset_data(rows, columns, data)
+
+    def begin_batch(self):
+        """Start a sequence of changes which should be shown as a single
+        update of the table, ended by <end_batch>.
+        """
+        self.__model.begin_batch()
+
+    def end_batch(self):
+        for r, c in sorted(self.__model.end_batch()):
+            self.cellChanged.emit(r, c)
+
+    def set_validator(self, row, col, f_validate):
+        """Set a validator on the cell at (row, col).
+        <f_validate> is a function taking just the value as argument.
+        If this is valid, the function returns <None>. Otherwise it
+        returns an error message.
+        """
+        self.__model.cell_validators[(row, col)] = f_validate
+
+    def set_column_validator(self, col, f_validate):
+        """Set a validator for all cells of the given column, see
+        <set_validator>.
+        """
+        self.__model.column_validators[col] = f_validate
+
+    def set_column_editable(self, col, editable):
+        if editable:
+            self.__model.protected_columns.discard(col)
+        else:
+            self.__model.protected_columns.add(col)
+
+    def set_column_background(self, col, brush=None):
+        """Set the background of the given column (a <QBrush>). If no
+        brush is supplied, the default background is used.
+        """
+        if brush is None:
+            self.__model.column_backgrounds.pop(col, None)
+        else:
+            self.__model.column_backgrounds[col] = brush
+        self.__model.dataChanged.emit(
+            self.__model.index(0, col),
+            self.__model.index(self.rowCount() - 1, col),
+            [Qt.BackgroundRole],
+        )
+
+    def set_cells(self, cells):
+        """Write a number of cells: <cells> is an iterable of
+        (row, col, text) tuples.
+        """
+        self.__model.set_cells(cells)
+
+    def read_block(self, top, left, width, height):
+        """Read a block of data from the table.
+        Return list of rows, each row is a list of cell values.
+        """
+        if width == 0 or height == 0:
+            raise Bug("Can't read block with no dimensions")
+        return self.__model.get_block(top, left, width, height)
+
+    def paste_block(self, top, left, block):
+        """The block must be a list of lists of strings."""
+
+        def gather(chtype, change):
+            if chtype != Change_CELL:
+                raise Bug("Pasting block should only cause cell changes")
+            change_list.append(change)
+
+        # +
+        change_list = []
+        self.set_change_report(gather)
+        self.__model.set_block(top, left, block)
+        self.set_change_report()
+        # Report changes as a list – only cells which actually changed
+        if change_list:
+            if len(change_list) == 1:
+                self.add_change(Change_CELL, change_list[0])
+            else:
+                self.add_change(Change_BLOCK, change_list)
+
+    def insertRow(self, row, data=None):
+        ncols = self.columnCount()
+        if data is None:
+            self.add_change(Change_ADD_ROW, row)
+            data = [""] * ncols
+        else:
+            # There should only be data when undoing, so no need to add
+            # a "change".
+            if len(data) != ncols:
+                raise Bug("insertRow: data length doesn't match table width")
+        self.__model.insert_rows(row, [data])
+        self.set_modified(True)
+
+    def insertColumn(self, column, data=None):
+        nrows = self.rowCount()
+        if data is None:
+            self.add_change(Change_ADD_COL, column)
+            data = [""] * nrows
+        else:
+            # There should only be data when undoing, so no need to add
+            # a "change".
+            if len(data) != nrows:
+                raise Bug("insertColumn: data length doesn't match table height")
+        self.__model.insert_columns(column, [data])
+        self.set_modified(True)
+
+    def removeRow(self, row):
+        rowdata = self.__model.get_block(row, 0, self.columnCount(), 1)[0]
+        self.__model.remove_rows(row)
+        self.add_change(Change_DEL_ROW, (row, rowdata))
+        self.set_modified(True)
+
+    def removeColumn(self, column):
+        coldata = list(self.__model.columns[column])
+        self.__model.remove_columns(column)
+        self.add_change(Change_DEL_COL, (column, coldata))
+        self.set_modified(True)
+
+    def get_selection(self):
+        """Return the current selection:
+        (number of cells, top row, left column, width, height)
+        """
+        selected = self.selectionModel().selection()
+        if len(selected) > 1:
+            raise Bug("Multiple selection is not supported")
+        if len(selected) == 0:
+            return (0, -1, -1, 0, 0)
+        selrange = selected[0]
+        l = selrange.left()
+        w = selrange.right() - l + 1
+        t = selrange.top()
+        h = selrange.bottom() - t + 1
+        return (w * h, t, l, w, h)
+
+    def selectionChanged(self, selected, deselected):
+        """Override the slot. The parameters are <QItemSelection> items."""
+        super().selectionChanged(selected, deselected)
+        sel = self.selectionModel().hasSelection()
+        if sel != self.has_selection:
+            self.has_selection = sel
+            self.on_selection_state_change(sel)
+
 
 '''
 # This is just for testing purposes. The approach using <ValidatingWidgetItem>
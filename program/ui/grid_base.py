@@ -1,7 +1,7 @@
 """
 ui/grid_base.py
 
-Last updated:  2023-01-22
+Last updated:  2026-10-19
 
 Base functions for table-grids using the QGraphicsView framework.
 
@@ -60,6 +60,10 @@ TITLE_MARGIN = 15  # Left & right title margin (points)
 # FONT_DEFAULT = "Droid Sans"
 FONT_DEFAULT = ""   # use system default
 FONT_COLOUR = "442222"  # rrggbb
+# Grids with more cells than this are "virtual" (see <GridPainter>).
+# This is well above the size of the grade table of a class.
+VIRTUAL_GRID_CELLS = 20000
+TEXT_LAYOUT_CACHE_SIZE = 10000  # max. number of cached text layouts
 
 #####################################################
 
@@ -80,6 +84,8 @@ T = TRANSLATIONS("ui.grid_base")
 
 ### +++++
 
+from bisect import bisect_left, bisect_right
+
 from tables.table_utilities import (
     TSV2Table,
     Table2TSV,
@@ -92,6 +98,7 @@ from ui.ui_base import (
     QApplication,
     QGraphicsView,
     QGraphicsScene,
+    QGraphicsItem,
     QGraphicsItemGroup,
     QGraphicsRectItem,
     QGraphicsSimpleTextItem,
@@ -99,6 +106,7 @@ from ui.ui_base import (
     QMenu,
     ## QtGui
     QFont,
+    QFontMetricsF,
     QPen,
     QColor,
     QBrush,
@@ -205,6 +213,80 @@ class StyleCache:
         return font
 
 
+class LayoutCache:
+    """Manage a cache for the fitting of cell texts in the virtual grid
+    (see <GridPainter>). A text is measured only once for a given font
+    and cell geometry, however often it is painted.
+    """
+
+    __layouts = {}  # cache for layouts
+    __metrics = {}  # cache for QFontMetricsF items
+
+    @classmethod
+    def metrics(cls, font: QFont) -> QFontMetricsF:
+        fkey = font.key()
+        try:
+            return cls.__metrics[fkey]
+        except KeyError:
+            pass
+        fm = QFontMetricsF(font)
+        cls.__metrics[fkey] = fm
+        return fm
+
+    @classmethod
+    def layout(
+        cls,
+        font: QFont,
+        text: str,
+        width: float,
+        height: float,
+        rotated: bool = False,
+        margin: int = 3,
+        no_scale: bool = False,
+    ) -> tuple[str, float, float, float, float]:
+        """Fit the text to a cell in the same way as <Tile.set_text>.
+        Return (displayed text, scale factor, width, height, ascent).
+        The width and height are those of the area covered by the
+        (possibly scaled and rotated) text, the ascent is unscaled.
+        """
+        key = (font.key(), text, width, height, rotated, margin, no_scale)
+        try:
+            return cls.__layouts[key]
+        except KeyError:
+            pass
+        if len(cls.__layouts) >= TEXT_LAYOUT_CACHE_SIZE:
+            cls.__layouts.clear()
+        fm = cls.metrics(font)
+        w = fm.horizontalAdvance(text)
+        h = fm.height()
+        scale = 1
+        if text:
+            maxw = width - margin * 2
+            maxh = height - margin * 2
+            if rotated:
+                # The text runs along the height of the cell
+                maxw, maxh = maxh, maxw
+            if w > maxw:
+                scale = maxw / w
+            if h > maxh:
+                _scale = maxh / h
+                if _scale < scale:
+                    scale = _scale
+            if scale < 0.6:
+                text = "###"
+                w = fm.horizontalAdvance(text)
+                scale = maxw / w
+            if no_scale or scale > 1:
+                scale = 1
+        w *= scale
+        h *= scale
+        if rotated:
+            w, h = h, w
+        result = (text, scale, w, h, fm.ascent())
+        cls.__layouts[key] = result
+        return result
+
+
 class Selection(QGraphicsRectItem):
     """A rectangle covering one or more cells."""
 
@@ -277,6 +359,10 @@ class GridView(QGraphicsView):
 
     def __init__(self):
         self._scale = 1.0
+        # The grid is only set up by <init>, until then it is empty
+        self.grid_painter = None    # only set for virtual grids
+        self.xmarks = [0]
+        self.ymarks = [0]
         super().__init__()
         # Change update mode: The default, MinimalViewportUpdate, seems
         # to cause artefacts to be left, i.e. it updates too little.
@@ -358,7 +444,7 @@ class GridView(QGraphicsView):
         #        self.end_cell = None
         # print("POS:", point, self.mapToGlobal(point), self.itemAt(point))
         # The sought <Tile> may not be the top item.
-        items = self.items(point)
+        items = self.items_at(point)
         if items and event.button() == Qt.LeftButton:
             # Only a grid cell is "selectable"
             for item in items:
@@ -378,7 +464,7 @@ class GridView(QGraphicsView):
         except:
             point = event.pos()
         # print("MOVE TEST", point - self.point0)
-        items = self.items(point)
+        items = self.items_at(point)
         # Act only if the topmost selectable cell has changed
         for item in items:
             try:
@@ -403,7 +489,7 @@ class GridView(QGraphicsView):
         if self.select.is_active():
             # print("§?§?§?§?§ SELECT ACTIVE:", self.select.range())
             return
-        items = self.items(point)
+        items = self.items_at(point)
         if items:
             for item in items:
                 # Find the topmost <Tile> which responds to a click
@@ -424,7 +510,7 @@ class GridView(QGraphicsView):
         except:
             point = event.pos()  # Qt5
             pointf = QPointF(point)
-        items = self.items(point)
+        items = self.items_at(point)
         clear = True
         if items:
             for item in items:
@@ -443,6 +529,35 @@ class GridView(QGraphicsView):
         if clear:
             self.select.clear()
 
+    def items_at(self, point):
+        """Return the items at the given view position, topmost first.
+        In a virtual grid, the <GridPainter> is replaced by the
+        <GridCell> under the position.
+        """
+        items = self.items(point)
+        painter = self.grid_painter
+        if painter is None:
+            return items
+        for i, item in enumerate(items):
+            if item is painter:
+                cell = self.cell_at(self.mapToScene(point))
+                if cell is None:
+                    del items[i]
+                else:
+                    items[i] = cell
+                break
+        return items
+
+    def cell_at(self, scene_pointf):
+        """Return the grid cell at the given scene position, <None> if
+        the position is outside the grid.
+        """
+        r = bisect_right(self.ymarks, scene_pointf.y()) - 1
+        c = bisect_right(self.xmarks, scene_pointf.x()) - 1
+        if 0 <= r < len(self.ymarks) - 1 and 0 <= c < len(self.xmarks) - 1:
+            return self.get_cell((r, c))
+        return None
+
     def cell_modified(self, row_col):
         print("CELL MODIFIED:", row_col)
 
@@ -465,12 +580,18 @@ class GridView(QGraphicsView):
 
     ### ---------------
 
-    def init(self, rowheights, columnwidths, suppress_grid=False):
+    def init(self, rowheights, columnwidths, suppress_grid=False,
+        virtual=None
+    ):
         """Set the grid size.
             <columnwidths>: a list of column widths (points)
             <rowheights>: a list of row heights (points)
         Rows and columns are 0-indexed.
         The widths/heights include grid lines and other bounding boxes.
+        If <virtual> is true, the grid cells are not separate graphics
+        items, but they are all painted by a single <GridPainter>. This
+        keeps large tables fast. If it is <None>, grids with more than
+        VIRTUAL_GRID_CELLS cells are virtual.
         """
         self.border_width = self.pt2px(BORDER_WIDTH)
         self.thick_line_width = self.pt2px(THICK_LINE_WIDTH)
@@ -497,10 +618,23 @@ class GridView(QGraphicsView):
         self.grid_xpt, self.grid_ypt = (xpt, ypt)
 
         # Construct grid
+        self.grid_painter = None
+        if virtual is None:
+            virtual = (
+                len(rowheights) * len(columnwidths) > VIRTUAL_GRID_CELLS
+            )
         if suppress_grid:
             #?
             self.rows = None
             self.grid_group = None
+        elif virtual:
+            # The cells are created only when they are accessed
+            self.rows = [
+                [None] * len(columnwidths) for rx in range(len(rowheights))
+            ]
+            self.grid_painter = GridPainter(self)
+            self.grid_group = self.grid_painter
+            scene.addItem(self.grid_painter)
         else:
             row_list = []
             self.rows = row_list
@@ -680,7 +814,13 @@ class GridView(QGraphicsView):
         return t
 
     def get_cell(self, cellrc):
-        return self.rows[cellrc[0]][cellrc[1]]
+        r, c = cellrc
+        cell = self.rows[r][c]
+        if cell is None:
+            # Virtual grid, create the cell on demand
+            cell = GridCell(self.grid_painter, r, c)
+            self.rows[r][c] = cell
+        return cell
 
     ### pdf output
 
@@ -1110,6 +1250,204 @@ class Tile(QGraphicsRectItem):
         self.textItem.setPos(xshift, yshift)
 
 
+class GridCell:
+    """A cell of a virtual grid. It has the same interface as a grid
+    <Tile>, but it is not a graphics item, it only holds the cell data.
+    Painting is done by the <GridPainter> covering the whole grid,
+    which only handles the cells in the exposed area.
+    """
+
+    __slots__ = (
+        "painter", "row", "col", "properties",
+        "bg", "fg", "halign", "valign", "rotated",
+    )
+
+    def __init__(self, painter, row, col):
+        self.painter = painter
+        self.row = row
+        self.col = col
+        self.properties = {"ROW_COL": (row, col), "VALUE": ""}
+        self.bg = None
+        self.fg = FONT_COLOUR
+        self.halign = "c"
+        self.valign = "m"
+        self.rotated = False
+
+    def rect(self) -> QRectF:
+        xmarks = self.painter.grid.xmarks
+        ymarks = self.painter.grid.ymarks
+        x = xmarks[self.col]
+        y = ymarks[self.row]
+        return QRectF(
+            x, y, xmarks[self.col + 1] - x, ymarks[self.row + 1] - y
+        )
+
+    def scenePos(self) -> QPointF:
+        return QPointF(
+            self.painter.grid.xmarks[self.col],
+            self.painter.grid.ymarks[self.row],
+        )
+
+    def text(self) -> str:
+        """Return the text to be displayed."""
+        try:
+            delegate = self.properties["DELEGATE"]
+        except KeyError:
+            return self.properties["VALUE"]
+        return delegate(self.properties)
+
+    def update(self):
+        self.painter.update(self.rect())
+
+    def on_left_click(self):
+        try:
+            editor = self.properties["EDITOR"]
+        except KeyError:
+            return None
+        point = self.painter.grid.screen_coordinates(self.scenePos())
+        if editor.activate(point, self.properties):
+            self.update()
+            # Return the data needed for handling changes to this cell
+            return self.properties
+        return None
+
+    def on_context_menu(self):
+        """See <Tile.on_context_menu>."""
+        try:
+            handler = self.properties["CONTEXT_MENU"]
+        except KeyError:
+            return True
+        point = self.painter.grid.screen_coordinates(self.scenePos())
+        handler(point, self.properties)
+        return True
+
+    def set_property(self, key, value):
+        self.properties[key] = value
+
+    def get_property(self, key):
+        try:
+            return self.properties[key]
+        except KeyError:
+            raise KeyError(f"TILE_NO_PROPERTY: {key}")
+
+    def set_background(self, colour):
+        self.bg = colour
+        self.update()
+
+    def set_textcolour(self, colour):
+        self.fg = colour
+        self.update()
+
+    def set_halign(self, halign):
+        self.halign = halign
+        self.update()
+
+    def set_valign(self, valign):
+        self.valign = valign
+        self.update()
+
+    def set_verticaltext(self, rot90=True):
+        self.rotated = rot90
+        self.update()
+
+    def set_text(self, value):
+        if type(value) == str:
+            self.properties["VALUE"] = value
+        elif value is not None:
+            raise ValueError(T["NOT_STRING"].format(val=repr(value)))
+        self.update()
+
+
+class GridPainter(QGraphicsItem):
+    """A single graphics item for the grid lines and all the cells of a
+    virtual grid (see <GridView.init>).
+    Only the cells in the exposed area are painted, the text layouts
+    are cached (see <LayoutCache>). Thus the cost of building, scrolling
+    and editing the grid doesn't depend (much) on the number of cells.
+    """
+
+    def __init__(self, grid):
+        super().__init__()
+        self.grid = grid
+        self.font = StyleCache.getFont()
+        self.__rect = QRectF(0, 0, grid.grid_width, grid.grid_height)
+        # Without this, the exposed rectangle is always the whole item
+        self.setFlag(self.ItemUsesExtendedStyleOption, True)
+
+    def boundingRect(self):
+        return self.__rect
+
+    def paint(self, painter, option, widget=None):
+        xmarks = self.grid.xmarks
+        ymarks = self.grid.ymarks
+        rows = self.grid.rows
+        exposed = option.exposedRect
+        # The range of (at least partially) exposed cells
+        c0 = max(bisect_right(xmarks, exposed.left()) - 1, 0)
+        c1 = min(bisect_left(xmarks, exposed.right()), len(xmarks) - 1)
+        r0 = max(bisect_right(ymarks, exposed.top()) - 1, 0)
+        r1 = min(bisect_left(ymarks, exposed.bottom()), len(ymarks) - 1)
+        if c0 >= c1 or r0 >= r1:
+            return
+        painter.setFont(self.font)
+        nopen = StyleCache.getPen(0)
+        for r in range(r0, r1):
+            row = rows[r]
+            y = ymarks[r]
+            h = ymarks[r + 1] - y
+            for c in range(c0, c1):
+                cell = row[c]
+                if cell is None:
+                    continue
+                x = xmarks[c]
+                w = xmarks[c + 1] - x
+                if cell.bg:
+                    painter.setPen(nopen)
+                    painter.setBrush(StyleCache.getBrush(cell.bg))
+                    painter.drawRect(QRectF(x, y, w, h))
+                text = cell.text()
+                if not text:
+                    continue
+                margin = cell.properties.get("MARGIN") or 3
+                text, scale, tw, th, ascent = LayoutCache.layout(
+                    self.font, text, w, h,
+                    rotated=cell.rotated,
+                    margin=margin,
+                    no_scale=bool(cell.properties.get("NO_SCALE")),
+                )
+                if cell.halign == "l":
+                    xshift = margin
+                elif cell.halign == "r":
+                    xshift = w - margin - tw
+                else:
+                    xshift = (w - tw) / 2
+                yshift = th if cell.rotated else 0
+                if cell.valign == "t":
+                    yshift += margin
+                elif cell.valign == "b":
+                    yshift += h - margin - th
+                else:
+                    yshift += (h - th) / 2
+                painter.save()
+                painter.setClipRect(QRectF(x, y, w, h))
+                painter.translate(x + xshift, y + yshift)
+                if cell.rotated:
+                    painter.rotate(-90)
+                if scale != 1:
+                    painter.scale(scale, scale)
+                painter.setPen(StyleCache.getPen(1, cell.fg))
+                painter.drawText(QPointF(0, ascent), text)
+                painter.restore()
+        # The grid lines
+        painter.setPen(StyleCache.getPen(self.grid.border_width, GRID_COLOUR))
+        x0, x1 = xmarks[c0], xmarks[c1]
+        y0, y1 = ymarks[r0], ymarks[r1]
+        for x in xmarks[c0:c1 + 1]:
+            painter.drawLine(QPointF(x, y0), QPointF(x, y1))
+        for y in ymarks[r0:r1 + 1]:
+            painter.drawLine(QPointF(x0, y), QPointF(x1, y))
+
+
 # --#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
 
 if __name__ == "__main__":
@@ -1,13 +1,24 @@
+# The pages of the main window. The modules are only imported when a
+# page is first entered (see <ui.ui_base.LazyPage>).
+PAGES = (
+    # (module, page class, translation section)
+#    ("attendance", "AttendanceEditor", "ui.modules.attendance"),
+    ("year_manager", "ManageYears", "ui.modules.year_manager"),
+    ("pupils_manager", "ManagePupils", "ui.modules.pupils_manager"),
+    ("classes_manager", "Classes", "ui.modules.classes"),
+    ("teachers_manager", "Teachers", "ui.modules.teachers"),
+    ("course_editor", "CourseEditorPage", "ui.modules.course_editor"),
+    ("grades_manager", "ManageGrades", "ui.modules.grades_manager"),
+    ("timetable_editor", "TimetableEditor", "ui.modules.timetable_editor"),
+)
+
 try:
     standalone = STANDALONE
 except NameError:
     standalone = False
 if not standalone:
-#    from .attendance import init; init()
-    from .year_manager import init; init()
-    from .pupils_manager import init; init()
-    from .classes_manager import init; init()
-    from .teachers_manager import init; init()
-    from .course_editor import init; init()
-    from .grades_manager import init; init()
-    from .timetable_editor import init; init()
+    from ui.ui_base import LazyPage
+    for module, page_class, tr_section in PAGES:
+        MAIN_WIDGET.add_tab(
+            LazyPage(f"ui.modules.{module}", page_class, tr_section)
+        )
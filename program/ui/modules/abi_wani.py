@@ -1,7 +1,7 @@
 """
 ui/abi_wani.py
 
-Last updated:  2023-04-25
+Last updated:  2026-10-19
 
 A "Page" for editing Abitur grades in a Waldorf school in Niedersachsen.
 
@@ -64,6 +64,8 @@ from ui.ui_base import (
     QListWidget,
     QAbstractItemView,
     QCheckBox,
+    QDialog,
+    QTextEdit,
     # QtCore
     Qt,
     QDate,
@@ -84,6 +86,7 @@ from grades.grades_base import (
     UpdatePupilGrades,
 )
 from grades.make_grade_reports import MakeGroupReports
+from local.abi_wani_calc import abi_what_if, outcome_text
 
 ### -----
 
@@ -191,6 +194,10 @@ class AbiturManager(QWidget):
         make_cert = QPushButton(T["Make_Certificate"])
         make_cert.clicked.connect(self.make_certificate)
         vboxr.addWidget(make_cert)
+        vboxr.addSpacing(10)
+        what_if = QPushButton(T["What_If"])
+        what_if.clicked.connect(self.what_if)
+        vboxr.addWidget(what_if)
 
     def cell_changed(self, properties: dict):
         if not self.current_pid:
@@ -359,6 +366,78 @@ class AbiturManager(QWidget):
             clean_folder=False,
         )
 
+    def what_if(self):
+        """Show the outcomes which are possible with the pending oral
+        examinations, for all pupils in the group.
+        """
+        for sdata in self.grade_table["COLUMNS"]["CALCULATE"]:
+            if sdata["FUNCTION"] == "ABITUR_NIWA_RESULT":
+                fhs_subjects = sdata["PARAMETERS"]["FHS"]
+                break
+        else:
+            REPORT(
+                "ERROR",
+                T["NO_ABI_CALC"].format(
+                    group=self.grade_table["CLASS_GROUP"]
+                )
+            )
+            return
+        results = abi_what_if(
+            [gdata for pdata, gdata in self.pupil_data_list], fhs_subjects
+        )
+        html = []
+        for (pdata, gdata), result in zip(self.pupil_data_list, results):
+            html.append(f"<h3>{pupil_name(pdata)}</h3>")
+            if result is None:
+                html.append(f"<p>{T['WHAT_IF_NONE']}</p>")
+                continue
+            html.append(
+                "<p>{}</p>".format(
+                    T["WHAT_IF_CURRENT"].format(
+                        result=outcome_text(result.current())
+                    )
+                )
+            )
+            rows = [
+                f"<tr><th>{T['WHAT_IF_RESULT']}</th>"
+                f"<th align='left'>{T['WHAT_IF_GRADES']}</th></tr>"
+            ]
+            for score, combis in result.thresholds():
+                grades = " | ".join(
+                    " + ".join(
+                        f"{gdata[f'S{i}']}: {g:02d}"
+                        for i, g in combi.items()
+                    )
+                    for combi in combis
+                )
+                rows.append(
+                    f"<tr><td>{outcome_text(score)}</td>"
+                    f"<td>{grades}</td></tr>"
+                )
+            html.append(f"<table cellpadding='3'>{''.join(rows)}</table>")
+        WhatIfDialog(
+            T["WHAT_IF_TITLE"].format(group=self.grade_table["CLASS_GROUP"]),
+            "".join(html),
+        )
+
+
+def WhatIfDialog(title, html):
+    td = QDialog()
+    td.setWindowTitle(title)
+    td.resize(800, 600)
+    vbox = QVBoxLayout(td)
+    text = QTextEdit()
+    text.setReadOnly(True)
+    text.setHtml(html)
+    vbox.addWidget(text)
+    bbox = QHBoxLayout()
+    vbox.addLayout(bbox)
+    bbox.addStretch(1)
+    close = QPushButton(T["Close"])
+    close.clicked.connect(td.accept)
+    bbox.addWidget(close)
+    td.exec_()
+
 
 class AbiturGradeView(GridView):
     def setup(self, callback):
@@ -1,7 +1,7 @@
 """
 ui/modules/attendance.py
 
-Last updated:  2021-12-21
+Last updated:  2026-10-19
 
 Manage attendance tables.
 
@@ -35,19 +35,10 @@ The data files can also be used outside of their school year, but then
 no changing of the basic paramaters is (easily) possible. To enable this
 feature, the pupil list and calendar data must be saved in the data file.
 
-The data stored in the files conmprises the following elements:
- - the last month of the school-year, YYYY-MM
- - the klass
- - a mapping of table entries: {
-        pupil-id: {
-            "__NAME__": pupil-name (short form),
-            date ("yyyy-mm-dd"): entry,
-            ... (further dates)
-            "yyyy-mm-A": total number of A-entries (as string),
-            "yyyy-mm-V": total number of V-entries (as string)
-        },
-        ...
-    }
+The data for a class is kept in an <AttendanceData> instance (see
+<template_engine.attendance>): an array of entry codes, pupils × months
+× days. The table shows one month of this array, changes are passed
+directly to the array, which is saved as a binary file.
 """
 
 _NAME = "Anwesenheit"
@@ -174,13 +165,13 @@ APP.setStyleSheet("QAbstractItemView { activate-on-singleclick: 0; }")
 from core.base import Dates
 from core.pupils import Pupils
 
-from ui.editable import EdiTableWidget
+from ui.editable import EdiTableView
 from ui.grid0 import GridViewRescaling as GridView
 #from ui.grid0 import GridViewHFit as GridView
 from ui.grid0 import GraphicsSupport
 
 from template_engine.attendance import Table, pupil_list, \
-        get_month_data, _ATTENDANCE, attendanceData, \
+        get_month_data, _ATTENDANCE, AttendanceData, \
         attendanceTable, analyse_attendance
 
 class AttendanceError(Exception):
@@ -215,7 +206,7 @@ class AttendanceTables(Page):
         )
         if outfile:
 
-            pupilnames = pupil_list(Pupils(), klass)
+            pupilnames = pupil_list(klass)
 #    pupilnames = [
 #        ("001", "Fritz Blume"),
 #        ("002", "Melanie Dreher"),
@@ -274,26 +265,22 @@ class Choice(QDialog):
         super().reject()
 
 
-class AttendanceTable(EdiTableWidget):
+class AttendanceTable(EdiTableView):
     def activated(self, row, col):
         # This is called when a cell is left-clicked with Ctrl pressed
         # or when the (single) selected cell has "Return/Newline" pressed
         # together with Ctrl.
 #        v = ListSelect("?", "???", options)
-        item = self.item(row, col)
-        if item.flags() & Qt.ItemIsEditable:
+        model = self.model()
+        if model.flags(model.index(row, col)) & Qt.ItemIsEditable:
             v = Choice.choice(parent=self, x=None, y=None)
             if v is not None:
                 self.set_text(row, col, v)
 
-# Wouldn't this need to be passed to the AttendanceEditor class?
     def cell_changed(self, r, c):
         if self._active:
-
-            text = self.get_text(r, c)
-#TODO
-            print("$CHANGED$", r, c, text)
-# Convert r, c to pid + date
+            # Pass the change on to the backing data
+            self.parent().set_entry(r, c, self.get_text(r, c))
 
 
 
@@ -500,22 +487,25 @@ class AttendanceEditor(Page):
         self.pupilnames = []
         row_headers = []
         if not pupildata:
-            pupildata = attendanceData(klass) or {}
-        self.pupilmap = {}
+            pupildata = AttendanceData.load(klass) or AttendanceData(klass)
+        self.attendance = pupildata
         for pdata in pupils:
             pid, pname = pdata["PID"], pdata.name()
-            self.pupilmap[pid] = pupildata.get(pid) or {}
             self.pupilnames.append((pid, pname))
             row_headers.append(pname)
             row += 1
+        # The rows of the data array must match those of the table
+        self.attendance.set_pupils([pid for pid, pname in self.pupilnames])
+        # The modification status is managed here, the table's status
+        # only covers the current month.
         self.table.setup(
             colheaders=TCOLS,
             rowheaders=row_headers,
             undo_redo=True,
             cut=True,
             paste=True,
-            on_changed=self.modified,
         )
+        self.modified(False)
         self.table.resizeColumnsToContents()
 # It seems pretty impossible to get the screen dimensions of the
 # underlying table. So maybe the best way to proceed is to remember the
@@ -526,35 +516,33 @@ class AttendanceEditor(Page):
 
     def switch_month(self, month):
 # Save old data? Not if doing updates on backing data?
-        print(f"MONTH: {month:02}")
-        for md in self.month_data:
+        for i, md in enumerate(self.month_data):
             if md[0] == month:
-                col_colour, dates = md[3:5]
+                col_colour = md[3]
+                self.month_index = i
                 break
         else:
             raise Bug
         self.table._active = False
-        self.table.init_sparse_data(len(self.pupilmap), 31, [])
-        row = 0
-        for pid, pupil_data in self.pupilmap.items():
-            col = 0
-            for colour in col_colour:
-#TODO: Move some of the details to editable.py?
-                item = self.table.item(row, col)
+        # Entries on days which are not school days are not shown
+        rows = self.attendance.month_entries(self.month_index)
+        for entries in rows:
+            for col, colour in enumerate(col_colour):
                 if colour:
-                    item.setFlags(item.flags() & ~ Qt.ItemIsEditable)
-                    item.setBackground(GraphicsSupport.getBrush(colour))
-                else:
-                    item.setFlags(item.flags() | Qt.ItemIsEditable)
-                    item.setBackground(GraphicsSupport.getBrush())
-                    text = pupil_data.get(dates[col])
-                    if text:
-                        self.table.set_text(row, col, text)
-                col += 1
-            row += 1
+                    entries[col] = ""
+        self.table.init_data(rows)
+        for col, colour in enumerate(col_colour):
+            self.table.set_column_editable(col, not colour)
+            self.table.set_column_background(col,
+                    GraphicsSupport.getBrush(colour) if colour else None)
         self.table._active = True
         return True
 
+    def set_entry(self, row, col, text):
+        """Called when a cell of the table has been changed."""
+        if self.attendance.set(row, self.month_index, col, text):
+            self.modified(True)
+
 #deprecated ...
     def open_file(self, filepath):
         """Read in the attendance table (json) for a class from the
@@ -599,7 +587,9 @@ class AttendanceEditor(Page):
             self.open_file(ofile)
 
     def on_save(self):
-        print("TODO – SAVE")
+        self.attendance.save()
+        self.table.reset_modified()
+        self.modified(False)
 
     def on_save_as(self):
         print("TODO – SAVE AS")
@@ -610,7 +600,7 @@ class AttendanceEditor(Page):
             self.month1,
             self.klass,
             self.pupilnames,
-            self.pupilmap,
+            self.attendance.pupilmap(self.month_data),
             self.month_colours
         )
         dialog.exec()
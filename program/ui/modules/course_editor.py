@@ -1,7 +1,7 @@
 """
 ui/modules/course_editor.py
 
-Last updated:  2022-10-28
+Last updated:  2026-10-19
 
 Edit course and blocks+lessons data.
 
@@ -65,6 +65,7 @@ from core.basic_data import (
     sublessons,
     get_simultaneous_weighting,
 )
+from timetable.activity_model import tags_changed
 
 from ui.ui_base import (
     HLine,
@@ -449,6 +450,7 @@ class CourseEditor(QSplitter):
             # Clean up LESSONS table
             for tag in tags:
                 clean_lessons_table(tag)
+            tags_changed(*tags)
 
             # Select a new row
             if row >= model.rowCount():
@@ -549,6 +551,7 @@ class CourseEditor(QSplitter):
         if model.insertRecord(-1, record) and model.submitAll():
             # lid = model.query().lastInsertId()
             # print("INSERTED:", lid, model.rowCount())
+            tags_changed(tag)
             self.blocktable.selectRow(n)
         else:
             SHOW_ERROR(f"DB Error: {model.lastError().text()}")
@@ -592,6 +595,7 @@ class CourseEditor(QSplitter):
         if model.insertRecord(-1, record) and model.submitAll():
             # lid = model.query().lastInsertId()
             # print("INSERTED:", lid, model.rowCount())
+            tags_changed(tag)
             self.blocktable.selectRow(n)
         else:
             SHOW_ERROR(f"DB Error: {model.lastError().text()}")
@@ -647,6 +651,7 @@ class CourseEditor(QSplitter):
             # If there are no other lesson-blocks sharing the lesson-tag,
             # remove any sublessons
             clean_lessons_table(lesson_tag)
+            tags_changed(lesson_tag)
 
 
 def clean_lessons_table(tag=None):
@@ -735,6 +740,7 @@ class BlockLesson(QWidget):
         self.block_id = record.value("id")
         self.course_id = record.value("course")
         block_tag = record.value("LESSON_TAG")
+        self.block_tag = block_tag
         self.editors["PAYMENT"].setText(record.value("PAYMENT"))
         self.editors["ROOM"].setText(record.value("ROOM"))
         edb = self.editors["Block_subject"]
@@ -772,6 +778,7 @@ class BlockLesson(QWidget):
             SHOW_ERROR(T["BLOCK_TAG_CLASH"].format(tag=tag))
             return False
         db_update_field("BLOCKS", "LESSON_TAG", tag, id=self.block_id)
+        tags_changed(self.block_tag, tag)
         self.main_widget.redisplay()
         ### After a redisplay of the main widget it would be superfluous
         ### for a callback handler to update its cell, so <False> is
@@ -780,6 +787,7 @@ class BlockLesson(QWidget):
 
     def room_changed(self, text):
         db_update_field("BLOCKS", "ROOM", text, id=self.block_id)
+        tags_changed(self.block_tag)
         self.main_widget.redisplay()
         return False
 
@@ -790,6 +798,7 @@ class BlockLesson(QWidget):
 
     def length_changed(self, row, new_value):
         sublesson_id = int(self.lesson_table.item(row, 0).text())
+        tags_changed(self.block_tag)
         return db_update_field("LESSONS", "LENGTH", new_value, id=sublesson_id)
 
     def time_changed(self, row, new_value):
@@ -819,6 +828,7 @@ class BlockLesson(QWidget):
                         TAG=tag
                     )
         if db_update_field("LESSONS", "TIME", tag, id=sublesson_id):
+            tags_changed(self.block_tag)
             return new_value
         return None
 
@@ -831,6 +841,7 @@ class BlockLesson(QWidget):
         editor = self.editors["Block_subject"]
         block_tag = editor.get_block()
         db_new_row("LESSONS", TAG=block_tag, LENGTH=length, TIME="")
+        tags_changed(block_tag)
         self.show_sublessons(block_tag)
 
     def block_del(self):
@@ -838,6 +849,7 @@ class BlockLesson(QWidget):
         if row >= 0:
             sublesson_id = int(self.lesson_table.item(row, 0).text())
             db_delete_rows("LESSONS", id=sublesson_id)
+            tags_changed(self.block_tag)
             editor = self.editors["Block_subject"]
             block_tag = editor.get_block()
             self.show_sublessons(block_tag)
@@ -1005,6 +1017,7 @@ class CourseEditorForm(QDialog):
             val = self.editors[f].text()
             model.setData(model.index(row, col), val)
         if model.submitAll():
+            tags_changed(*db_values("BLOCKS", "LESSON_TAG", course=course))
             # The selection is lost – the changed row may even be in a
             # different place, perhaps not even displayed.
             # Try to stay with the same id, if it is displayed,
@@ -1,7 +1,7 @@
 """
 ui/modules/grades_manager.py
 
-Last updated:  2023-07-06
+Last updated:  2026-10-19
 
 Front-end for managing grade reports.
 
@@ -60,12 +60,15 @@ T = TRANSLATIONS("ui.modules.grades_manager")
 
 ### +++++
 
+import os
+
 from core.db_access import open_database, db_values
 from core.base import class_group_split, Dates
 from core.basic_data import check_group
 from core.pupils import pupils_in_group, pupil_name
 from grades.grades_base import (
     GetGradeConfig,
+    get_occasions_groups,
     MakeGradeTable,
     FullGradeTable,
     FullGradeTableUpdate,
@@ -75,6 +78,8 @@ from grades.grades_base import (
     NO_GRADE,
 )
 from grades.make_grade_reports import MakeGroupReports, report_name
+from grades.report_jobs import report_day
+from tables.grid_pdf import GridTable, export_grids
 
 from ui.ui_base import (
     QWidget,
@@ -278,6 +283,9 @@ class GradeManager(QWidget):
         make_pdf = QPushButton(T["Export_PDF"])
         make_pdf.clicked.connect(self.pupil_data_table.export_pdf)
         vboxr.addWidget(make_pdf)
+        make_pdf_all = QPushButton(T["Export_PDF_ALL"])
+        make_pdf_all.clicked.connect(self.do_export_all)
+        vboxr.addWidget(make_pdf_all)
         vboxr.addSpacing(20)
 
         # TODO: read input tables,
@@ -305,6 +313,9 @@ class GradeManager(QWidget):
         pb_make_reports = QPushButton(T["DO_MAKE_REPORTS"])
         pb_make_reports.clicked.connect(self.do_make_reports)
         gblayout.addWidget(pb_make_reports)
+        pb_make_all_reports = QPushButton(T["DO_MAKE_ALL_REPORTS"])
+        pb_make_all_reports.clicked.connect(self.do_make_all_reports)
+        gblayout.addWidget(pb_make_all_reports)
 
     def init_data(self):
         self.suppress_callbacks = True
@@ -466,6 +477,24 @@ class GradeManager(QWidget):
             # Reload table
             self.select_instance()
 
+    def do_export_all(self):
+        """Export the grade tables of all class-groups for the current
+        "occasion" to a single pdf-file.
+        """
+        fpath = SAVE_FILE(
+            "pdf-Datei (*.pdf)",
+            f'{T["GRADES"]}_{self.occasion}.pdf'.replace(" ", "_")
+        )
+        if not fpath:
+            return
+        fpath = PROCESS(
+            export_grade_tables,
+            title=T["Export_PDF_ALL"],
+            occasion=self.occasion,
+            fpath=fpath,
+        )
+        REPORT("INFO", T["SAVED"].format(path=fpath))
+
     def do_make_input_table(self):
         table_data = self.pupil_data_table.grade_table
         xlsx_bytes = MakeGradeTable(table_data)
@@ -516,8 +545,23 @@ class GradeManager(QWidget):
                 fname = mgr.group_file_name()
 #TODO: save dialog
                 fpath = DATAPATH(f"GRADES/{fname}")
-                mgr.join_pdfs(fpath)
-                REPORT("INFO", f"Saved: {mgr.join_pdfs(fpath)}")
+                fpath = mgr.join_pdfs(fpath)
+                REPORT("INFO", T["SAVED"].format(path=fpath))
+
+    def do_make_all_reports(self):
+        """Make all the documents for the current "occasion" (see
+        <report_jobs.report_day>), the date of issue is taken from the
+        current grade table.
+        """
+        results = PROCESS(
+            report_day,
+            title=T["MAKE_ALL_REPORTS"],
+            occasion=self.occasion,
+            date=self.pupil_data_table.grade_table["DATE_ISSUE"],
+        )
+        REPORT("INFO", T["ALL_REPORTS_DONE"].format(
+            occasion=self.occasion, n=len(results)
+        ))
 
 
 class GradeTableView(GridViewAuto):
@@ -534,85 +578,20 @@ class GradeTableView(GridViewAuto):
         click_handler = []  # set the editor function for each column
         column_widths = []  # as it says ...
         column_headers = [] # [(sid, name),  ... ]
-        # Customized "extra-field" widths
-        custom_widths = GetGradeConfig().get("EXTRA_FIELD_WIDTHS")
         grade_click_handler = CellEditorTable(grade_config_table)
         date_click_handler = CellEditorDate(empty_ok=True)
-        ## Deal with the column types separately
-        # Collect column widths, colours, headers and click-handlers
-        column_data = grade_table["COLUMNS"]
-        for sdata in column_data["SUBJECT"]:
+        for ctype, sdata, width, colour in grade_table_columns(grade_table):
             column_headers.append((sdata["SID"], sdata["NAME"]))
-            column_widths.append(GRADETABLE_SUBJECTWIDTH)
-            if "COMPOSITE" in sdata:
-                col2colour.append(COMPONENT_COLOUR)
+            column_widths.append(width)
+            col2colour.append(colour)
+            if ctype == "SUBJECT":
                 click_handler.append(grade_click_handler)
-            else:
-                col2colour.append(None)
-                click_handler.append(grade_click_handler)
-        for sdata in column_data["COMPOSITE"]:
-            column_headers.append((sdata["SID"], sdata["NAME"]))
-            column_widths.append(GRADETABLE_SUBJECTWIDTH)
-            col2colour.append(COMPOSITE_COLOUR)
-            click_handler.append(None)
-        for sdata in column_data["CALCULATE"]:
-            column_headers.append((sdata["SID"], sdata["NAME"]))
-            try:
-                column_widths.append(int(custom_widths[sdata["SID"]]))
-            except KeyError:
-                column_widths.append(GRADETABLE_EXTRAWIDTH)
-            except ValueError:
-                REPORT(
-                    "ERROR",
-                    T["BAD_CUSTOM_WIDTH"].format(
-                        sid = sdata["SID"],
-                        path=GetGradeConfig()["__PATH__"],
-                    )
-                )
-                column_widths.append(GRADETABLE_EXTRAWIDTH)
-            col2colour.append(CALCULATED_COLOUR)
-            click_handler.append(None)
-        for sdata in column_data["INPUT"]:
-            column_headers.append((sdata["SID"], sdata["NAME"]))
-            try:
-                column_widths.append(int(custom_widths[sdata["SID"]]))
-            except KeyError:
-                column_widths.append(GRADETABLE_EXTRAWIDTH)
-            except ValueError:
-                REPORT(
-                    "ERROR",
-                    T["BAD_CUSTOM_WIDTH"].format(
-                        sid = sdata["SID"],
-                        path=GetGradeConfig()["__PATH__"],
-                    )
+            elif ctype == "INPUT":
+                click_handler.append(
+                    self.input_editor(grade_table, sdata, date_click_handler)
                 )
-                column_widths.append(GRADETABLE_EXTRAWIDTH)
-            method = sdata["METHOD"]
-            parms = sdata["PARAMETERS"]
-            if method == "CHOICE":
-                values = [[[v], ""] for v in parms["CHOICES"]]
-                editor = CellEditorTable(values)
-            elif method == "CHOICE_MAP":
-                values = [[[v], text] for v, text in parms["CHOICES"]]
-                editor = CellEditorTable(values)
-            elif method == "TEXT":
-                editor = CellEditorText()
-            elif method == "DATE":
-                editor = date_click_handler
             else:
-                REPORT(
-                    "ERROR",
-                    T["UNKNOWN_INPUT_METHOD"].format(
-                        path=GetGradeConfig()["__PATH__"],
-                        group=grade_table["CLASS_GROUP"],
-                        occasion=grade_table["OCCASION"],
-                        sid=sdata["SID"],
-                        method=method
-                    )
-                )
-                editor = None
-            col2colour.append(None)
-            click_handler.append(editor)
+                click_handler.append(None)
         __rows = (GRADETABLE_HEADERHEIGHT,) + (GRADETABLE_ROWHEIGHT,) * len(
             pupils_list
         )
@@ -686,6 +665,32 @@ class GradeTableView(GridViewAuto):
 
         self.rescale()
 
+    def input_editor(self, grade_table, sdata, date_click_handler):
+        """Return the editor for an "INPUT" column."""
+        method = sdata["METHOD"]
+        parms = sdata["PARAMETERS"]
+        if method == "CHOICE":
+            values = [[[v], ""] for v in parms["CHOICES"]]
+            return CellEditorTable(values)
+        if method == "CHOICE_MAP":
+            values = [[[v], text] for v, text in parms["CHOICES"]]
+            return CellEditorTable(values)
+        if method == "TEXT":
+            return CellEditorText()
+        if method == "DATE":
+            return date_click_handler
+        REPORT(
+            "ERROR",
+            T["UNKNOWN_INPUT_METHOD"].format(
+                path=GetGradeConfig()["__PATH__"],
+                group=grade_table["CLASS_GROUP"],
+                occasion=grade_table["OCCASION"],
+                sid=sdata["SID"],
+                method=method
+            )
+        )
+        return None
+
     def cell_modified(self, properties: dict):
         """Override base method in grid_base.GridView.
         A single cell is to be written.
@@ -761,7 +766,11 @@ class GradeTableView(GridViewAuto):
         if changes:
             # Update changed display cells
             for sid, oldval in changes:
-                self.get_cell((row, self.sid2col[sid])).set_text(grades[sid])
+                try:
+                    col = self.sid2col[sid]
+                except KeyError:
+                    continue
+                self.get_cell((row, col)).set_text(grades[sid])
 
     def export_pdf(self, fpath=None):
         titleheight = self.pt2px(GRADETABLE_TITLEHEIGHT)
@@ -821,6 +830,130 @@ class GradeTableView(GridViewAuto):
             self.delete_item(item)
 
 
+def grade_table_columns(grade_table):
+    """Collect the display data for the columns of a grade table.
+    Return a list of (column type, column data, width, colour) tuples.
+    """
+    columns = []
+    # Customized "extra-field" widths
+    custom_widths = GetGradeConfig().get("EXTRA_FIELD_WIDTHS")
+
+    def extra_width(sdata):
+        try:
+            return int(custom_widths[sdata["SID"]])
+        except KeyError:
+            return GRADETABLE_EXTRAWIDTH
+        except ValueError:
+            REPORT(
+                "ERROR",
+                T["BAD_CUSTOM_WIDTH"].format(
+                    sid = sdata["SID"],
+                    path=GetGradeConfig()["__PATH__"],
+                )
+            )
+            return GRADETABLE_EXTRAWIDTH
+
+    ## Deal with the column types separately
+    column_data = grade_table["COLUMNS"]
+    for sdata in column_data["SUBJECT"]:
+        colour = COMPONENT_COLOUR if "COMPOSITE" in sdata else None
+        columns.append(("SUBJECT", sdata, GRADETABLE_SUBJECTWIDTH, colour))
+    for sdata in column_data["COMPOSITE"]:
+        columns.append(
+            ("COMPOSITE", sdata, GRADETABLE_SUBJECTWIDTH, COMPOSITE_COLOUR)
+        )
+    for sdata in column_data["CALCULATE"]:
+        columns.append(
+            ("CALCULATE", sdata, extra_width(sdata), CALCULATED_COLOUR)
+        )
+    for sdata in column_data["INPUT"]:
+        columns.append(("INPUT", sdata, extra_width(sdata), None))
+    return columns
+
+
+def grade_grid_table(grade_table) -> GridTable:
+    """Build the printable form of a grade table (as produced by
+    <GradeTableView.export_pdf>) without a widget.
+    """
+    columns = grade_table_columns(grade_table)
+    pupils_list = grade_table["PUPIL_LIST"]
+    table = GridTable(
+        (GRADETABLE_HEADERHEIGHT,)
+        + (GRADETABLE_ROWHEIGHT,) * len(pupils_list),
+        [GRADETABLE_PUPILWIDTH, GRADETABLE_LEVELWIDTH]
+        + [c[2] for c in columns],
+        titleheight=GRADETABLE_TITLEHEIGHT,
+        footerheight=GRADETABLE_FOOTERHEIGHT,
+    )
+    table.line_v(2)
+    table.line_h(1)
+    hheaders = dict(GetGradeConfig()["HEADERS"])
+    table.set_cell(0, 0, hheaders["PUPIL"])
+    table.set_cell(0, 1, hheaders["LEVEL"])
+    for col, (ctype, sdata, width, colour) in enumerate(columns, start=2):
+        table.set_cell(
+            0, col, sdata["NAME"], bg=colour, valign="b", rotated=True
+        )
+    for row, (pdata, pgrades) in enumerate(pupils_list, start=1):
+        table.set_cell(row, 0, pupil_name(pdata), halign="l")
+        table.set_cell(row, 1, pdata["LEVEL"])
+        for col, (ctype, sdata, width, colour) in enumerate(
+            columns, start=2
+        ):
+            table.set_cell(
+                row, col, pgrades.get(sdata["SID"], NO_GRADE), bg=colour
+            )
+    ## Titles and footers
+    info_fields = dict(GetGradeConfig()["INFO_FIELDS"])
+    t_offset = -GRADETABLE_TITLEHEIGHT / 2
+    table.set_title(
+        f'{info_fields["CLASS_GROUP"]}: {grade_table["CLASS_GROUP"]}',
+        t_offset,
+        halign="l",
+        font_scale=1.2,
+    )
+    occasion = grade_table["OCCASION"]
+    if grade_table["INSTANCE"]:
+        occasion = f'{occasion}: {grade_table["INSTANCE"]}'
+    table.set_title(occasion, t_offset, halign="c")
+    table.set_title(grade_table["DATE_ISSUE"], t_offset, halign="r")
+    f_offset = GRADETABLE_FOOTERHEIGHT / 2
+    table.set_title(
+        f'{info_fields["DATE_GRADES"]}: {grade_table["DATE_GRADES"]}',
+        f_offset,
+        halign="l",
+    )
+    table.set_title(
+        f'{info_fields["MODIFIED"]}: {grade_table["MODIFIED"]}',
+        f_offset,
+        halign="r",
+    )
+    return table
+
+
+def export_grade_tables(occasion: str, fpath: str) -> str:
+    """Save the grade tables of all class-groups for the given "occasion"
+    to a single pdf-file. Only the class-groups without "instances" are
+    included. The tables are rendered in parallel worker processes,
+    without building any widgets.
+    Return the path of the saved file.
+    """
+    tables = []
+    for class_group, group_data in get_occasions_groups()[occasion].items():
+        if "INSTANCE" in group_data:
+            continue
+        REPORT("INFO", T["EXPORT_GROUP"].format(group=class_group))
+        grade_table = FullGradeTable(occasion, class_group, "")
+        tables.append(grade_grid_table(grade_table))
+    if not fpath.endswith(".pdf"):
+        fpath += ".pdf"
+    pdfbytes = export_grids(tables)
+    os.makedirs(os.path.dirname(fpath), exist_ok=True)
+    with open(fpath, "wb") as fh:
+        fh.write(pdfbytes)
+    return fpath
+
+
 # --#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
 
 if __name__ == "__main__":
@@ -1,7 +1,7 @@
 """
 ui/modules/timetable_editor.py
 
-Last updated:  2022-08-29
+Last updated:  2026-10-19
 
 Show a timetable grid and allow placement of lesson tiles.
 
@@ -56,20 +56,17 @@ T = TRANSLATIONS("ui.modules.timetable_editor")
 
 ### +++++
 
-from typing import NamedTuple
-
 from ui.modules.timetable_gui import GridViewRescaling, GridPeriodsDays
 from core.db_access import open_database
 from core.basic_data import (
     get_days,
     get_periods,
     get_classes,
-    get_sublessons,
-    get_subjects,
-    timeslot2index
+    get_rooms,
 )
-from core.classes import class_divisions
-from timetable.activities import Courses, filter_roomlists
+from timetable.activity_model import get_activity_model
+from timetable.occupancy import Occupancy, lesson_slot
+from timetable.room_allocation import RoomAllocator
 from ui.ui_base import (
     QHBoxLayout,
     QVBoxLayout,
@@ -82,10 +79,18 @@ from ui.ui_base import (
     QTableWidgetItem,
     QTableView,
     QMenu,
+    ## QtCore
+    Qt,
 )
 
 ### -----
 
+# Background colours (rrggbb) for the "possible placements" display
+SLOT_FREE_COLOUR = "c0f0c0"
+SLOT_PENALTY_COLOUR = "f0f0a0"
+SLOT_CLASH_COLOURS = ("f0d0a0", "f0b080", "f08060")
+SLOT_BLOCKED_COLOUR = "c0c0c0"
+
 def init():
     MAIN_WIDGET.add_tab(TimetableEditor())
 
@@ -141,6 +146,17 @@ class TimetableEditor(Page):
     def enter(self):
 #TODO
         open_database()
+        try:
+            timetable = self.timetable
+        except AttributeError:
+            pass
+        else:
+            # Only the changes since the last visit need to be handled
+            timetable.update()
+            klass = self.list1.currentItem()
+            if klass:
+                self.change_class(klass.text())
+            return
 
         self.TT_CONFIG = MINION(DATAPATH("CONFIG/TIMETABLE"))
         days = get_days().key_list()
@@ -150,6 +166,8 @@ class TimetableEditor(Page):
         self.grid_view.setScene(self.grid)
 
         self.timetable = Timetable(self)
+        self.grid.slot_finder = self.timetable.seek_slots
+        self.grid.tile_moved = self.timetable.tile_moved
 
         self.init_data()
 
@@ -162,6 +180,7 @@ class TimetableEditor(Page):
     def change_class(self, klass):
 #TODO
         print("§§§ SELECT CLASS:", klass)
+        self.grid.clear_highlights()
         self.grid.remove_tiles()
         self.timetable.show_class(klass)
 
@@ -180,145 +199,106 @@ class TimetableEditor(Page):
 # removal?
 
 
-#class BlockInfo(NamedTuple):
-#    course: CourseData
-#    block: BlockTag
-#    rooms: list[str]
-#    payment_data: PaymentData
-#    notes: str
-#
-#class Sublesson(NamedTuple):
-#    id: int
-#    TAG: str
-#    LENGTH: int
-#    TIME: str
-#    ROOMS: str
-
-class Activity(NamedTuple):
-    sid: str
-    subject: str
-    tag: str
-    classgroups: list[tuple[str,set[str],set[str]]]
-    roomlists: list[list[str]]
-    alltids: set[str]
-
-    def __str__(self):
-        rooms = []
-        for rl in self.roomlists:
-            rooms.append('|'.join(rl))
-        cg = [
-            f"{k}:{','.join(gs)}/{','.join(gr) or '-'}"
-            for k, gs, gr in self.classgroups
-        ]
-        return (
-            f"<Activity {self.tag}: {self.sid} ({self.subject})"
-            f" {'|'.join(sorted(cg))}"
-            f" // {','.join(sorted(self.alltids))}"
-            f" [{'&'.join(rooms)}]>"
-#?
-#            f"\n ??? {self.roomlists}"
-        )
-
-
 class Timetable:
+    """Manage the display of the timetable for a class, using the shared
+    <ActivityModel>, which is only updated by "diff" after changes in
+    the course editor. The occupancy index is also only updated for the
+    changed activities.
+    """
     def __init__(self, gui):
         self.gui = gui
-
-# Do these structures really need to be retained? Couldn't they be
-# temporarily fetched at the point of use?
-        self.courses = Courses()
-        # {block-tag -> [Sublesson, ... ]}
-        self.tag2lessons = get_sublessons()     # not resetting cache
-        self.subjects = get_subjects()
-
-    def gather_info(self):
-        activity_list = []
-        tag2activity_index = {}
-        self.activity_list = activity_list
-        self.tag2activity_index = tag2activity_index
-        classes = get_classes()
-        for tag, infolist in self.courses.tag2entries.items():
-            info_ = infolist[0]
-            sid = info_.block.sid or info_.course.sid
-            name = self.subjects.map(sid)
-            a_classes = {}      # {class: {group, ...}} for the activity
-            alltids = set()     # tids for the activity as a whole
-            allroomlists = []   # rooms for the activity as a whole
-            for info_ in infolist:
-                tid_ = info_.course.tid
-                if tid_ != "--":
-                    alltids.add(tid_)
-                klass = info_.course.klass
-                group = info_.course.group
-
-                # Everything in this list should be related to some
-                # timetabled activity.
-                # The class can be '--', the group can be empty.
-                # Group '*' means "whole class".
-                # If class is '--', group must be empty (but that may
-                # have been checked earlier).
-
-                if group and klass != "--":
-                    if group == '*':
-                        a_classes[klass] = None
-                    else:
-                        try:
-                            a_classes[klass].add(group)
-                        except KeyError:
-                            # no entry for class yet
-                            a_classes[klass] = {group}
-                        except AttributeError:
-                            # whole class already entered
-                            pass
-                if info_.rooms:
-                    allroomlists.append(info_.rooms)
-            class_groups = []
-            for k in sorted(a_classes):
-                gset = a_classes[k]
-                if gset:
-                    ginfo = classes.group_info(k)
-                    chipdata = class_divisions(
-                        gset,
-                        ginfo["GROUP_MAP"],
-                        ginfo["INDEPENDENT_DIVISIONS"]
-                    )
-                    class_groups.append(
-                        (k, chipdata.basic_groups, chipdata.rest_groups)
-                    )
-                else:
-                    class_groups.append((k, {'*'}, set()))
-            try:
-                room_lists = filter_roomlists(allroomlists)
-            except ValueError:
-                SHOW_ERROR(
-                    T["BLOCK_ROOM_CONFLICT"].format(
-                        klass=klass,
-                        sid=sid,
-                        tag=tag,
-                        rooms=repr(allroomlists),
-                    ),
-                )
-                room_lists = [['+']]
-            activity = Activity(
-                sid=sid,
-                subject=name,
-                tag=tag,
-                classgroups=class_groups,
-                roomlists=room_lists,
-                alltids=alltids,
+        self.model, changed = get_activity_model()
+        # [lesson-id, ... ] for the tiles of the displayed class
+        self.tile_lessons = []
+        # The room conflicts already reported (see <update_rooms>)
+        self.room_conflicts = set()
+        self.build_occupancy()
+
+    def update(self):
+        """Fetch pending changes to the activity model and apply them
+        to the occupancy index and the room allocation.
+        Return the set of changed block-tags.
+        """
+        self.model, changed = get_activity_model()
+        for tag in changed:
+            ix = self.model.tag2activity_index[tag]
+            for lid in self.occupancy.activity_lessons.get(ix) or []:
+                self.rooms.remove_lesson(lid)
+            self.occupancy.reset_activity(ix, self.model.activity_list[ix])
+            self.add_lessons(tag, ix)
+        self.update_rooms()
+        return changed
+
+    def build_occupancy(self):
+        """Build the index of occupied slots and the room allocation
+        for all lessons of the activities in the model.
+        """
+        ndays, nperiods = len(get_days()), len(get_periods())
+        self.occupancy = Occupancy(ndays, nperiods, self.model.activity_list)
+        self.rooms = RoomAllocator(ndays, nperiods, get_rooms().key_list())
+        for tag, ix in self.model.tag2activity_index.items():
+            self.add_lessons(tag, ix)
+        self.update_rooms()
+
+    def add_lessons(self, tag, activity_index):
+        activity = self.model.activity_list[activity_index]
+        for l in self.model.tag2lessons.get(tag) or []:
+            slot = lesson_slot(l)
+            rooms = l.ROOMS.split(",")
+            self.rooms.set_lesson(
+                l.id, activity.roomlists, l.LENGTH, slot, rooms
+            )
+            self.occupancy.add_lesson(
+                l.id, activity_index, l.LENGTH, slot, rooms
             )
-            ix = len(activity_list)
-# --
-            print(f"§ACTIVITY {ix}:", activity)
-            activity_list.append(activity)
-            tag2activity_index[tag] = ix
-#TODO: also need lists for classes and teachers – with specialized
-# entries for groups, teachers and – somehow – rooms (because of the
-# simplification function, this could be a bit tricky).
-
-
-
 
+    def update_rooms(self):
+        """Re-solve the room allocation for the days affected by changes
+        and pass the new allocations to the occupancy index.
+        Return the list of unsatisfiable room requirements.
+        """
+        for lid in self.rooms.solve():
+            self.occupancy.set_rooms(lid, self.rooms.rooms(lid))
+        conflicts = self.rooms.conflicts()
+        # Report only the conflicts which have arisen since the last call
+        keys = {}
+        for c in conflicts:
+            keys[(c.day, c.period, c.lesson_id, tuple(c.roomlist))] = c
+        days, periods = get_days(), get_periods()
+        new = []
+        for k, c in keys.items():
+            if k not in self.room_conflicts:
+                activity = self.model.activity_list[
+                    self.occupancy.lessons[c.lesson_id][0]
+                ]
+                new.append(T["ROOM_CONFLICT"].format(
+                    day=days[c.day][1],
+                    period=periods[c.period][1],
+                    subject=activity.subject,
+                    tag=activity.tag,
+                    rooms="|".join(c.roomlist),
+                ))
+        self.room_conflicts = set(keys)
+        if new:
+            REPORT("WARNING", "\n".join(new))
+        return conflicts
+
+    def seek_slots(self, tile_index):
+        """Return a [day][period] matrix of <SlotInfo> items evaluating
+        the possible placements of the lesson shown by the given tile.
+        """
+        return self.occupancy.seek_slots(self.tile_lessons[tile_index])
+
+    def tile_moved(self, tile_index, cell):
+        """Keep the occupancy index and the room allocation up to date
+        when a tile is placed. <cell> is a (day, period) pair.
+        """
+        lid = self.tile_lessons[tile_index]
+        if self.occupancy.lesson_slot(lid) == cell:
+            return
+        self.occupancy.place(lid, cell)
+        self.rooms.move(lid, cell)
+        self.update_rooms()
 
 #TODO: At the moment this is just a collection of sketches ...
     def sort_groups(self):
@@ -355,197 +335,25 @@ class Timetable:
 # Perhaps it would also be worth considering a bitmap – on a class or
 # division basis.
 
-#TODO: A replacement for show_class?
-    def enter_class(self, klass):
-        grid = self.gui.grid
-        tile_list = self.gui.tile_list
-        tile_list.clearContents()
-#?
-        tiledata = []
-        tiles = []
-        tile_list_hidden = []
-        for a_index in self.klass2activities[klass]:
-            activity = self.activity_list[a_index]
-
-# ... I might want lesson placement info (time and rooms) from a
-# temporary store here, rather than directly from the database.
-            lessons = self.tag2lessons.get(activity.tag)
-            if lessons:
-                for l in lessons:
-                    print("  +++", l)
-
-                    d, p = timeslot2index(l.TIME)
-                    print("   ---", activity.sid, d, p)
-
-                    t_tids = ','.join(activity.tids)
-                    t_groups = '/'.join(activity.groups)
-                    t_rooms = l.ROOMS
-                    tiledata.append( # for the list of tiles, etc.
-                        (
-                            activity.sid,
-                            str(l.LENGTH),
-                            t_groups,
-                            t_tids,
-                            l.id,
-# The room list is probably needed as a list or set ...
-                            t_rooms.split(','),
-
-#?
-                            chipdata.groups,
-                            chipdata.basic_groups,
-                        )
-                    )
-
-                    tile_index = len(tiles)
-                    tile = make_tile(
-                        grid,
-                        tile_index,
-                        duration=l.LENGTH,
-#?
-                        n_parts=chipdata.num,
-                        n_all=chipdata.den,
-                        offset=chipdata.offset,
-
-                        text=activity.sid,
-# Might want to handle the placing of the corners in the configuration?
-# Rooms can perhaps only be added when placed, and even then not always ...
-                        tl=t_tids,
-                        tr=t_groups,
-                        br=t_rooms,
-                    )
-                    tiles.append(tile)
-                    if d >= 0:
-                        grid.place_tile(tile_index, (d, p))
-                        tile_list_hidden.append(True)
-                    else:
-                        tile_list_hidden.append(False)
-            else:
-                print("\nNO LESSONS:", a.tag)
-
-        tile_list.setRowCount(len(tiledata))
-        row = 0
-        for tdata in tiledata:
-            for col in range(4):
-                twi = QTableWidgetItem(tdata[col])
-                tile_list.setItem(row, col, twi)
-            if tile_list_hidden[row]:
-                tile_list.hideRow(row)
-            row += 1
-        tile_list.resizeColumnsToContents()
-        tile_list.resizeRowsToContents()
-        # Toggle the stretch on the last section here because of a
-        # possible bug in Qt, where the stretch can be lost when
-        # repopulating.
-        hh = tile_list.horizontalHeader()
-        hh.setStretchLastSection(False)
-        hh.setStretchLastSection(True)
-
-
-
-
-
     def show_class(self, klass):
+        """Display the tiles of the given class. The class-specific
+        activity data comes from the (cached) model.
+        """
         grid = self.gui.grid
         tile_list = self.gui.tile_list
         tile_list.clearContents()
-        classes = get_classes()
-        group_info = classes.group_info(klass)
-        divisions = group_info["INDEPENDENT_DIVISIONS"]
-        # atoms = group_info["MINIMAL_SUBGROUPS"]
-        group_map = group_info["GROUP_MAP"]
-        # group2atoms = atomic_maps(atoms, list(group_map))
-#TODO: How to calculate tile offsets ... maybe using independent-divisions?
-
-        # {block-tag -> [BlockInfo, ... ]}
-        tag2infolist = self.courses.klass2tags[klass]
-
-        alist = []
-        for tag, infolist in tag2infolist.items():
-            info_ = infolist[0]
-            sid = info_.block.sid or info_.course.sid
-            name = self.subjects.map(sid)
-            activity = Activity_(sid, name, tag)
-
-            # Get tids and room lists (from which to choose)
-            tids_ = set()       # tids for just this class
-            groups_ = set()     # groups for just this class
-            allgroups = set()   # groups for the activity as a whole
-            alltids = set()     # tids for the activity as a whole
-            allroomlists_ = []  # rooms for the activity as a whole
-            # Room info for just this class is not really useful, it is
-            # possible that the actual rooms used for this class cannot
-            # be determined accurately.
-
-            for info_ in infolist:
-                tid_ = info_.course.tid
-                if tid_ != "--":
-                    tids_.add(tid_)
-                if info_.course.group:
-                    groups_.add(info_.course.group)
-            activity.set_tids(sorted(tids_))
-            activity.set_groups(sorted(groups_))
-
-            # For the other stuff, info from all classes is needed
-            for info_ in self.courses.tag2entries[tag]:
-                tid_ = info_.course.tid
-                if tid_ != "--":
-                    alltids.add(tid_)
-                cg = info_.course.class_group()
-                if cg:
-                    allgroups.add(cg)
-                if info_.rooms:
-                    allroomlists_.append(info_.rooms)
-            activity.set_all_tids(alltids)
-            activity.set_all_groups(allgroups)
-#TODO: This was already done for the Activity!
-            activity.set_all_rooms(
-                simplify_room_lists_(allroomlists_, klass, tag)
-            )
-            alist.append(activity)
-# Sort lesson names?
-        alist.sort(key=lambda a: a.subject)
-
         tiledata = []
         tiles = []
         tile_list_hidden = []
-        for a in alist:
-            print("\n§§§", a.groups, a.allgroups, a.tag, a.sid, a.subject, a.tids, a.alltids)
-# a.allgroups is a – possibly unoptimized – set of all groups, with class,
-# and is needed for clash checking. However, if group clash checking is
-# done on a class-by-class basis, I will probably need the groups as in
-# chipdata.basic_groups below, but for each involved class.
-# Perhaps as an ordered list of (class, group-set) pairs.
-
-
-# Shouldn't some of this Activity stuff be done just once for all classes?
-
-            chipdata = class_divisions(
-                    a.groups,
-                    group_map,
-                    divisions
-                )
-# The chipdata stuff covers only the current class
-            print("    GROUPS:", chipdata.groups)
-            print("    SET:", chipdata.basic_groups)
-            print(f"    {chipdata.num}/{chipdata.den} @ {chipdata.offset}")
-
-
-
-# a.alltids is a set of all tids and is needed for clash checking
-
-            print("    ALL ROOMS:", a.roomlists)
-# a.roomlists will be needed for allocating and reallocating rooms
-
-            lessons = self.tag2lessons.get(a.tag)
+        self.tile_lessons.clear()
+        for a in self.model.class_activities(klass):
+            chipdata = a.chipdata
+            lessons = self.model.tag2lessons.get(a.tag)
             if lessons:
+                t_tids = ','.join(a.tids)
+                t_groups = '/'.join(a.groups)
                 for l in lessons:
-                    print("  +++", l)
-
-                    d, p = timeslot2index(l.TIME)
-                    print("   ---", a.sid, d, p)
-
-                    t_tids = ','.join(a.tids)
-                    t_groups = '/'.join(a.groups)
+                    d, p = lesson_slot(l)
                     t_rooms = l.ROOMS
                     tiledata.append( # for the list of tiles, etc.
                         (
@@ -577,6 +385,7 @@ class Timetable:
                         br=t_rooms,
                     )
                     tiles.append(tile)
+                    self.tile_lessons.append(l.id)
                     if d >= 0:
                         grid.place_tile(tile_index, (d, p))
                         tile_list_hidden.append(True)
@@ -603,44 +412,6 @@ class Timetable:
         hh.setStretchLastSection(False)
         hh.setStretchLastSection(True)
 
-#TODO: Will need to consider activities which cover more than one class!
-# Actually, there is one per tag ... or perhaps those details can be
-# left to the lessons/chips?
-# Maybe a subclass ClassActivity for class-specific data?
-class Activity_:
-    __slots__ = (
-        "sid",
-        "subject",
-        "tag",
-        "tids",
-        "groups",
-        "allgroups",
-        "roomlists",
-        "alltids",
-    )
-
-    def __init__(self, sid, subject, tag):
-        self.sid = sid
-        self.subject = subject
-        self.tag = tag
-
-#?
-    def set_tids(self, tids):
-        self.tids = tids
-
-#?
-    def set_groups(self, groups):
-        self.groups = groups
-
-    def set_all_groups(self, groups):
-        self.allgroups = groups
-
-    def set_all_rooms(self, roomlists):
-        self.roomlists = roomlists
-
-    def set_all_tids(self, tids):
-        self.alltids = tids
-
 
 def make_tile(
     grid,
@@ -674,79 +445,91 @@ def make_tile(
     return tile
 
 
-def simplify_room_lists(roomlists):
-    """Simplify room lists, check for room conflicts."""
-    # Collect single room "choices" and remove redundant entries
-    singles = set()
-    while True:
-        extra = False
-        singles1 = set()
-        roomlists1 = []
-        for rl in roomlists:
-            rl1 = [r for r in rl if r not in singles]
-            if rl1:
-                if len(rl1) == 1:
-                    if rl1[0] == '+':
-                        if not extra:
-                            roomlists1.append(rl1)
-                            extra = True
-                    else:
-                        singles1.add(rl1[0])
-                else:
-                    roomlists1.append(rl1)
-            else:
-                raise ValueError
-        if roomlists1 == roomlists:
-            return [[s] for s in sorted(singles)] + roomlists
-        singles.update(singles1)
-        roomlists = roomlists1
-
-
-def simplify_room_lists_(roomlists, klass, tag):
-    """Simplify room lists, check for room conflicts."""
-    # Collect single room "choices" and remove redundant entries
-    singles = set()
-    while True:
-        extra = False
-        singles1 = set()
-        roomlists1 = []
-        for rl in roomlists:
-            rl1 = [r for r in rl if r not in singles]
-            if rl1:
-                if len(rl1) == 1:
-                    if rl1[0] == '+':
-                        if not extra:
-                            roomlists1.append(rl1)
-                            extra = True
-                    else:
-                        singles1.add(rl1[0])
-                else:
-                    roomlists1.append(rl1)
-            else:
-                SHOW_ERROR(
-                    T["BLOCK_ROOM_CONFLICT"].format(
-                        klass=klass,
-                        sid=sid,
-                        tag=tag,
-                        rooms=repr(roomlists),
-                    ),
-                )
-        if roomlists1 == roomlists:
-            return [[s] for s in sorted(singles)] + roomlists
-        singles.update(singles1)
-        roomlists = roomlists1
-
-
 class WeekGrid(GridPeriodsDays):
+    # Callbacks, set by the <TimetableEditor>:
+    slot_finder = None  # tile-tag -> [day][period] matrix of <SlotInfo>
+    tile_moved = None   # (tile-tag, (day, period)) -> None, see <move_tile>
+
     def make_context_menu(self):
         self.context_menu = QMenu()
 #TODO:
         Action = self.context_menu.addAction("Seek possible placements")
         Action.triggered.connect(self.seek_slots)
 
+    move_tag = None     # the tile to be moved by the next left click
+    slot_matrix = None  # the result of <slot_finder> for this tile
+
+    def contextMenuEvent(self, event):
+        # Show the possible placements as soon as a tile is right-clicked
+        for item in self.items(event.scenePos()):
+            try:
+                self.context_tag = item.tag
+            except AttributeError:
+                continue
+            self.seek_slots()
+            break
+        super().contextMenuEvent(event)
+
+    def mousePressEvent(self, event):
+        # While the possible placements of a tile are shown, a left
+        # click on a cell which isn't blocked moves the tile there.
+        # Any other left click ends the display.
+        if self.move_tag is not None and event.button() == Qt.LeftButton:
+            tag = self.move_tag
+            for item in self.items(event.scenePos()):
+                try:
+                    cell = item.cell
+                except AttributeError:
+                    continue
+                d, p = cell
+                if d < 0 or p < 0:
+                    break   # a header cell
+                slot_info = self.slot_matrix[d][p]
+                if slot_info is not None and not slot_info.blocked:
+                    self.clear_highlights()
+                    self.move_tile(tag, cell)
+                    return
+                break
+            self.clear_highlights()
+        super().mousePressEvent(event)
+
+    def move_tile(self, tag, cell):
+        """Move a tile to another cell as a change to the timetable,
+        in contrast to <place_tile>, which only shows it there.
+        """
+        self.place_tile(tag, cell)
+        if self.tile_moved:
+            self.tile_moved(tag, cell)
+
     def seek_slots(self):
-        print("seek_slots:", self.context_tag)
-        #tile = self.tiles[self.context_tag]
+        """Colour the period cells according to the clashes and penalties
+        which would result from placing the context tile there. The
+        tile can then be moved by a left click on a cell.
+        """
+        if not self.slot_finder:
+            return
+        day_slots = self.slot_finder(self.context_tag)
+        self.move_tag = self.context_tag
+        self.slot_matrix = day_slots
+        for d, period_slots in enumerate(day_slots):
+            for p, slot_info in enumerate(period_slots):
+                cell = self.get_cell(p, d)
+                if slot_info is None or slot_info.blocked:
+                    cell.set_background(SLOT_BLOCKED_COLOUR)
+                elif slot_info.clashes:
+                    i = min(slot_info.clashes, len(SLOT_CLASH_COLOURS)) - 1
+                    cell.set_background(SLOT_CLASH_COLOURS[i])
+                elif slot_info.penalty:
+                    cell.set_background(SLOT_PENALTY_COLOUR)
+                else:
+                    cell.set_background(SLOT_FREE_COLOUR)
+
+    def clear_highlights(self):
+        self.move_tag = None
+        self.slot_matrix = None
+        for row in self.cell_matrix:
+            for cell in row:
+                cell.set_background(None)
 
 
 # --#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
@@ -773,8 +556,6 @@ if __name__ == '__main__':
     widget = TimetableEditor()
     widget.enter()
 
-#TODO --
-    widget.timetable.gather_info()
 #    quit(0)
 
     widget.resize(1000, 550)
@@ -80,7 +80,7 @@ from ui.ui_base import (
     QAction,
     APP,
 )
-from ui.editable import EdiTableWidget, table2tsv
+from ui.editable import EdiTableView, table2tsv
 
 # This seems to deactivate activate-on-single-click in filedialog
 # (presumably elsewhere as well?)
@@ -122,7 +122,7 @@ class TsvEditor(QWidget):
         # Build the toolbar
         toolbar = QToolBar()
         vbox.addWidget(toolbar)
-        self.table = EdiTableWidget()
+        self.table = EdiTableView()
         vbox.addWidget(self.table)
 
         toolbar.addAction(self.action_open)
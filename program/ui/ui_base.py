@@ -27,6 +27,7 @@ Copyright 2023 Michael Towers
 #####################################################
 
 import sys, os, locale, builtins, traceback, glob, time
+from importlib import import_module
 
 if __name__ == "__main__":
     import sys, os
@@ -179,6 +180,50 @@ class StackPage(QWidget):
         return False
 
 
+class LazyPage(StackPage):
+    """A stand-in for a page in the main "stack". The module containing
+    the actual page is only imported, and the page built, when the page
+    is first entered. Until then only the tab name and title, which are
+    read from the module's translations, are needed.
+    """
+
+    def __init__(self, module, page_class, tr_section):
+        super().__init__()
+        t = TRANSLATIONS(tr_section)
+        self.name = t["MODULE_NAME"]
+        self.title = t["MODULE_TITLE"]
+        self.module = module
+        self.page_class = page_class
+        self.page = None
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+    def load(self):
+        if self.page is None:
+            m = import_module(self.module)
+            self.page = getattr(m, self.page_class)()
+            self.layout().addWidget(self.page)
+            self.title = self.page.title
+        return self.page
+
+    def enter(self):
+        self.load().enter()
+
+    def leave(self):
+        if self.page is not None:
+            self.page.leave()
+
+    def leave_ok(self):
+        if self.page is None:
+            return True
+        return self.page.leave_ok()
+
+    def is_modified(self):
+        if self.page is None:
+            return False
+        return self.page.is_modified()
+
+
 class StandalonePage(StackPage):
     name = "StandalonePage"
 
@@ -1,7 +1,7 @@
 """
 core/courses.py
 
-Last updated:  2022-03-23
+Last updated:  2026-10-19
 
 Manage course/subject data.
 
@@ -147,6 +147,26 @@ class __SubjectsCache:
         self.__report_sgmap: Dict[Tuple[str, bool], Dict[str, Dict[str, dict]]]
         self.__report_sgmap = {}
 
+        # Indexes built from the report subject data, filled on demand:
+        # Subject lists for class-groups: {(class-group, grades): [(sid, name), ... ]}
+        self.__group_subjects: Dict[Tuple[str, bool], List[Tuple[str, str]]]
+        self.__group_subjects = {}
+        # Subject data for pupils in the same groups (groups as
+        # space-separated string, as in the pupil data):
+        #   {(class, groups, grades): ({sid: subject-data}, [conflict, ... ])}
+        # A conflict is a tuple (sid, group1, group2).
+        self.__groups_subjects: Dict[
+            Tuple[str, str, bool],
+            Tuple[Dict[str, dict], List[Tuple[str, str, str]]],
+        ]
+        self.__groups_subjects = {}
+        # Subject data for individual pupils:
+        #   {(pid, grades): (class, groups, {sid: subject-data})}
+        self.__pupil_subjects: Dict[
+            Tuple[str, bool], Tuple[str, str, Dict[str, dict]]
+        ]
+        self.__pupil_subjects = {}
+
         # Fields:
         self.config = MINION(DATAPATH("CONFIG/SUBJECT_DATA"))
         self.SUBJECT_FIELDS = {row["NAME"]: row["DISPLAY_NAME"]
@@ -328,81 +348,108 @@ class __SubjectsCache:
         klass: str
         group: str
         klass, group = class_group_split(class_group)
-        subjects: List[Tuple[str, str]] = self.report_subjects(klass, grades)
-        sgmap: Dict[str, Dict[str, dict]] = self.report_sgmap(klass, grades)
-        group_data = self.group_info(klass)
-        if group:
-            pgset: Set[str] = group_data.element_groups[group]
-            slist = subjects
-            subjects = []
-            for sid, sname in slist:
-                for sg, sdata in sgmap[sid].items():
-                    if sg == WHOLE_CLASS or (
-                        pgset & group_data.element_groups[sg]
-                    ):
-                        subjects.append((sid, sname))
-                        break
+        subjects: List[Tuple[str, str]] = self.group_subjects(
+            class_group, grades
+        )
         # Get pupil-data list
         plist: List[PupilData] = Pupils().class_pupils(klass, date=date)
         table: List[Tuple[str, str, str, dict]] = []
         for pdata in plist:
             _pgroups: str = pdata["GROUPS"]
-            pgroups: List[str] = _pgroups.split()
-            if group and group not in pgroups:
+            if group and group not in _pgroups.split():
                 # The given group must be explicitly set for the pupil
                 continue
-            pid = pdata["PID"]
             pname = pdata.name()
-            # Determine pupil's minimal group, as far as possible
-            try:
-                pset = frozenset.intersection(
-                    *[group_data.element_groups[pg] for pg in pgroups]
-                )
-            except KeyError:
-                raise CourseError(
-                    _INVALID_PUPIL_GROUPS.format(
-                        klass=klass, pname=pname, groups=_pgroups
-                    )
+            table.append(
+                (
+                    pdata["PID"],
+                    pname,
+                    _pgroups,
+                    self.__pupil_sids(klass, _pgroups, grades, pname),
                 )
-
-            # TODO: include groups for course / pupil???
-            # subject for whole class is certainly valid
-            # for pupil is valid ... if also for subject? Is a conflict possible?
-            # Surely the pupil must be at least as restrictive ...
-            psids: Dict[str, Dict[str, str]] = {}
-            table.append((pid, pname, _pgroups, psids))
-            for sid, gmap in sgmap.items():
-                for g, sdata in gmap.items():
-                    if g == WHOLE_CLASS or (
-                        #                        pgset & group_data.element_groups[g]
-                        pset
-                        & group_data.element_groups[g]
-                    ):
-                        if sid in psids:
-                            # raise CourseError(
-                            REPORT(
-                                "WARNING",
-                                _MULTIPLE_PID_SID.format(
-                                    klass=klass,
-                                    pname=pname,
-                                    sid=sid,
-                                    groups=f"[{psids[sid]['GROUP']}, {g}]",
-                                ),
-                            )
-                        else:
-                            psids[sid] = sdata
+            )
         return subjects, table
 
+    def group_subjects(
+        self, class_group: str, grades: bool = True
+    ) -> List[Tuple[str, str]]:
+        """Return the ordered subject list for the given class-group:
+            [(sid, subject-name), ... ]
+        """
+        try:
+            return self.__group_subjects[(class_group, grades)]
+        except KeyError:
+            pass
+        klass, group = class_group_split(class_group)
+        subjects: List[Tuple[str, str]] = self.report_subjects(klass, grades)
+        if group:
+            sgmap: Dict[str, Dict[str, dict]] = self.report_sgmap(klass, grades)
+            group_data = self.group_info(klass)
+            pgset: Set[str] = group_data.element_groups[group]
+            subjects = [
+                (sid, sname)
+                for sid, sname in subjects
+                if any(
+                    sg == WHOLE_CLASS or (pgset & group_data.element_groups[sg])
+                    for sg in sgmap[sid]
+                )
+            ]
+        self.__group_subjects[(class_group, grades)] = subjects
+        return subjects
+
     def pupil_subjects(self, pid: str, grades: bool = True) -> Dict[str, Dict[str, str]]:
         """Get the subject data for an individual pupil.
+        The result is cached, but it is recalculated if the pupil's class
+        or groups have changed.
         """
         pdata:PupilData = Pupils()[pid]
         _pgroups:str = pdata["GROUPS"]
         klass:str = pdata["CLASS"]
-        sgmap: Dict[str, Dict[str, dict]] = self.report_sgmap(klass, grades)
+        try:
+            k, g, psids = self.__pupil_subjects[(pid, grades)]
+            if k == klass and g == _pgroups:
+                return psids
+        except KeyError:
+            pass
+        psids = self.__pupil_sids(klass, _pgroups, grades, pdata.name())
+        self.__pupil_subjects[(pid, grades)] = (klass, _pgroups, psids)
+        return psids
 
+    def __pupil_sids(
+        self, klass: str, _pgroups: str, grades: bool, pname: str
+    ) -> Dict[str, Dict[str, str]]:
+        """Return the subject data for a pupil in the given class and
+        groups: {sid: subject-data, ... }.
+        All pupils with the same groups get the same mapping, so this is
+        only calculated once for each group combination. Do not modify it!
+        """
+        key = (klass, " ".join(sorted(_pgroups.split())), grades)
+        try:
+            psids, conflicts = self.__groups_subjects[key]
+        except KeyError:
+            psids, conflicts = self.__groups_sids(klass, _pgroups, grades, pname)
+            self.__groups_subjects[key] = (psids, conflicts)
+        for sid, g1, g2 in conflicts:
+            # raise CourseError(
+            REPORT(
+                "WARNING",
+                _MULTIPLE_PID_SID.format(
+                    klass=klass,
+                    pname=pname,
+                    sid=sid,
+                    groups=f"[{g1}, {g2}]",
+                ),
+            )
+        return psids
+
+    def __groups_sids(self, klass, _pgroups, grades, pname):
+        """Calculate the subject data for pupils in the given class and
+        groups, see <__pupil_sids>.
+        Return the subject mapping and a list of conflicts (subjects
+        matching more than one of the pupil's groups).
+        """
+        sgmap: Dict[str, Dict[str, dict]] = self.report_sgmap(klass, grades)
         pgroups: List[str] = _pgroups.split()
-        pname = pdata.name()
         # Determine pupil's minimal group, as far as possible
         group_data = self.group_info(klass)
         try:
@@ -416,7 +463,12 @@ class __SubjectsCache:
                 )
             )
 
+        # TODO: include groups for course / pupil???
+        # subject for whole class is certainly valid
+        # for pupil is valid ... if also for subject? Is a conflict possible?
+        # Surely the pupil must be at least as restrictive ...
         psids: Dict[str, Dict[str, str]] = {}
+        conflicts: List[Tuple[str, str, str]] = []
         for sid, gmap in sgmap.items():
             for g, sdata in gmap.items():
                 if g == WHOLE_CLASS or (
@@ -424,19 +476,10 @@ class __SubjectsCache:
                     & group_data.element_groups[g]
                 ):
                     if sid in psids:
-                        # raise CourseError(
-                        REPORT(
-                            "WARNING",
-                            _MULTIPLE_PID_SID.format(
-                                klass=klass,
-                                pname=pname,
-                                sid=sid,
-                                groups=f"[{psids[sid]['GROUP']}, {g}]",
-                            ),
-                        )
+                        conflicts.append((sid, psids[sid]["GROUP"], g))
                     else:
                         psids[sid] = sdata
-        return psids
+        return psids, conflicts
 
     def check_subject_name(self, sid, name):
         try:
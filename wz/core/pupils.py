@@ -1,5 +1,5 @@
 """
-core/pupils.py - last updated 2022-01-03
+core/pupils.py - last updated 2026-10-19
 
 Manage pupil data.
 
@@ -31,9 +31,19 @@ The info keys are, at present:
     SCHOOLYEAR: '2016' (year in which the end of the school year falls)
     CLASS: '02G' (name of the class)
     __MODIFIED__: <date-time> (not used in code)
+
+To avoid parsing all the class tables whenever the pupil data is loaded,
+the parsed data is also kept in a binary "snapshot" file in the same
+folder. It contains an index (class, modification time and size of the
+source file, position of the data) followed by the data for each class,
+so that all pupils can be loaded with a single read. A class table is
+only parsed again if its file has changed. Saving only writes the
+classes whose data has actually changed.
 """
 
 _TITLE = "Schülerdaten"
+SNAPSHOT_FILE = ".pupils.snapshot"  # in the folder of the class tables
+SNAPSHOT_VERSION = 1
 
 ### Messages
 _SCHOOLYEAR_MISMATCH_DB = "Schüler-Datenbank-Fehler: falsches Jahr in\n{path}"
@@ -46,6 +56,10 @@ _CLASS_MISSING = "In importierten Daten: Klasse fehlt für {name}"
 _FILTER_ERROR = "Schülerdaten-Fehler: {msg}"
 _PID_INVALID = "Ungültige Schülerkennung für {name}: '{pid}'"
 _MISSING_FIELDS = "Diese Felder dürfen nicht leer sein:\n  {fields}"
+_SNAPSHOT_NOT_SAVED = (
+    "Schülerdaten-Schnappschuss konnte nicht gespeichert werden:\n"
+    "  {path}\n  {error}"
+)
 _INVALID_CLASS = (
     "Importierte Schülerdaten: Ungültige Klasse ({klass}),"
     " Zeile\n  {row}\n ... in\n {path}"
@@ -70,6 +84,9 @@ if __name__ == "__main__":
 
 import re
 import tarfile
+import marshal
+import struct
+import hashlib
 from glob import glob
 
 from core.base import Dates
@@ -142,6 +159,87 @@ class PupilData(dict):
         return asciify(f"{_lastname}_{tv}_{self['FIRSTNAME']}")
 
 
+def write_atomic(filepath, data):
+    """Write the <bytes> to the file so that it is replaced in a single
+    step: readers see either the old or the new version, never a partly
+    written one.
+    """
+    folder, name = os.path.split(filepath)
+    tmppath = os.path.join(folder, f".{name}.tmp")
+    with open(tmppath, "wb") as fh:
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmppath, filepath)
+
+
+def read_snapshot(filepath, key):
+    """Read a pupil-data snapshot file.
+    Return a mapping {file-name: SnapshotEntry}. The pupil rows are
+    only unpacked when they are accessed.
+    If the file doesn't exist or doesn't match <key>, return an empty
+    mapping.
+    """
+    try:
+        with open(filepath, "rb") as fh:
+            data = fh.read()
+        n = struct.unpack_from("<I", data)[0]
+        version, _key, index = marshal.loads(data[4:4 + n])
+    except (OSError, EOFError, ValueError, TypeError, struct.error):
+        return {}
+    if version != SNAPSHOT_VERSION or _key != key:
+        return {}
+    data = memoryview(data)[4 + n:]
+    return {
+        fname: SnapshotEntry(mtime, size, klass, data[i:i + l])
+        for fname, (mtime, size, klass, i, l) in index.items()
+    }
+
+
+class SnapshotEntry:
+    """The snapshot data for one class. The pupil rows (tuples of field
+    values) are unpacked on first access to <rows>.
+    """
+    __slots__ = ("mtime", "size", "klass", "__data", "__rows")
+
+    def __init__(self, mtime, size, klass, data=None, rows=None):
+        self.mtime = mtime
+        self.size = size
+        self.klass = klass
+        self.__data = data
+        self.__rows = rows
+
+    @property
+    def rows(self):
+        if self.__rows is None:
+            self.__rows = marshal.loads(self.__data)
+            self.__data = None
+        return self.__rows
+
+    def packed(self):
+        if self.__data is None:
+            return marshal.dumps(self.__rows)
+        return bytes(self.__data)
+
+
+def write_snapshot(filepath, key, entries):
+    """Save the class data in <entries> ({file-name: SnapshotEntry}) as
+    a snapshot file.
+    """
+    index = {}
+    blobs = []
+    i = 0
+    for fname, entry in entries.items():
+        blob = entry.packed()
+        index[fname] = (entry.mtime, entry.size, entry.klass, i, len(blob))
+        blobs.append(blob)
+        i += len(blob)
+    header = marshal.dumps((SNAPSHOT_VERSION, key, index))
+    write_atomic(
+        filepath, struct.pack("<I", len(header)) + header + b"".join(blobs)
+    )
+
+
 def Pupils():
     return __PupilsCache._instance()
 
@@ -203,36 +301,79 @@ class __PupilsCache(dict):
         self.all_fields.update(self.fields)
         # Each class has a table-file (substitute {klass}):
         self.class_path = DATAPATH(CONFIG["PUPIL_TABLE"])
+        folder = os.path.dirname(self.class_path)
+        self.snapshot_path = os.path.join(folder, SNAPSHOT_FILE)
+        # The snapshot is only valid for the current school-year and
+        # field configuration.
+        self.snapshot_key = hashlib.sha1(
+            repr((SCHOOLYEAR, list(self.fields))).encode()
+        ).hexdigest()
+        snapshot = read_snapshot(self.snapshot_path, self.snapshot_key)
+        # {file-name: SnapshotEntry}, as currently on disk
+        self.__snapshot = {}
+        # {class: [row-tuple, ... ]}, the data as last read or saved
+        self.__saved = {}
         for fpath in glob(self.class_path.format(klass="*")):
-            # print("READING", fpath)
-            class_table = read_DataTable(fpath)
-            try:
-                class_table = filter_DataTable(
-                    class_table, config, notranslate=True
+            fname = os.path.basename(fpath)
+            st = os.stat(fpath)
+            entry = snapshot.get(fname)
+            if (
+                entry is None
+                or entry.mtime != st.st_mtime_ns
+                or entry.size != st.st_size
+            ):
+                # print("READING", fpath)
+                klass, rows = self.read_class_table(fpath, config)
+                entry = SnapshotEntry(
+                    st.st_mtime_ns, st.st_size, klass, rows=rows
                 )
-            except TableError as e:
-                raise PupilError(_FILTER_ERROR.format(msg=f"{e} in\n {fpath}"))
-
-            # The data should already be alphabetically ordered here.
-            info = class_table["__INFO__"]
-            if info["SCHOOLYEAR"] != SCHOOLYEAR:
-                raise PupilError(_SCHOOLYEAR_MISMATCH_DB.format(path=fpath))
-            klass = info["CLASS"]
-            if self.class_path.format(klass=klass) != fpath:
-                raise PupilError(_CLASS_MISMATCH_DB.format(path=fpath))
+            self.__snapshot[fname] = entry
+            klass = entry.klass
+            self.__saved[klass] = entry.rows
             pdata_list = []
             self.__classes[klass] = pdata_list
-            for row in class_table["__ROWS__"]:
-                pid = row["PID"]
+            for row in entry.rows:
+                pdata = PupilData(zip(self.fields, row), klass)
+                pid = pdata["PID"]
                 if pid in self:
                     raise PupilError(
                         _DOUBLE_PID_DB.format(
                             pid=pid, k1=self[pid]["CLASS"], k2=klass
                         )
                     )
-                pdata = PupilData(row, klass)
                 self[pid] = pdata
                 pdata_list.append(pdata)
+        if (
+            len(snapshot) != len(self.__snapshot)
+            or any(snapshot.get(f) is not e
+                for f, e in self.__snapshot.items())
+        ):
+            self.save_snapshot()
+
+    def read_class_table(self, fpath, config):
+        """Parse the table-file for a class.
+        Return the class and the list of pupil rows (tuples of the field
+        values).
+        """
+        class_table = read_DataTable(fpath)
+        try:
+            class_table = filter_DataTable(
+                class_table, config, notranslate=True
+            )
+        except TableError as e:
+            raise PupilError(_FILTER_ERROR.format(msg=f"{e} in\n {fpath}"))
+
+        # The data should already be alphabetically ordered here.
+        info = class_table["__INFO__"]
+        if info["SCHOOLYEAR"] != SCHOOLYEAR:
+            raise PupilError(_SCHOOLYEAR_MISMATCH_DB.format(path=fpath))
+        klass = info["CLASS"]
+        if self.class_path.format(klass=klass) != fpath:
+            raise PupilError(_CLASS_MISMATCH_DB.format(path=fpath))
+        return klass, [
+            tuple(row.get(f) or "" for f in self.fields)
+            for row in class_table["__ROWS__"]
+        ]
 
     def classes(self):
         """Return a sorted list of class names."""
@@ -292,9 +433,24 @@ class __PupilsCache(dict):
     def save(self, klass=None):
         """Save the data for the pupils in the given class to the
         pupil-database. If no class is supplied, save all classes.
+        Only the tables of classes whose data has changed are written.
         The first save of a day causes the current data (all classes) to
         be backed up.
         """
+        if klass:
+            classes = [klass]
+        else:
+            classes = self.classes()
+        changed = {}
+        for k in classes:
+            rows = [
+                tuple(pdata.get(f) or "" for f in self.fields)
+                for pdata in self.__classes[k]
+            ]
+            if rows != self.__saved.get(k):
+                changed[k] = rows
+        if not changed:
+            return
         timestamp = Dates.timestamp()
         today = timestamp.split("_", 1)[0]
         folder = os.path.dirname(self.class_path)
@@ -310,18 +466,36 @@ class __PupilsCache(dict):
             tar.close()
             # TODO: Remove older backups?
             print(f"BACKED UP @ {bufile}")
-        if klass:
-            classes = [klass]
-        else:
-            classes = self.classes()
-        for k in classes:
+        for k, rows in changed.items():
+            fpath = self.class_path.format(klass=k)
             self.save_data(
                 k,
                 self.__classes[k],
-                self.class_path.format(klass=k),
+                fpath,
                 SCHOOLYEAR,
                 timestamp,
             )
+            self.__saved[k] = rows
+            st = os.stat(fpath)
+            self.__snapshot[os.path.basename(fpath)] = SnapshotEntry(
+                st.st_mtime_ns, st.st_size, k, rows=rows
+            )
+        self.save_snapshot()
+
+    def save_snapshot(self):
+        """Write the snapshot file. As this is only a cache, failure
+        (e.g. in a read-only data folder) is reported as a warning and
+        otherwise ignored.
+        """
+        try:
+            write_snapshot(
+                self.snapshot_path, self.snapshot_key, self.__snapshot
+            )
+        except OSError as e:
+            REPORT(
+                "WARNING",
+                _SNAPSHOT_NOT_SAVED.format(path=self.snapshot_path, error=e),
+            )
 
     def save_data(
         self, klass, pupil_list, filepath, schoolyear, timestamp=None
@@ -338,9 +512,7 @@ class __PupilsCache(dict):
             },
             "__ROWS__": pupil_list,
         }
-        tsvbytes = make_DataTable(data, "tsv")
-        with open(filepath, "wb") as fh:
-            fh.write(tsvbytes)
+        write_atomic(filepath, make_DataTable(data, "tsv"))
 
     def compare_update(self, newdata):
         """Compare the new data with the existing data and compile a list
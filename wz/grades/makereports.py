@@ -1,7 +1,7 @@
 """
 grades/makereports.py
 
-Last updated:  2022-01-23
+Last updated:  2026-10-19
 
 Generate the grade reports for a given group and "term".
 Fields in template files are replaced by the report information.
@@ -59,7 +59,7 @@ _BAD_REPORT_TYPE = "Ungültiger Zeugnistyp: '{rtype}'"
 ###############################################################
 
 import sys, os
-from typing import List, Dict, Set, Tuple
+from typing import List, Dict, Set, Tuple, NamedTuple
 
 if __name__ == "__main__":
     # Enable package import if running as module
@@ -135,26 +135,28 @@ class GradeReports:
         group_info = MINION(DATAPATH("CONFIG/GRADE_GROUP_INFO"))
         # template = get_group_info(group_info, group, "GradeTableTemplate")
 
+        ### Partition the pupils according to report type
         greport_type = {}
         no_report_type = []
         for pupilGradeData in self.grade_table.pupils_grade_data:
-
+            pid = pupilGradeData.pid
+            grades = pupilGradeData.grades
             # ?            # <forGroupTerm> accepts only valid grade-groups.
             if self.grade_table.term == "A":
                 rtype = grades.abicalc.calculate()["REPORT_TYPE"]
                 if not rtype:
                     REPORT(
                         "ERROR",
-                        _NOT_COMPLETE.format(pupil=self.grade_table.name[pid]),
+                        _NOT_COMPLETE.format(pupil=pupilGradeData.name),
                     )
             else:
                 # Split group according to report type
                 rtype = grades.get(_REPORT_TYPE_FIELD, "-")
             if rtype:
                 try:
-                    greport_type[rtype].append(pid)
+                    greport_type[rtype].append(pupilGradeData)
                 except KeyError:
-                    greport_type[rtype] = [pid]
+                    greport_type[rtype] = [pupilGradeData]
             else:
                 no_report_type.append(pid)
 
@@ -165,16 +167,18 @@ class GradeReports:
 
         ### Build reports for each report-type separately
         fplist = []
-        for rtype, pid_list in greport_type.items():
+        for rtype, pgdata_list in greport_type.items():
             if rtype == "-":
                 continue  # Skip these pupils
-            _tg = self.prepare_report_data(rtype, pid_list)
+            _tg = self.prepare_report_data(rtype, pgdata_list)
             if _tg:
-                template, gmaplist = _tg
+                template, gmaps = _tg
+                # The data mappings are generated one at a time as the
+                # reports are built.
                 # make_pdf: data_list, dir_name, working_dir, double_sided
                 fplist.append(
                     template.make_pdf(
-                        gmaplist,
+                        gmaps,
                         grades.report_name(
                             group=self.grade_table.group,
                             term=self.grade_table.term,
@@ -194,17 +198,12 @@ class GradeReports:
         return fplist
 
     #
-    def prepare_report_data(self, rtype, pid_list):
+    def prepare_report_data(self, rtype, pgdata_list):
         """Prepare the slot-mappings for report generation.
-        Return a tuple: (template object, list of slot-mappings).
+        <pgdata_list> is a list of <PupilGradeData> instances, all of
+        which use the same template.
+        Return a tuple: (template object, generator of slot-mappings).
         """
-        ### Pupil data
-        pupils = Pupils(self.grade_table.schoolyear)
-        # The individual pupil data can be fetched using pupils[pid].
-        # Fetching the whole class may not be good enough, as it is vaguely
-        # possible that a pupil has changed class.
-        # The subject data is available at <self.grade_table.subjects>
-        # and <self.sid2subject_data>.
         ### Grade report template
         try:
             template_tag = Grades.report_template(self.grade_table.group, rtype)
@@ -212,12 +211,24 @@ class GradeReports:
             REPORT("ERROR", _BAD_REPORT_TYPE.format(rtype=rtype))
             return None
         gTemplate = Template(template_tag)
-        ### Build the data mappings and generate the reports
-        gmaplist = []
-        for pid in pid_list:
+        # Analyse the template fields once, for all pupils
+        template_slots(gTemplate)
+        return (gTemplate, self.report_data(rtype, pgdata_list, gTemplate))
+
+    def report_data(self, rtype, pgdata_list, template):
+        """Generate the data mappings for the pupils in <pgdata_list>."""
+        ### Pupil data
+        pupils = Pupils()
+        subjects = Subjects()
+        # The individual pupil data can be fetched using pupils[pid].
+        # Fetching the whole class may not be good enough, as it is vaguely
+        # possible that a pupil has changed class.
+        # The subject data is available at <self.grade_table.class_subjects>
+        # and <pupilGradeData.pupil_subjects>.
+        for pupilGradeData in pgdata_list:
             gmap = self.gmap0.copy()
             # Get pupil data
-            pdata = pupils[pid]
+            pdata = pupils[pupilGradeData.pid]
             # could just do gmap[k] = pdata[k] or '' and later substitute all dates?
             for k in pdata.keys():
                 v = pdata[k]
@@ -227,10 +238,10 @@ class GradeReports:
                 else:
                     v = ""
                 gmap[k] = v
-            grades = self.grade_table[pid]
+            grades = pupilGradeData.grades
             # Grade parameters
-            gmap["STREAM"] = grades.stream
-            gmap["SekII"] = grades.sekII
+            gmap["STREAM"] = pdata.get("STREAM") or ""
+            gmap["SekII"] = pupilGradeData.gradeBase.sekII
             comment = grades.pop("*B", "")
             if comment:
                 comment = comment.replace(LINEBREAK, "\n")
@@ -246,90 +257,18 @@ class GradeReports:
                 gmap.update(grades.abicalc.calculate())
             else:
                 # Sort into grade groups
-                grade_map = self.sort_grade_keys(
-                    pdata.name(), grades, gTemplate
-                )
-                gmap.update(grade_map)
+                psubjects = pupilGradeData.pupil_subjects
+                grade_list = [
+                    (sid, psubjects[sid]["SGROUP"], grades.get(sid) or "")
+                    for sid, sname in self.grade_table.class_subjects
+                    if sid in psubjects
+                ]
+                gmap.update(sort_grade_keys(grade_list, template, subjects))
                 gmap["REPORT_TYPE"] = rtype
 
             ## Add template and "local" stuff
             info_extend(gmap)
-            gmaplist.append(gmap)
-
-        return (gTemplate, gmaplist)
-
-    #
-    def sort_grade_keys(self, name, grades, template):
-        """Allocate the subjects and grades to the appropriate slots in the
-        template.
-        Return a {slot: grade-entry} mapping.
-        <grades> is the <Grades> instance,
-        <template> is a <Template> (or subclass) instance.
-        """
-        _grp2indexes = group_grades(template.all_keys())
-        for rg in grades.group_info(self.grade_table.group, "Nullgruppen"):
-            _grp2indexes[rg] = None
-        sbj_grades = _grp2indexes[None]  # "direct" grade slots
-        gmap = {}  # for the result
-        for sid, grade in grades.items():
-            # Get the print representation of the grade
-            if sid[0] == "*":
-                gmap[sid] = grade
-                continue
-            g = grades.print_grade(grade)
-            if sbj_grades:
-                try:
-                    sbj_grades.remove(sdata.sid)
-                except KeyError:
-                    pass
-                else:
-                    # grade-only entry
-                    gmap["G.%s" % sdata.sid] = g or UNGRADED
-                    continue
-            if grade == UNCHOSEN:
-                continue
-            # Get the subject data
-            sdata = self.grade_table.sid2subject_data[sid]
-            if g == MISSING_GRADE:
-                REPORT("WARN", _NO_GRADE.format(pname=name, sbj=sdata.name))
-            if not g:
-                # Subject "not chosen", no report entry
-                continue
-            done = False
-            for rg in sdata.report_groups:
-                # Get an index
-                try:
-                    ilist = _grp2indexes[rg]
-                except KeyError:
-                    continue
-                if done:
-                    raise GradeConfigError(_MULTI_GRADE_GROUPS.format(sbj=sbj))
-                done = True
-                if ilist == None:
-                    # Suppress subject/grade
-                    continue
-                try:
-                    i = ilist.pop()
-                except IndexError as e:
-                    # No indexes left
-                    raise TemplateError(
-                        _NO_SLOT.format(tag=rg, sid=sdata.sid, done=repr(gmap))
-                    ) from e
-                gmap["G.%s.%s" % (rg, i)] = g
-                # For the name, strip possible extra bits, after '|':
-                gmap["S.%s.%s" % (rg, i)] = sdata.name.split("|", 1)[0].rstrip()
-            if not done:
-                raise GradeConfigError(_NO_SUBJECT_GROUP.format(sbj=sdata.name))
-        # Fill unused slots
-        if sbj_grades:
-            for sid in sbj_grades:
-                gmap["G.%s" % sid] = UNGRADED
-        for tag, ilist in _grp2indexes.items():
-            if ilist:
-                for i in ilist:
-                    gmap["G.%s.%s" % (tag, i)] = NO_SUBJECT
-                    gmap["S.%s.%s" % (tag, i)] = NO_SUBJECT
-        return gmap
+            yield gmap
 
 
 ###
@@ -367,25 +306,66 @@ def group_grades(all_keys: Set[str]) -> Tuple[Set[str], Dict[str, List[str]]]:
     return subjects, tagmap
 
 
+class TemplateSlots(NamedTuple):
+    """The grade-relevant information from a report template, see
+    <template_slots>.
+    """
+    subjects: Set[str]              # grade-only slots ('g.sid')
+    tagmap: Dict[str, List[str]]    # {group-tag: [index, ...]}
+    print_grade: Dict[str, str]     # {grade: print-version}
+
+
+# {template path: (modification time, <TemplateSlots>)}
+__template_slots: Dict[str, Tuple[float, TemplateSlots]] = {}
+
+
+def template_slots(template: Template) -> TemplateSlots:
+    """Return the slot information for the template. This requires
+    reading the template file, so the result is cached – the same template
+    is used for many pupils. The cache entry is renewed if the template
+    file is modified.
+    The slot sets and lists must not be modified, <sort_grade_keys> uses
+    copies.
+    """
+    tpath = template.template_path
+    mtime = os.path.getmtime(tpath)
+    try:
+        t, slots = __template_slots[tpath]
+        if t == mtime:
+            return slots
+    except KeyError:
+        pass
+    metafields = template.metadata()["FIELD_INFO"]
+    subjects, tagmap = group_grades(template.all_keys())
+    slots = TemplateSlots(
+        subjects, tagmap, metafields.get("PRINT_GRADE") or {}
+    )
+    __template_slots[tpath] = (mtime, slots)
+    return slots
+
+
 def sort_grade_keys(
     grades: List[Tuple[str, str, str]], # [(sid, sgroup, grade), ... ]
-    template: Template
+    template: Template,
+    subjects: Subjects = None,
 ) -> Dict[str, str]:
     """Allocate the subjects and grades to the appropriate slots in the
     template.
     The grade list should be ordered and contain all subjects relevant
     for the pupil, possibly including UNCHOSEN and NULL ones.
+    <subjects> may be passed in to avoid reloading the subject data for
+    each pupil.
     Return a {template-field: grade-entry} mapping.
     """
-    metafields = template.metadata()["FIELD_INFO"]
-    print_grade = metafields.get("PRINT_GRADE")
-
-    all_keys = template.all_keys()
-    print("\n§§§", sorted(all_keys))
-    sbj_grades, grp2indexes = group_grades(all_keys)
+    slots = template_slots(template)
+    print_grade = slots.print_grade
+    # Copies of the slot collections, these are "used up" here
+    sbj_grades = set(slots.subjects)
+    grp2indexes = {tag: list(ilist) for tag, ilist in slots.tagmap.items()}
     gmap = {}  # for the result
     pgrade: str  # for the print-version of the grades
-    subjects = Subjects()
+    if subjects is None:
+        subjects = Subjects()
     for sid, sgroup, grade in grades:
         # Get the print representation of the grade
         if print_grade:
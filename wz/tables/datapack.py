@@ -1,9 +1,18 @@
 ### python >= 3.7
 # -*- coding: utf-8 -*-
 """
-tables/datapack.py - last updated 2021-05-17
+tables/datapack.py - last updated 2026-10-19
 
-Load and save structured data in a compact way (gzipped json)
+Load and save structured data in a compact way (compressed json).
+
+The compression codec is "zstd" or "lz4" if the corresponding package
+(zstandard, lz4) is installed, otherwise "gzip". The codec is recognized
+by the file ending ('.json.zst', '.json.lz4' or '.json.gz'), so existing
+gzipped files can still be read.
+The decompressed data of recently read files is cached (keyed by path,
+modification time and size), so that reading a file again is fast.
+Parts of a file can be read without building the whole structure if the
+package ijson is available (see <get_pack_item>).
 
 ==============================
 Copyright 2021 Michael Towers
@@ -21,42 +30,188 @@ Copyright 2021 Michael Towers
    limitations under the License.
 """
 
+PACK_CACHE_SIZE = 32    # number of decompressed files to keep
+
 import os, json, gzip
+from collections import OrderedDict
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame as lz4frame
+except ImportError:
+    lz4frame = None
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 ### +++++
 
+class _Codec:
+    """Compression and decompression for one file type."""
+    def __init__(self, name, suffix, compress, decompress, open_stream):
+        self.name = name
+        self.suffix = suffix
+        self.compress = compress            # (bytes, level) -> bytes
+        self.decompress = decompress        # bytes -> bytes
+        self.open_stream = open_stream      # path -> binary file object
+
+
+CODECS = {
+    "gzip": _Codec(
+        "gzip",
+        ".json.gz",
+        lambda data, level: gzip.compress(
+            data, 9 if level is None else level
+        ),
+        gzip.decompress,
+        lambda path: gzip.open(path, "rb"),
+    )
+}
+if lz4frame:
+    CODECS["lz4"] = _Codec(
+        "lz4",
+        ".json.lz4",
+        lambda data, level: lz4frame.compress(
+            data, compression_level=level or 0
+        ),
+        lz4frame.decompress,
+        lambda path: lz4frame.open(path, "rb"),
+    )
+if zstandard:
+    def _zstd_stream(path):
+        fh = open(path, "rb")
+        return zstandard.ZstdDecompressor().stream_reader(
+            fh, closefd=True
+        )
+
+    CODECS["zstd"] = _Codec(
+        "zstd",
+        ".json.zst",
+        lambda data, level: zstandard.ZstdCompressor(
+            level=3 if level is None else level
+        ).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompressobj(
+        ).decompress(data),
+        _zstd_stream,
+    )
+# The preferred codec for writing
+DEFAULT_CODEC = "zstd" if zstandard else "lz4" if lz4frame else "gzip"
+
+# {(path, mtime_ns, size): decompressed bytes}, least recently used first
+__cache = OrderedDict()
+
+
+def pack_path(filepath):
+    """Return the path and codec of the file for the given pack path
+    (specified without ending). If there are files with different
+    endings, the most recently modified one is chosen.
+    Raises <FileNotFoundError> if there is no file.
+    """
+    found = None
+    for codec in CODECS.values():
+        fpath = filepath + codec.suffix
+        try:
+            mtime = os.stat(fpath).st_mtime_ns
+        except FileNotFoundError:
+            continue
+        if found is None or mtime > found[0]:
+            found = (mtime, fpath, codec)
+    if found is None:
+        raise FileNotFoundError(filepath + CODECS["gzip"].suffix)
+    return found[1], found[2]
+
+
+def _read_bytes(fpath, codec):
+    """Return the decompressed contents of the file, using the cache."""
+    st = os.stat(fpath)
+    key = (fpath, st.st_mtime_ns, st.st_size)
+    try:
+        data = __cache[key]
+    except KeyError:
+        with open(fpath, "rb") as fh:
+            data = codec.decompress(fh.read())
+        __cache[key] = data
+        while len(__cache) > PACK_CACHE_SIZE:
+            __cache.popitem(last=False)
+    else:
+        __cache.move_to_end(key)
+    return data
+
+
 def get_pack(filepath):
-    """Get a gzipped json file from the given path (specified without
-    the '.json.gz' ending).
+    """Get a compressed json file from the given path (specified without
+    the '.json.gz', etc., ending).
     Raises <FileNotFoundError> if the file doesn't exist.
     Returns the mapping.
     """
-    fpath = filepath + '.json.gz'
-    with gzip.open(fpath, 'rt', encoding='utf-8') as zipfile:
-        data = json.load(zipfile)
+    return json.loads(_read_bytes(*pack_path(filepath)))
+
+
+def get_pack_item(filepath, *keys):
+    """Get a single item from a compressed json file (see <get_pack>).
+    The item is specified by a sequence of keys, e.g. a pupil-id or
+    (pupil-id, subject). If ijson is available and the file is not
+    cached, only the necessary part of the file will be parsed.
+    Raises <KeyError> if the item doesn't exist.
+    """
+    fpath, codec = pack_path(filepath)
+    st = os.stat(fpath)
+    if ijson and (fpath, st.st_mtime_ns, st.st_size) not in __cache:
+        with codec.open_stream(fpath) as stream:
+            # Numbers as <float>, as from <json.loads>, not <Decimal>
+            for item in ijson.items(
+                stream, ".".join(keys), use_float=True
+            ):
+                return item
+        raise KeyError(keys)
+    data = json.loads(_read_bytes(fpath, codec))
+    for k in keys:
+        data = data[k]
     return data
 
 ###
 
-def save_pack(filepath, data, backup = None):
-    """Save the data mapping as a gzipped json file to the given path
-    (specified without the '.json.gz' ending).
+def save_pack(filepath, data, backup = None, codec = None, level = None):
+    """Save the data mapping as a compressed json file to the given path
+    (specified without the '.json.gz', etc., ending).
+    <codec> is one of the keys of <CODECS>, default is the "best"
+    available one. <level> is the compression level, the meaning
+    depends on the codec. By default a fairly fast level is used, except
+    for gzip.
     Return the filename.
     Any existing file will be overwritten, but if <backup> is supplied
     the old file will be moved to:
-        '~' + file-name + '~' + backup + '.json.gz'
+        '~' + file-name + '~' + backup + ending
     ...  if that file doesn't already exist.
     """
-    fpath = filepath + '.json.gz'
+    _codec = CODECS[codec or DEFAULT_CODEC]
+    fpath = filepath + _codec.suffix
     d = os.path.dirname(filepath)
     os.makedirs(d, exist_ok = True)
-    if backup and os.path.isfile(fpath):
-        f = os.path.basename(filepath)
-        bpath = os.path.join(d, '~' + f + '~' + backup + '.json.gz')
-        if not os.path.isfile(bpath):
-            os.rename(fpath, bpath)
-    with gzip.open(fpath, 'wt', encoding = 'utf-8') as zipfile:
-        json.dump(data, zipfile, ensure_ascii = False)
+    f = os.path.basename(filepath)
+    # Existing versions of the file (possibly with a different codec)
+    for c in CODECS.values():
+        opath = filepath + c.suffix
+        if not os.path.isfile(opath):
+            continue
+        if backup:
+            bpath = os.path.join(d, '~' + f + '~' + backup + c.suffix)
+            if not os.path.isfile(bpath):
+                os.rename(opath, bpath)
+                continue
+        if opath != fpath:
+            os.remove(opath)
+    jbytes = json.dumps(
+        data, ensure_ascii = False, separators = (',', ':')
+    ).encode('utf-8')
+    # Write via a temporary file, so that a failure can't leave a
+    # damaged file.
+    tpath = os.path.join(d, '.' + f + _codec.suffix + '.tmp')
+    with open(tpath, 'wb') as fh:
+        fh.write(_codec.compress(jbytes, level))
+    os.replace(tpath, fpath)
     return fpath
-
-